@@ -35,83 +35,178 @@ class CgiStub:
 sys.modules['cgi'] = CgiStub()
 
 import logging
-import sqlite3
 import requests
 import time
 import re
 import random
 import hashlib
+import hmac
 from datetime import datetime, timedelta
 import threading
+import atexit
 import concurrent.futures
+from collections import Counter, namedtuple
 import os
-from flask import Flask
-import feedparser
+from requests.adapters import HTTPAdapter
+from flask import Flask, Response, request
+
+from storage import (
+    init_db, clear_old_news, is_news_published,
+    filter_unpublished, mark_many_as_published, get_recent_signatures, add_subscriber, count_subscribers,
+    iter_subscriber_pages, record_deliveries, get_subscriber_preferences, set_subscriber_topics,
+    set_subscriber_langs, get_delivery_mode, set_delivery_mode, get_digest_groups,
+    DELIVERY_INSTANT, DELIVERY_DIGEST, enqueue_broadcast, add_digest_article, get_digest_articles, enqueue_digests,
+    get_bot_state, DIGEST_SENT_AT,
+    get_source_state, set_source_state, get_lease, seed_sources, get_sources, upsert_source, delete_source,
+)
+from feed_fetcher import fetch_feed, get_cached_items, remember_items
+import async_crawler
+from fast_feed import parse_feed
+from keyword_matcher import build_matchers
+from near_duplicates import (
+    article_signature, decode_signature, encode_signature, pick_representatives, StreamingDeduplicator,
+)
+from translation import translate_batch, translation_cache
+from message_cache import MessageCache
+from digest import digest_line, pack_digest, DIGEST_INTERVAL
+from broadcast import Broadcaster, SendResult, TokenBucket, BROADCAST_WORKERS, PER_CHAT_RATE
+from singleflight import SingleFlight, SharedStream
+from pipeline import Pipeline
+from scheduler import PollScheduler
+from source_health import SourceHealthRegistry
+from update_dispatcher import UpdateDispatcher
+from jobs import JobExecutor, ACCEPTED, DUPLICATE
+from leader import LeaderElector
+from outbox import OutboxWorker
+from metrics import registry
 
 # ========== СОЗДАЕМ FLASK ПРИЛОЖЕНИЕ ==========
 app = Flask(__name__)
 
-# ========== КОНФИГУРАЦИЯ =====# КЛЮЧЕВЫЕ СЛОВА
-# КЛЮЧЕВЫЕ СЛОВА
+# ========== КОНФИГУРАЦИЯ ==========
+# КЛЮЧЕВЫЕ СЛОВА ПО ТЕМАМ: каждая статья получает маску тем, подписчик выбирает свои
+TOPIC_KEYWORDS = {
+    # НЛО, космос, загадки и научные открытия
+    'space': {
+        'en': [
+            'ufo', 'uap', 'alien', 'extraterrestrial', 'flying saucer', 'unidentified', '3I/ATLAS',
+            '3I/ATLAS comet', 'interstellar', 'comet', 'asteroid', 'meteor', 'cosmic', 'orb', 'sighting',
+            'strange lights', 'mystery', 'anomaly', 'unexplained', 'phenomenon', 'paranormal',
+            'supernatural', 'archaeological', 'ancient', 'artifact', 'lost civilization', 'space', 'NASA',
+            'astronomy', 'celestial', 'planet', 'mars', 'moon', 'solar system', 'galaxy', 'universe',
+            'science', 'discovery', 'research', 'study', 'scientists', 'astronomers'
+        ],
+        'de': [
+            'ufo', 'außerirdisch', 'unidentifiziert', 'komet', 'asteroid', 'meteor', '3I/ATLAS',
+            '3I/ATLAS Komet', 'raum', 'weltraum', 'sichtung', 'seltsam', 'rätsel', 'phänomen',
+            'wissenschaft'
+        ],
+        'fr': [
+            'ovni', 'extraterrestre', 'non identifié', 'comète', 'astéroïde', 'météore', '3I/ATLAS',
+            'comète 3I/ATLAS', 'espace', 'observation', 'étrange', 'mystère', 'phénomène', 'science'
+        ],
+        'es': [
+            'ovni', 'extraterrestre', 'no identificado', 'cometa', 'asteroide', 'meteoro', '3I/ATLAS',
+            'cometa 3I/ATLAS', 'espacio', 'avistamiento', 'extraño', 'mystério', 'fenómeno', 'ciencia'
+        ],
+        'pt': [
+            'ovni', 'extraterrestre', 'não identificado', 'cometa', 'asteroide', 'meteoro', '3I/ATLAS',
+            'cometa 3I/ATLAS', 'espaço', 'avistamento', 'estranho', 'mistério', 'fenômeno', 'ciencia'
+        ],
+        'ru': [
+            'нло', 'пришелец', 'инопланетянин', 'неопознанный', 'комета', 'астероид', '3I/ATLAS',
+            'комета 3I/ATLAS', 'метеор', 'космос', 'космический', 'аномалия', 'загадочный', 'необъяснимый',
+            'наука', 'открытие', 'исследование'
+        ],
+    },
+    # Медицина и здоровье
+    'medicine': {
+        'en': [
+            'medical', 'medicine', 'health', 'virus', 'vaccine', 'treatment', 'cancer', 'therapy', 'drug',
+            'pharmaceutical', 'biotech', 'genetic', 'DNA', 'RNA', 'epidemic', 'pandemic', 'outbreak',
+            'clinical trial', 'surgery', 'diagnosis'
+        ],
+        'de': [
+            'medizin', 'gesundheit', 'virus', 'impfstoff', 'behandlung', 'krebs', 'therapie', 'arzneimittel',
+            'pharmazeutisch', 'biotech', 'genetisch'
+        ],
+        'fr': [
+            'médical', 'médecine', 'santé', 'virus', 'vaccin', 'traitement', 'cancer', 'thérapie',
+            'médicament', 'pharmaceutique', 'biotech', 'génétique'
+        ],
+        'es': [
+            'médico', 'medicina', 'salud', 'virus', 'vacuna', 'tratamiento', 'cáncer', 'terapia',
+            'medicamento', 'farmacéutico', 'biotech', 'genético'
+        ],
+        'pt': [
+            'médico', 'medicina', 'saúde', 'vírus', 'vacuna', 'tratamiento', 'câncer', 'terapia',
+            'medicamento', 'farmacêutico', 'biotech', 'genético'
+        ],
+        'ru': [
+            'медицина', 'медицинский', 'здоровье', 'вирус', 'вакцина', 'лечение', 'рак', 'терапия',
+            'лекарство', 'фармацевтический', 'биотех', 'генетический'
+        ],
+    },
+    # Война в Украине
+    'war': {
+        'en': [
+            'ukraine', 'russia', 'war', 'invasion', 'conflict', 'kyiv', 'donbas', 'attack', 'defense',
+            'military'
+        ],
+        'de': [
+            'ukraine', 'russland', 'krieg', 'invasion', 'konflikt', 'kiew', 'donbas', 'angriff',
+            'verteidigung', 'militär'
+        ],
+        'fr': [
+            'ukraine', 'russie', 'guerre', 'invasion', 'conflit', 'kiev', 'donbass', 'attaque', 'défense',
+            'militaire'
+        ],
+        'es': [
+            'ucrania', 'rusia', 'guerra', 'invasión', 'conflicto', 'kiev', 'donbas', 'ataque', 'defensa',
+            'militar'
+        ],
+        'pt': [
+            'ucrânia', 'rússia', 'guerra', 'invasão', 'conflito', 'kiev', 'donbas', 'ataque', 'defesa',
+            'militar'
+        ],
+        'ru': [
+            'украина', 'украины', 'украине', 'украину', 'россия', 'россии', 'россию', 'война', 'конфликт',
+            'киев', 'донбасс', 'атака', 'оборона', 'военный'
+        ],
+    },
+}
+
+# Все ключевые слова языка - для поиска
 KEYWORDS = {
-    'en': [
-        'ufo', 'uap', 'alien', 'extraterrestrial', 'flying saucer', 'unidentified',
-        '3I/ATLAS', '3I/ATLAS comet', 'interstellar', 'comet', 'asteroid', 'meteor', 'cosmic',
-        'orb', 'sighting', 'strange lights', 'mystery', 'anomaly', 'unexplained',
-        'phenomenon', 'paranormal', 'supernatural', 'archaeological', 'ancient',
-        'artifact', 'lost civilization', 'space', 'NASA', 'astronomy', 'celestial',
-        'planet', 'mars', 'moon', 'solar system', 'galaxy', 'universe', 'science',
-        'discovery', 'research', 'study', 'scientists', 'astronomers',
-        'medical', 'medicine', 'health', 'virus', 'vaccine', 'treatment', 'cancer',
-        'therapy', 'drug', 'pharmaceutical', 'biotech', 'genetic', 'DNA', 'RNA',
-        'epidemic', 'pandemic', 'outbreak', 'clinical trial', 'surgery', 'diagnosis',
-        # Ukraine war keywords
-        'ukraine', 'russia', 'war', 'invasion', 'conflict', 'kyiv', 'donbas', 'attack', 'defense', 'military'
-    ],
-    'de': [
-        'ufo', 'außerirdisch', 'unidentifiziert', 'komet', 'asteroid', 'meteor',
-        '3I/ATLAS', '3I/ATLAS Komet', 'raum', 'weltraum', 'sichtung', 'seltsam', 'rätsel', 'phänomen', 'wissenschaft',
-        'medizin', 'gesundheit', 'virus', 'impfstoff', 'behandlung', 'krebs',
-        'therapie', 'arzneimittel', 'pharmazeutisch', 'biotech', 'genetisch',
-        # Ukraine war keywords
-        'ukraine', 'russland', 'krieg', 'invasion', 'konflikt', 'kiew', 'donbas', 'angriff', 'verteidigung', 'militär'
-    ],
-    'fr': [
-        'ovni', 'extraterrestre', 'non identifié', 'comète', 'astéroïde', 'météore',
-        '3I/ATLAS', 'comète 3I/ATLAS', 'espace', 'observation', 'étrange', 'mystère', 'phénomène', 'science',
-        'médical', 'médecine', 'santé', 'virus', 'vaccin', 'traitement', 'cancer',
-        'thérapie', 'médicament', 'pharmaceutique', 'biotech', 'génétique',
-        # Ukraine war keywords
-        'ukraine', 'russie', 'guerre', 'invasion', 'conflit', 'kiev', 'donbass', 'attaque', 'défense', 'militaire'
-    ],
-    'es': [
-        'ovni', 'extraterrestre', 'no identificado', 'cometa', 'asteroide', 'meteoro',
-        '3I/ATLAS', 'cometa 3I/ATLAS', 'espacio', 'avistamiento', 'extraño', 'mystério', 'fenómeno', 'ciencia',
-        'médico', 'medicina', 'salud', 'virus', 'vacuna', 'tratamiento', 'cáncer',
-        'terapia', 'medicamento', 'farmacéutico', 'biotech', 'genético',
-        # Ukraine war keywords
-        'ucrania', 'rusia', 'guerra', 'invasión', 'conflicto', 'kiev', 'donbas', 'ataque', 'defensa', 'militar'
-    ],
-    'pt': [
-        'ovni', 'extraterrestre', 'não identificado', 'cometa', 'asteroide', 'meteoro',
-        '3I/ATLAS', 'cometa 3I/ATLAS', 'espaço', 'avistamento', 'estranho', 'mistério', 'fenômeno', 'ciencia',
-        'médico', 'medicina', 'saúde', 'vírus', 'vacuna', 'tratamiento', 'câncer',
-        'terapia', 'medicamento', 'farmacêutico', 'biotech', 'genético',
-        # Ukraine war keywords
-        'ucrânia', 'rússia', 'guerra', 'invasão', 'conflito', 'kiev', 'donbas', 'ataque', 'defesa', 'militar'
-    ],
-    'ru': [
-        'нло', 'пришелец', 'инопланетянин', 'неопознанный', 'комета', 'астероид',
-        '3I/ATLAS', 'комета 3I/ATLAS', 'метеор', 'космос', 'космический', 'аномалия', 'загадочный', 'необъяснимый',
-        'наука', 'открытие', 'исследование',
-        'медицина', 'медицинский', 'здоровье', 'вирус', 'вакцина', 'лечение', 'рак',
-        'терапия', 'лекарство', 'фармацевтический', 'биотех', 'генетический',
-        # Ukraine war keywords
-        'украина', 'украины', 'украине', 'украину', 'россия', 'россии', 'россию', 
-        'война', 'конфликт', 'киев', 'донбасс', 'атака', 'оборона', 'военный'
-    ]
+    lang: [word for words_by_lang in TOPIC_KEYWORDS.values() for word in words_by_lang.get(lang, [])]
+    for lang in TOPIC_KEYWORDS['space']
 }
 
+# ТОЛЬКО самые важные исключения (совпадение по началу слова)
+EXCLUDE_WORDS = ['election', 'president', 'trump', 'biden', 'covid', 'coronavirus']
+
+# Скомпилированные матчеры ключевых слов по языкам
+KEYWORD_MATCHERS = build_matchers(KEYWORDS, EXCLUDE_WORDS)
+
+# Биты тем и языков хранятся в базе у подписчиков - существующие не менять
+TOPIC_BITS = {'space': 1, 'medicine': 2, 'war': 4}
+TOPIC_TITLES = {'space': '🛸 НЛО, космос и наука', 'medicine': '💊 Медицина', 'war': '⚔️ Война в Украине'}
+LANG_BITS = {'en': 1, 'de': 2, 'fr': 4, 'es': 8, 'pt': 16, 'ru': 32}
+# Маска "все темы / все языки"
+ALL_MASK = -1
+
+def build_keyword_topics():
+    """Ключевое слово -> биты тем, по языкам"""
+    keyword_topics = {}
+    for topic, words_by_lang in TOPIC_KEYWORDS.items():
+        for lang, words in words_by_lang.items():
+            lang_topics = keyword_topics.setdefault(lang, {})
+            for word in words:
+                lang_topics[word] = lang_topics.get(word, 0) | TOPIC_BITS[topic]
+    return keyword_topics
+
+KEYWORD_TOPICS = build_keyword_topics()
+
 NEWS_SOURCES = {
     # Существующие научные источники
     'NASA News': {'url': 'https://www.nasa.gov/rss/dyn/breaking_news.rss', 'lang': 'en'},
@@ -132,11 +227,46 @@ NEWS_SOURCES = {
     'DW News English': {'url': 'https://rss.dw.com/rdf/rss-en-all', 'lang': 'en'},
     'France 24 English': {'url': 'https://www.france24.com/en/rss', 'lang': 'en'},
     'Al Jazeera English': {'url': 'https://www.aljazeera.com/xml/rss/all.xml', 'lang': 'en'},
-    'РИА Новости': {'url': 'https://ria.ru/export/rss2/index.xml', 'lang': 'ru'},
-    'Интерфакс': {'url': 'https://www.interfax.ru/rss.asp', 'lang': 'ru'},
+    'РИА Новости': {'url': 'https://ria.ru/export/rss2/index.xml', 'lang': 'ru', 'max_entries': 30},
+    'Интерфакс': {'url': 'https://www.interfax.ru/rss.asp', 'lang': 'ru', 'max_entries': 30},
 }
+
+# Результат опроса источника для адаптивного расписания
+SourcePoll = namedtuple('SourcePoll', ['items', 'new_entries', 'ttl_seconds', 'ok'])
+
+# Сколько записей ленты разбираем за раз (для частых лент - 'max_entries' источника)
+MAX_ENTRIES_PER_SOURCE = 10
+# Новости старше этого не публикуем
+MAX_NEWS_AGE_DAYS = 3
+# (connect, read) по умолчанию; источнику можно задать свой 'timeout'
+SOURCE_TIMEOUT = (5, 20)
+# Через столько секунд обход источников заканчивается с тем, что успело прийти
+CYCLE_DEADLINE = float(os.environ.get('CYCLE_DEADLINE', 60))
+# Движок опроса: 'async' (aiohttp, сотни и тысячи лент) или 'threads' (пул потоков)
+CRAWL_ENGINE = os.environ.get('CRAWL_ENGINE', 'async')
+CRAWL_THREADS = 8
+# Реестр источников перечитываем из базы не чаще, чем раз в столько секунд
+SOURCES_REFRESH_INTERVAL = 60
+# Аренда в SQLite: фоновые циклы бота работают только у ее владельца
+LEADER_LEASE_NAME = 'background-workers'
+# Токен для изменения реестра через /sources и /test?refresh=1 (пустой - запрещено)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
 BOT_TOKEN = os.environ.get('BOT_TOKEN', "8292008037:AAEKFdmn3fXIWkPKnwkdwgHD8AIgOCfn2oQ")
-TELEGRAM_URL = f"https://api.telegram.org/bot{BOT_TOKEN}"
+# Адрес Bot API можно подменить (локальный Bot API сервер или стенд бенчмарка)
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')
+TELEGRAM_URL = f"{TELEGRAM_API_URL}/bot{BOT_TOKEN}"
+
+# Прием сообщений: 'webhook' на хостинге, 'polling' для локального запуска
+TELEGRAM_MODE = os.environ.get('TELEGRAM_MODE', 'polling')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET', '')
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', f"{os.environ.get('RENDER_EXTERNAL_URL', 'https://nauka-bot-1.onrender.com')}/webhook")
+UPDATE_WORKERS = int(os.environ.get('UPDATE_WORKERS', 4))
+UPDATE_QUEUE_SIZE = int(os.environ.get('UPDATE_QUEUE_SIZE', 500))
+# Пул для тяжелых команд (/feed, /stats, /clear)
+COMMAND_WORKERS = int(os.environ.get('COMMAND_WORKERS', 4))
+COMMAND_QUEUE_SIZE = int(os.environ.get('COMMAND_QUEUE_SIZE', 50))
+# BOT_AUTOSTART=0 - импорт без запуска потоков бота (бенчмарки, отладка в консоли)
+BOT_AUTOSTART = os.environ.get('BOT_AUTOSTART', '1') == '1'
 
 
 
@@ -147,183 +277,296 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Глобальная блокировка для работы с БД
-db_lock = threading.Lock()
+# ========== МЕТРИКИ ==========
+FEED_FETCH_SECONDS = registry.histogram('nauka_feed_fetch_seconds', 'Загрузка ленты', ['source'])
+FEED_PARSE_SECONDS = registry.histogram('nauka_feed_parse_seconds', 'Разбор ленты', ['source'])
+FEED_PARSES = registry.counter('nauka_feed_parses_total', 'Разборы лент: быстрый или feedparser', ['source', 'parser'])
+FEED_BYTES = registry.counter('nauka_feed_bytes_total', 'Скачано байт лент', ['source'])
+FEED_RESPONSES = registry.counter('nauka_feed_responses_total', 'Ответы источников: лента изменилась или нет', ['source', 'result'])
+FEED_FAILURES = registry.counter('nauka_feed_failures_total', 'Неудачные опросы источников', ['source'])
+FEED_ENTRIES = registry.counter('nauka_feed_entries_total', 'Записи лент по итогу фильтрации', ['source', 'outcome'])
+TELEGRAM_SEND_SECONDS = registry.histogram('nauka_telegram_send_seconds', 'Запрос sendMessage')
+TELEGRAM_SENDS = registry.counter('nauka_telegram_sends_total', 'Ответы sendMessage по коду', ['status'])
+SUBSCRIBERS_DEACTIVATED = registry.counter('nauka_subscribers_deactivated_total', 'Чаты, выключенные из рассылки', ['reason'])
+STAGE_SECONDS = registry.histogram('nauka_stage_seconds', 'Этапы цикла: dedup, translate, render, send, broadcast, digest', ['stage'])
+TIME_TO_FIRST_MESSAGE = registry.histogram(
+    'nauka_time_to_first_message_seconds', 'От начала цикла до первой доставленной новости', ['kind'],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300),
+)
+CYCLE_SECONDS = registry.histogram(
+    'nauka_cycle_seconds', 'Полный цикл: поиск по всем источникам или цикл авто-ленты', ['kind'],
+    buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600),
+)
 
-# Глобальная блокировка для предотвращения одновременного поиска
-search_lock = threading.Lock()
+# Сколько секунд результат поиска переиспользуется одновременными и повторными запросами
+SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', 120))
 
-# ========== БАЗА ДАННЫХ ==========
-def init_db():
-    """Инициализация базы данных SQLite"""
-    with db_lock:
-        conn = sqlite3.connect('strange_news.db', check_same_thread=False)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS published_news (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                url TEXT UNIQUE NOT NULL,
-                title TEXT NOT NULL,
-                source TEXT NOT NULL,
-                lang TEXT NOT NULL,
-                content_hash TEXT NOT NULL,
-                published_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS subscribers (
-                chat_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        logger.info("✅ База данных инициализирована")
-
-def clear_old_news():
-    """Очищаем старые новости из базы (старше 1 дня)"""
-    with db_lock:
-        conn = sqlite3.connect('strange_news.db', check_same_thread=False)
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM published_news WHERE published_at < datetime("now", "-1 days")')
-        deleted_count = cursor.rowcount
-        
-        conn.commit()
-        conn.close()
-        logger.info(f"🧹 Очищено {deleted_count} старых новостей из базы")
-        return deleted_count
+# Потоковый цикл рассылки: размер очередей между этапами и число потоков перевода
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', 20))
+PIPELINE_RENDER_WORKERS = int(os.environ.get('PIPELINE_RENDER_WORKERS', 4))
+# Окно свежести: готовые сообщения, пришедшие за столько секунд, уходят от новых к старым (0 - без окна)
+PIPELINE_REORDER_WINDOW = float(os.environ.get('PIPELINE_REORDER_WINDOW', 1.0))
+PIPELINE_REORDER_MAX_ITEMS = 20
+
+# Задержки и автоматы отключения источников
+source_health = SourceHealthRegistry(NEWS_SOURCES)
+registry.gauge('nauka_sources_breaker_open', 'Источников с открытым автоматом', function=source_health.open_count)
+
+if CRAWL_ENGINE == 'async' and not async_crawler.is_available():
+    logger.warning("⚠️ aiohttp не установлен, источники опрашиваются пулом потоков")
+    CRAWL_ENGINE = 'threads'
+async_fetcher = async_crawler.AsyncFeedFetcher() if CRAWL_ENGINE == 'async' else None
+
+# ========== РЕЕСТР ИСТОЧНИКОВ ==========
+_sources_cache = {'sources': None, 'loaded_at': 0.0}
+_sources_lock = threading.Lock()
 
+def init_sources():
+    """Первый запуск: переносим NEWS_SOURCES в реестр"""
+    seed_sources(NEWS_SOURCES)
+    invalidate_sources()
+
+def get_news_sources():
+    """Включенные источники реестра {имя: {'url', 'lang', ...}}"""
+    with _sources_lock:
+        if _sources_cache['sources'] is None or \
+                time.monotonic() - _sources_cache['loaded_at'] >= SOURCES_REFRESH_INTERVAL:
+            _sources_cache['sources'] = get_sources()
+            _sources_cache['loaded_at'] = time.monotonic()
+        return _sources_cache['sources']
+
+def invalidate_sources():
+    """Реестр изменился - следующий цикл перечитает его из базы"""
+    with _sources_lock:
+        _sources_cache['sources'] = None
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def normalize_source(data):
+    """Проверяем источник из POST /sources: {'url', 'lang', ...опции}; ValueError с описанием ошибки"""
+    unknown = set(data) - {'url', 'lang', 'enabled', 'timeout', 'max_entries'}
+    if unknown:
+        raise ValueError(f"неизвестные поля: {', '.join(sorted(unknown))}")
+    if not isinstance(data.get('url'), str) or not data['url'].startswith(('http://', 'https://')):
+        raise ValueError("url - адрес http(s)")
+    if data.get('lang') not in KEYWORD_MATCHERS:
+        raise ValueError("lang - один из: " + ', '.join(KEYWORD_MATCHERS))
+    
+    info = {'url': data['url'], 'lang': data['lang']}
+    if 'enabled' in data:
+        if not isinstance(data['enabled'], bool):
+            raise ValueError("enabled - true или false")
+        info['enabled'] = data['enabled']
+    if 'timeout' in data:
+        timeout = data['timeout']
+        if not isinstance(timeout, list) or len(timeout) != 2 or \
+                not all(_is_number(value) and value > 0 for value in timeout):
+            raise ValueError("timeout - [подключение, чтение]: два положительных числа секунд")
+        info['timeout'] = [float(value) for value in timeout]
+    if 'max_entries' in data:
+        max_entries = data['max_entries']
+        if not isinstance(max_entries, int) or isinstance(max_entries, bool) or max_entries < 1:
+            raise ValueError("max_entries - целое число больше 0")
+        info['max_entries'] = max_entries
+    return info
+
+# ========== ЛЕНТА НОВОСТЕЙ ==========
 def get_content_hash(title, description):
     """Создаем хэш контента для проверки дубликатов"""
     content = f"{title}_{description}" if description else title
     return hashlib.md5(content.encode()).hexdigest()
 
-def is_news_published(content_hash):
-    """Проверяем, публиковали ли мы уже эту новость по хэшу"""
-    with db_lock:
-        conn = sqlite3.connect('strange_news.db', check_same_thread=False)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT 1 FROM published_news WHERE content_hash = ?', (content_hash,))
-        result = cursor.fetchone()
-        
-        conn.close()
-        return result is not None
-
-def mark_news_as_published(url, title, source, lang, content_hash):
-    """Добавляем новость в базу как опубликованную"""
-    with db_lock:
-        conn = sqlite3.connect('strange_news.db', check_same_thread=False)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'INSERT OR IGNORE INTO published_news (url, title, source, lang, content_hash) VALUES (?, ?, ?, ?, ?)',
-            (url, title, source, lang, content_hash)
-        )
-        
-        conn.commit()
-        conn.close()
-
-def add_subscriber(chat_id, username, first_name):
-    """Добавляем подписчика в базу"""
-    with db_lock:
-        conn = sqlite3.connect('strange_news.db', check_same_thread=False)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'INSERT OR REPLACE INTO subscribers (chat_id, username, first_name) VALUES (?, ?, ?)',
-            (chat_id, username, first_name)
-        )
-        
-        conn.commit()
-        conn.close()
-        logger.info(f"✅ Добавлен подписчик: {first_name}")
-
-def get_subscribers():
-    """Получаем список всех подписчиков"""
-    with db_lock:
-        conn = sqlite3.connect('strange_news.db', check_same_thread=False)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT chat_id FROM subscribers')
-        results = cursor.fetchall()
-        
-        conn.close()
-        return [row[0] for row in results]
+HTML_TAG_RE = re.compile('<.*?>')
 
-# ========== ЛЕНТА НОВОСТЕЙ ==========
 def clean_html(text):
     """Очищаем текст от HTML-тегов"""
     if not text: return ""
-    clean = re.compile('<.*?>')
-    return re.sub(clean, '', text)
+    return HTML_TAG_RE.sub('', text)
+
+def match_strange_keywords(title, description, lang):
+    """Возвращаем ключевые слова, по которым новость считается странной"""
+    if not title or lang not in KEYWORD_MATCHERS:
+        return []
+    
+    return KEYWORD_MATCHERS[lang].match(f"{title} {description or ''}")
+
+def classify_topics(keywords, lang):
+    """Маска тем статьи по найденным ключевым словам"""
+    topics_by_keyword = KEYWORD_TOPICS.get(lang, {})
+    mask = 0
+    for keyword in keywords:
+        mask |= topics_by_keyword.get(keyword, 0)
+    return mask
+
+def article_topics(article):
+    """Маска тем статьи; у новостей из кэша прошлых версий ее еще нет"""
+    if 'topics' not in article:
+        article['topics'] = classify_topics(article.get('keywords', []), article['lang'])
+    return article['topics']
+
+def article_langs(article):
+    """Бит языка статьи; у языка без своего бита фильтра по языку нет - статья не теряется"""
+    return LANG_BITS.get(article['lang'], ALL_MASK)
+
+def wants_article(preferences, article):
+    """Подходит ли статья под маски (topics, langs) подписчика"""
+    topics, langs = preferences
+    return bool(topics & article_topics(article)) and bool(langs & article_langs(article))
 
 def is_strange_news(title, description, lang):
     """Проверяем, относится ли новость к странным событиям"""
-    if not title: 
-        return False
-    
-    text = f"{title} {description or ''}".lower()
-    
-    # ТОЛЬКО самые важные исключения
-    exclude_words = ['election', 'president', 'trump', 'biden', 'covid', 'coronavirus']
-    if any(word in text for word in exclude_words):
-        return False
-    
-    # УВЕЛИЧИВАЕМ шансы нахождения - проверяем любые ключевые слова
-    if lang in KEYWORDS:
-        return any(keyword.lower() in text for keyword in KEYWORDS[lang])
+    return bool(match_strange_keywords(title, description, lang))
+
+def entry_identity(entry):
+    """GUID записи, а если его нет - ссылка"""
+    return entry.get('id') or entry.get('link') or entry.get('title')
+
+def entry_datetime(entry):
+    """Время публикации или обновления записи"""
+    parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+    if parsed:
+        return datetime(*parsed[:6])
+    return None
+
+def is_fresh(entry_time):
+    """Проверяем свежесть новости (последние 3 дня)"""
+    return datetime.now() - entry_time <= timedelta(days=MAX_NEWS_AGE_DAYS)
+
+def load_source_state(source_name):
+    """Высшая отметка источника: уже виденные записи, самая новая дата и найденные новости"""
+    state = get_source_state(source_name)
+    if not state:
+        return {'seen_ids': [], 'newest_entry_at': None, 'items': []}
     
-    return False
+    for item in state['items']:
+        item['entry_time'] = datetime.fromisoformat(item['entry_time'])
+    if state['newest_entry_at']:
+        state['newest_entry_at'] = datetime.fromisoformat(state['newest_entry_at'])
+    return state
+
+def save_source_state(source_name, seen_ids, newest_entry_at, items):
+    """Сохраняем высшую отметку источника"""
+    stored_items = [dict(item, entry_time=item['entry_time'].isoformat()) for item in items]
+    set_source_state(
+        source_name, seen_ids,
+        newest_entry_at.isoformat() if newest_entry_at else None,
+        stored_items,
+    )
 
 def fetch_news_from_source(source_name, source_info):
     """Получаем новости из одного источника с детальным логированием"""
+    return poll_source(source_name, source_info).items
+
+def feed_ttl_seconds(feed):
+    """Подсказка <ttl> из RSS (в минутах) в секундах"""
+    try:
+        return int(feed.ttl) * 60
+    except (TypeError, ValueError):
+        return None
+
+def cached_poll(rss_url, ok):
+    """Опрос без разбора: еще свежие новости прошлой загрузки"""
+    news_items = [item for item in get_cached_items(rss_url) or [] if is_fresh(item['entry_time'])]
+    return SourcePoll(news_items, 0, None, ok)
+
+def breaker_poll(source_name, source_info):
+    """Источник с открытым автоматом не опрашиваем до конца остывания; None - опрашивать можно"""
+    if source_health.allow(source_name):
+        return None
+    FEED_RESPONSES.inc(source=source_name, result='breaker_open')
+    logger.info(f"⛔ {source_name}: автомат открыт, пропускаем опрос")
+    return cached_poll(source_info['url'], ok=False)
+
+def source_failed(source_name, error):
+    """Неудачный опрос: счетчик, автомат отключения, пустой результат"""
+    FEED_FAILURES.inc(source=source_name)
+    source_health.record_failure(source_name, error)
+    logger.error(f"❌ {source_name}: ошибка получения: {error}")
+    return SourcePoll([], 0, None, False)
+
+def poll_source(source_name, source_info, deadline=None):
+    """Опрашиваем источник: новости плюс данные для расписания (новые записи, TTL, успех)"""
+    skipped = breaker_poll(source_name, source_info)
+    if skipped is not None:
+        return skipped
+    
+    logger.debug(f"🔍 Проверяем источник: {source_name} ({source_info['url']})")
+    try:
+        # Условный запрос: при 304 или том же теле ленту не парсим
+        started = time.perf_counter()
+        response = fetch_feed(
+            source_info['url'], timeout=tuple(source_info.get('timeout', SOURCE_TIMEOUT)), deadline=deadline,
+            hedge_after=source_health.hedge_delay(source_name),
+        )
+    except Exception as e:
+        return source_failed(source_name, e)
+    return process_feed(source_name, source_info, response, time.perf_counter() - started)
+
+def process_feed(source_name, source_info, response, latency):
+    """Загруженная лента (FeedResponse) -> SourcePoll; общее для обоих движков опроса"""
+    rss_url = source_info['url']
     try:
-        rss_url = source_info['url']
         lang = source_info['lang']
+        max_entries = source_info.get('max_entries', MAX_ENTRIES_PER_SOURCE)
         
-        logger.debug(f"🔍 Проверяем источник: {source_name} ({rss_url})")
+        FEED_FETCH_SECONDS.observe(latency, source=source_name)
+        source_health.record_success(source_name, latency)
+        FEED_BYTES.inc(response.size, source=source_name)
+        FEED_RESPONSES.inc(source=source_name, result='changed' if response.changed else 'unchanged')
+        if not response.changed:
+            poll = cached_poll(rss_url, ok=True)
+            logger.info(f"♻️ {source_name}: лента не изменилась, {len(poll.items)} подходящих новостей из кэша")
+            return poll
         
-        # Парсим RSS через feedparser
-        feed = feedparser.parse(rss_url)
+        # Разбираем только первые max_entries записей; необычные ленты - через feedparser
+        with FEED_PARSE_SECONDS.time(source=source_name):
+            feed = parse_feed(response.content, max_entries, response_headers=dict(response.headers))
+        FEED_PARSES.inc(source=source_name, parser=feed.parser)
         
-        total_entries = len(feed.entries) if hasattr(feed, 'entries') else 0
+        total_entries = len(feed.entries)
         logger.debug(f"📄 {source_name}: получено {total_entries} записей")
         
-        news_items = []
-        for entry in feed.entries[:10]:
+        state = load_source_state(source_name)
+        seen_ids = set(state['seen_ids'])
+        high_water = state['newest_entry_at']
+        newest_entry_at = high_water
+        current_ids = []
+        skipped_count = 0
+        
+        new_items = []
+        for entry in feed.entries:
             try:
-                title = clean_html(entry.title) if hasattr(entry, 'title') else ""
-                description = clean_html(entry.summary) if hasattr(entry, 'summary') else clean_html(entry.description) if hasattr(entry, 'description') else ""
-                link = entry.link if hasattr(entry, 'link') else ""
+                entry_id = entry_identity(entry)
+                entry_time = entry_datetime(entry)
+                current_ids.append(entry_id)
                 
-                if not title or not link:
+                # Записи не новее высшей отметки уже обработаны в прошлых циклах
+                if entry_id in seen_ids or (entry_time and high_water and entry_time < high_water):
+                    skipped_count += 1
+                    FEED_ENTRIES.inc(source=source_name, outcome='seen')
                     continue
                 
-                # Проверяем свежесть новости (последние 3 дня)
-                is_recent = True
-                entry_time = None
-                if hasattr(entry, 'published_parsed') and entry.published_parsed:
-                    entry_time = datetime(*entry.published_parsed[:6])
-                    if datetime.now() - entry_time > timedelta(days=3):
-                        is_recent = False
-                elif hasattr(entry, 'updated_parsed') and entry.updated_parsed:
-                    entry_time = datetime(*entry.updated_parsed[:6])
-                    if datetime.now() - entry_time > timedelta(days=3):
-                        is_recent = False
+                # Даты из будущего не двигают отметку, иначе источник "замолчит"
+                if entry_time and entry_time <= datetime.now() + timedelta(days=1) and \
+                        (newest_entry_at is None or entry_time > newest_entry_at):
+                    newest_entry_at = entry_time
+                
+                title = clean_html(entry.get('title'))
+                description = clean_html(entry.get('summary') or entry.get('description'))
+                link = entry.get('link') or ""
                 
-                if is_recent:
-                    if is_strange_news(title, description, lang):
+                if not title or not link:
+                    FEED_ENTRIES.inc(source=source_name, outcome='incomplete')
+                    continue
+                
+                if entry_time is None or is_fresh(entry_time):
+                    matched_keywords = match_strange_keywords(title, description, lang)
+                    if matched_keywords:
                         published_date = entry_time.strftime("%d.%m.%Y %H:%M") if entry_time else "Недавно"
                         content_hash = get_content_hash(title, description)
                         
-                        news_items.append({
+                        new_items.append({
                             'title': title,
                             'description': description,
                             'url': link,
@@ -331,57 +574,112 @@ def fetch_news_from_source(source_name, source_info):
                             'lang': lang,
                             'published': published_date,
                             'content_hash': content_hash,
+                            'keywords': matched_keywords,
+                            'topics': classify_topics(matched_keywords, lang),
                             'entry_time': entry_time or datetime.now()
                         })
+                        FEED_ENTRIES.inc(source=source_name, outcome='matched')
                     else:
+                        FEED_ENTRIES.inc(source=source_name, outcome='no_keywords')
                         logger.debug(f"❌ {source_name}: не подходит по ключевым словам '{title[:50]}...'")
                 else:
+                    FEED_ENTRIES.inc(source=source_name, outcome='stale')
                     logger.debug(f"📅 {source_name}: устаревшая новость '{title[:50]}...'")
                     
             except Exception as e:
+                FEED_ENTRIES.inc(source=source_name, outcome='error')
                 logger.debug(f"⚠️ {source_name}: ошибка обработки записи: {e}")
                 continue
         
-        logger.info(f"📡 {source_name}: найдено {len(news_items)} подходящих новостей")
-        return news_items
+        # Новые находки плюс еще свежие новости прошлых циклов
+        news_items = []
+        seen_urls = set()
+        for item in new_items + state['items']:
+            if item['url'] not in seen_urls and is_fresh(item['entry_time']):
+                seen_urls.add(item['url'])
+                news_items.append(item)
+        news_items = news_items[:max_entries]
+        
+        # Помним записи текущего окна ленты и немного прошлых - на случай перестановок
+        remembered_ids = list(dict.fromkeys(current_ids + state['seen_ids']))[:max_entries * 2]
+        save_source_state(source_name, remembered_ids, newest_entry_at, news_items)
+        
+        remember_items(rss_url, news_items)
+        logger.info(f"📡 {source_name}: найдено {len(news_items)} подходящих новостей "
+                    f"({len(new_items)} новых, пропущено уже обработанных: {skipped_count})")
+        new_entries = min(total_entries, max_entries) - skipped_count
+        return SourcePoll(news_items, new_entries, feed_ttl_seconds(feed), True)
         
     except Exception as e:
-        logger.error(f"❌ {source_name}: ошибка получения: {e}")
-        return []
+        return source_failed(source_name, e)
 
-def search_strange_news():
-    """Поиск новостей во всех источниках с детальным логированием"""
-    logger.info("🔍 Начинаем поиск новостей в источниках...")
-    all_news = []
-    
-    source_results = {}
+def iter_source_polls(sources, deadline=None):
+    """Опрашиваем источники параллельно и отдаем (имя, SourcePoll) по мере готовности.
     
-    def fetch_source(source_item):
-        name, info = source_item
-        news = fetch_news_from_source(name, info)
-        source_results[name] = len(news)
-        return news
+    После deadline (time.monotonic()) оставшиеся источники отдаются как неудачные.
+    """
+    if CRAWL_ENGINE == 'async':
+        return _iter_async_polls(sources, deadline)
+    return _iter_thread_polls(sources, deadline)
+
+def _iter_async_polls(sources, deadline):
+    """Загрузка в цикле событий aiohttp, разбор - в этом потоке по мере прихода лент"""
+    jobs = []
+    infos = {}
+    for name, info in sources:
+        skipped = breaker_poll(name, info)
+        if skipped is not None:
+            yield name, skipped
+            continue
+        try:
+            job = (name, info['url'], tuple(info.get('timeout', SOURCE_TIMEOUT)), source_health.hedge_delay(name))
+        except Exception as e:
+            # Битые опции одного источника не срывают обход остальных
+            yield name, source_failed(name, e)
+            continue
+        infos[name] = info
+        jobs.append(job)
     
-    # Используем ThreadPoolExecutor с ограничением потоков
-    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-        futures = {executor.submit(fetch_source, item): item[0] for item in NEWS_SOURCES.items()}
-        
-        for future in concurrent.futures.as_completed(futures):
+    late = []
+    for name, result, latency in async_fetcher.fetch_many(jobs, deadline):
+        if isinstance(result, Exception):
+            # latency None - загрузку отменили по сроку цикла
+            if latency is None:
+                late.append(name)
+            yield name, source_failed(name, result)
+        else:
+            yield name, process_feed(name, infos[name], result, latency)
+    if late:
+        logger.warning(f"⏰ Срок цикла истек, не дождались: {', '.join(late)}")
+
+def _iter_thread_polls(sources, deadline):
+    """Пул потоков: потоки опоздавших источников сами прерываются по сроку"""
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=CRAWL_THREADS)
+    futures = {executor.submit(poll_source, name, info, deadline): name for name, info in sources}
+    timeout = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+    try:
+        for future in concurrent.futures.as_completed(futures, timeout=timeout):
             source_name = futures[future]
             try:
-                news_items = future.result()
-                if news_items:
-                    all_news.extend(news_items)
+                poll = future.result()
             except Exception as e:
                 logger.error(f"❌ Ошибка в потоке для {source_name}: {e}")
-    
-    # Детальная статистика по источникам
-    working_sources = {k: v for k, v in source_results.items() if v > 0}
-    
-    logger.info(f"📊 ИТОГИ ПОИСКА:")
-    logger.info(f"✅ Работающие источники ({len(working_sources)}): {working_sources}")
-    logger.info(f"📈 Всего сырых новостей: {len(all_news)}")
-    
+                poll = SourcePoll([], 0, None, False)
+            yield source_name, poll
+    except concurrent.futures.TimeoutError:
+        late = [name for future, name in futures.items() if not future.done()]
+        logger.warning(f"⏰ Срок цикла истек, не дождались: {', '.join(late)}")
+        for source_name in late:
+            yield source_name, SourcePoll([], 0, None, False)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def crawl_sources(sources, deadline=None):
+    """Опрашиваем источники параллельно: {имя: SourcePoll}"""
+    return dict(iter_source_polls(sources, deadline))
+
+def deduplicate_news(all_news):
+    """Сортируем по свежести и убираем дубликаты и пересказы одной истории"""
     # Сортируем по времени публикации (сначала свежие)
     sorted_news = sorted(all_news, 
                         key=lambda x: x.get('entry_time', datetime.now()), 
@@ -398,6 +696,34 @@ def search_strange_news():
             seen_hashes.add(news['content_hash'])
             unique_news.append(news)
     
+    # Убираем пересказы одной истории разными источниками (в цикле и в недавней истории)
+    history = [(content_hash, decode_signature(blob)) for content_hash, blob in get_recent_signatures()]
+    unique_news, near_duplicates = pick_representatives(unique_news, history)
+    logger.info(f"🧬 Отброшено почти одинаковых новостей: {near_duplicates}")
+    
+    return unique_news
+
+def crawl_strange_news():
+    """Поиск новостей во всех источниках с детальным логированием"""
+    with CYCLE_SECONDS.time(kind='search'):
+        return _crawl_strange_news()
+
+def _crawl_strange_news():
+    logger.info("🔍 Начинаем поиск новостей в источниках...")
+    
+    polls = crawl_sources(get_news_sources().items(), deadline=time.monotonic() + CYCLE_DEADLINE)
+    all_news = [item for poll in polls.values() for item in poll.items]
+    
+    # Детальная статистика по источникам
+    working_sources = {name: len(poll.items) for name, poll in polls.items() if poll.items}
+    
+    logger.info(f"📊 ИТОГИ ПОИСКА:")
+    logger.info(f"✅ Работающие источники ({len(working_sources)}): {working_sources}")
+    logger.info(f"📈 Всего сырых новостей: {len(all_news)}")
+    
+    with STAGE_SECONDS.time(stage='dedup'):
+        unique_news = deduplicate_news(all_news)
+    
     # Статистика по языкам
     lang_stats = {}
     for news in unique_news:
@@ -409,47 +735,53 @@ def search_strange_news():
     
     return unique_news
 
-def translate_text(text, src_lang):
-    """Переводим текст на русский"""
-    try:
-        if not text or len(text) < 3: 
-            return text
-            
-        lang_map = {
-            'zh': 'zh-CN', 'es': 'es', 'pt': 'pt', 'en': 'en',
-            'de': 'de', 'fr': 'fr', 'ru': 'ru'
-        }
-        
-        source_lang = lang_map.get(src_lang, 'auto')
-        
-        url = "https://translate.googleapis.com/translate_a/single"
-        params = {
-            'client': 'gtx',
-            'sl': source_lang,
-            'tl': 'ru', 
-            'dt': 't',
-            'q': text
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            return data[0][0][0] if data[0] else text
-        return text
-    except Exception:
-        return text
+# Одновременные поиски (/stats и HTTP /test) ждут один общий обход источников
+search_flight = SingleFlight(crawl_strange_news, SEARCH_CACHE_TTL)
+
+def search_strange_news(force_refresh=False):
+    """Поиск новостей: общий обход для одновременных вызовов и короткий кэш результата"""
+    return search_flight(force=force_refresh)
+
+def filter_new_articles(news_items):
+    """Статьи, которых еще нет в базе - одним запросом на весь цикл"""
+    unseen = set(filter_unpublished(article['content_hash'] for article in news_items))
+    return [article for article in news_items if article['content_hash'] in unseen]
+
+def mark_articles_as_published(articles):
+    """Отмечаем статьи опубликованными вместе с подписями для поиска пересказов"""
+    signatures = [encode_signature(article_signature(article)) for article in articles]
+    mark_many_as_published(articles, signatures)
+
+def get_texts_to_translate(article):
+    """Заголовок и (если есть) описание статьи для перевода"""
+    texts = [article['title']]
+    if article['description'] and len(article['description']) > 20:
+        texts.append(article['description'])
+    return texts
+
+def prefetch_translations(articles):
+    """Переводим все статьи цикла пачками по языкам - дальше перевод берется из кэша"""
+    texts_by_lang = {}
+    for article in articles:
+        texts_by_lang.setdefault(article['lang'], []).extend(get_texts_to_translate(article))
+    
+    for lang, texts in texts_by_lang.items():
+        translate_batch(texts, lang)
+        logger.info(f"🌐 Переведено пачкой {len(texts)} строк ({lang})")
 
 def create_news_message(article):
     """Создаем форматированное сообщение для ленты новостей"""
     original_lang = article['lang']
     
-    # Переводим заголовок
-    translated_title = translate_text(article['title'], original_lang)
+    # Заголовок и описание переводим одним запросом
+    texts = get_texts_to_translate(article)
+    translations = translate_batch(texts, original_lang)
+    translated_title = translations[0]
     
     # Краткий пересказ описания
     translated_summary = ""
-    if article['description'] and len(article['description']) > 20:
-        full_translation = translate_text(article['description'], original_lang)
+    if len(translations) > 1:
+        full_translation = translations[1]
         if len(full_translation) > 200:
             translated_summary = full_translation[:200] + "..."
         else:
@@ -478,9 +810,120 @@ def create_news_message(article):
     
     return message
 
+# Сверстанные сообщения по content_hash: перевод и верстка - один раз на статью
+message_cache = MessageCache()
+
+def render_message(article):
+    """Сообщение статьи из кэша; все чаты и повторные отправки получают один и тот же текст"""
+    return message_cache.get_or_render(article['content_hash'], lambda: create_news_message(article))
+
+def build_digest(articles, topics=ALL_MASK):
+    """Сообщения дайджеста: статьи по темам подписчика, внутри темы - по источникам"""
+    lines_by_topic = {name: [] for name in TOPIC_BITS}
+    for article in sorted(articles, key=lambda article: article['source']):
+        # Статья нескольких тем попадает в первую из выбранных подписчиком
+        mask = article_topics(article) & topics
+        topic = next(name for name, bit in TOPIC_BITS.items() if mask & bit)
+        # Перевод уже в кэше - его сделал этап верстки
+        title = translate_batch([article['title']], article['lang'])[0]
+        lines_by_topic[topic].append(digest_line(title, article['source'], article['url']))
+    return pack_digest([(TOPIC_TITLES[name], lines) for name, lines in lines_by_topic.items() if lines])
+
+# ========== ПОТОКОВЫЙ ЦИКЛ ==========
+def run_news_pipeline(sources, deliver, kind, on_poll=None, polls=None):
+    """Опрос -> фильтр -> пересказы -> перевод -> окно свежести -> доставка.
+    
+    Новости источника идут дальше, как только он ответил, и медленная лента не
+    задерживает остальные. deliver(article, message) возвращает True, если
+    статья доставлена; on_poll(имя, SourcePoll) вызывается по каждому источнику.
+    polls() - готовый поток (имя, SourcePoll) вместо опроса sources (общий
+    обход для нескольких конвейеров). В results отчета - доставленные статьи.
+    """
+    if polls is None:
+        polls = lambda: iter_source_polls(sources, deadline=time.monotonic() + CYCLE_DEADLINE)
+    history = [(content_hash, decode_signature(blob)) for content_hash, blob in get_recent_signatures()]
+    deduplicator = StreamingDeduplicator(history)
+    
+    # Чистое время перевода, верстки и отправки - без ожидания в очередях конвейера
+    timings = Counter()
+    timings_lock = threading.Lock()
+    
+    def timed(stage, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            STAGE_SECONDS.observe(elapsed, stage=stage)
+            with timings_lock:
+                timings[stage] += elapsed
+    
+    def filter_poll(polled):
+        source_name, poll = polled
+        if on_poll:
+            on_poll(source_name, poll)
+        new_articles = filter_new_articles(poll.items) if poll.items else []
+        return [new_articles] if new_articles else []
+    
+    def drop_near_duplicates(articles):
+        accepted = [article for article in articles if deduplicator.accept(article)]
+        return [accepted] if accepted else []
+    
+    def render(articles):
+        # Несверстанные новости источника переводим одним запросом, готовые берем из кэша
+        missing = [article for article in articles if article['content_hash'] not in message_cache]
+        if missing:
+            timed('translate', prefetch_translations, missing)
+        return [(article, timed('render', render_message, article)) for article in articles]
+    
+    def send(rendered):
+        article, message = rendered
+        # Финальная проверка: статью мог разослать параллельный цикл
+        if is_news_published(article['content_hash']) or not timed('send', deliver, article, message):
+            return []
+        mark_articles_as_published([article])
+        return [article]
+    
+    pipeline = (
+        Pipeline(queue_size=PIPELINE_QUEUE_SIZE)
+        .source('fetch', polls)
+        .stage('filter', filter_poll)
+        .stage('dedup', drop_near_duplicates)
+        .stage('render', render, workers=PIPELINE_RENDER_WORKERS)
+        .reorder('reorder', key=lambda rendered: rendered[0]['entry_time'],
+                 window=PIPELINE_REORDER_WINDOW, max_items=PIPELINE_REORDER_MAX_ITEMS)
+        .stage('send', send)
+    )
+    report = pipeline.run()
+    report.stages['render'].update(translate_seconds=round(timings['translate'], 3),
+                                   render_seconds=round(timings['render'], 3))
+    report.stages['send']['send_seconds'] = round(timings['send'], 3)
+    
+    if report.first_result_after is not None:
+        TIME_TO_FIRST_MESSAGE.observe(report.first_result_after, kind=kind)
+        logger.info(f"⚡ Первая новость доставлена через {report.first_result_after:.1f} с")
+    logger.info(f"🧬 Отброшено пересказов и дубликатов: {deduplicator.dropped}")
+    logger.info(f"⏱ Перевод {timings['translate']:.1f} с, верстка {timings['render']:.2f} с, "
+                f"отправка {timings['send']:.1f} с")
+    logger.info(f"🏁 Конвейер ({kind}): доставлено {len(report.results)} новостей за {report.elapsed:.1f} с")
+    return report
+
+# Одновременные /feed из разных чатов читают один общий обход источников, каждый
+# своим конвейером: опоздавший получает уже опрошенные источники, затем остальные
+feed_polls = SharedStream(
+    lambda: iter_source_polls(get_news_sources().items(), deadline=time.monotonic() + CYCLE_DEADLINE),
+    name='feed-crawl',
+)
+
 # ========== TELEGRAM BOT ==========
-def send_telegram_message(chat_id, text):
-    """Отправка сообщения в Telegram"""
+# Общая сессия для Bot API: рассылка идет из многих потоков
+telegram_session = requests.Session()
+telegram_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=BROADCAST_WORKERS)
+telegram_session.mount('http://', telegram_adapter)
+telegram_session.mount('https://', telegram_adapter)
+
+def send_message_result(chat_id, text):
+    """Отправка сообщения в Telegram с кодом ответа и retry_after"""
     try:
         url = f"{TELEGRAM_URL}/sendMessage"
         payload = {
@@ -489,104 +932,224 @@ def send_telegram_message(chat_id, text):
             'parse_mode': 'Markdown',
             'disable_web_page_preview': False
         }
-        response = requests.post(url, json=payload, timeout=10)
-        return response.status_code == 200
+        with TELEGRAM_SEND_SECONDS.time():
+            response = telegram_session.post(url, json=payload, timeout=10)
+        TELEGRAM_SENDS.inc(status=str(response.status_code))
+        if response.status_code == 200:
+            return SendResult(True, 200, None, None)
+        
+        # Описание ошибки нужно, чтобы отличить удаленный чат от временной ошибки
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        retry_after = body.get('parameters', {}).get('retry_after') if response.status_code == 429 else None
+        return SendResult(False, response.status_code, retry_after, body.get('description') or response.text[:200])
     except Exception as e:
+        TELEGRAM_SENDS.inc(status='error')
         logger.error(f"❌ Ошибка отправки сообщения: {e}")
-        return False
+        return SendResult(False, None, None, str(e))
+
+def send_telegram_message(chat_id, text):
+    """Отправка сообщения в Telegram"""
+    return send_message_result(chat_id, text).ok
+
+# Рассылка подписчикам под лимитами Telegram
+broadcaster = Broadcaster(send_message_result)
 
 def get_updates(offset=None):
-    """Получаем обновления от Telegram"""
+    """Получаем обновления от Telegram; None, если запрос не удался"""
     try:
         url = f"{TELEGRAM_URL}/getUpdates"
         params = {'timeout': 10, 'offset': offset} if offset else {'timeout': 10}
         response = requests.get(url, params=params, timeout=15)
         if response.status_code == 200:
             return response.json().get('result', [])
-        return []
+        # 409 - еще стоит webhook, 401 - неверный токен, 5xx - сбой Bot API
+        logger.warning(f"⚠️ getUpdates: {response.status_code} {response.text[:200]}")
+        return None
     except Exception as e:
         logger.error(f"❌ Ошибка получения updates: {e}")
-        return []
+        return None
+
+# Тяжелые команды выполняет фиксированный пул; повтор команды из того же чата склеивается
+job_executor = JobExecutor(workers=COMMAND_WORKERS, max_queue=COMMAND_QUEUE_SIZE)
+
+def submit_command_job(chat_id, command, job, started_text=None):
+    """Ставим команду в пул и отвечаем, если она уже выполняется или пул занят"""
+    result = job_executor.submit((chat_id, command), job)
+    if result == ACCEPTED:
+        if started_text:
+            send_telegram_message(chat_id, started_text)
+    elif result == DUPLICATE:
+        send_telegram_message(chat_id, "⏳ Команда уже выполняется, дождитесь результата")
+    else:
+        send_telegram_message(chat_id, "⚠️ Бот сейчас занят, попробуйте позже")
+    return result
+
+def process_update(update):
+    """Обрабатываем одно входящее сообщение"""
+    if 'message' in update:
+        message = update['message']
+        chat_id = message['chat']['id']
+        text = message.get('text', '')
+        user = message.get('from', {})
+        
+        # АВТОМАТИЧЕСКАЯ ПОДПИСКА ПРИ ЛЮБОМ СООБЩЕНИИ
+        add_subscriber(chat_id, user.get('username'), user.get('first_name'))
+        
+        if text == '/feed' or text == '/test':
+            def search_and_send():
+                try:
+                    # Не чаще лимита Telegram на один чат
+                    chat_bucket = TokenBucket(PER_CHAT_RATE, capacity=1)
+                    preferences = get_subscriber_preferences(chat_id)
+                    
+                    def deliver(article, message):
+                        # Статьи чужих тем не публикуем - они дождутся своих подписчиков
+                        if not wants_article(preferences, article):
+                            return False
+                        chat_bucket.acquire()
+                        return send_telegram_message(chat_id, message)
+                    
+                    report = run_news_pipeline(None, deliver, kind='command', polls=feed_polls)
+                    sent_count = len(report.results)
+                    
+                    chat_bucket.acquire()
+                    if sent_count > 0:
+                        send_telegram_message(chat_id, f"✅ Опубликовано {sent_count} новых новостей!")
+                    elif report.stages['filter']['emitted'] > 0:
+                        send_telegram_message(chat_id, "📭 Все новости уже были в ленте")
+                    else:
+                        send_telegram_message(chat_id, "🔍 Новых загадочных новостей не найдено")
+                        
+                except Exception as e:
+                    send_telegram_message(chat_id, "⚠️ Ошибка при загрузке ленты")
+                    logger.error(f"❌ Ошибка в поиске: {e}")
+            
+            submit_command_job(chat_id, '/feed', search_and_send, "🛸 Загружаю свежую ленту новостей...")
+        
+        elif text == '/stats':
+            # Быстрая проверка источников
+            def check_sources():
+                try:
+                    test_news = search_strange_news()
+                    send_telegram_message(chat_id, f"📊 Статистика: найдено {len(test_news)} новостей из {len(get_news_sources())} источников")
+                except Exception as e:
+                    send_telegram_message(chat_id, f"⚠️ Ошибка проверки: {e}")
+            
+            submit_command_job(chat_id, '/stats', check_sources, "📡 Проверяю работоспособность источников...")
+
+        elif text.startswith(('/topics', '/langs')):
+            send_telegram_message(chat_id, update_preferences(chat_id, text))
+
+        elif text.startswith(('/digest', '/instant')):
+            send_telegram_message(chat_id, update_delivery_mode(chat_id, text))
+
+        elif text == '/clear':
+            # Очистка старых новостей
+            def clear_db():
+                try:
+                    deleted_count = clear_old_news()
+                    send_telegram_message(chat_id, f"🧹 Очищено {deleted_count} старых новостей")
+                except Exception as e:
+                    send_telegram_message(chat_id, f"⚠️ Ошибка очистки: {e}")
+            
+            submit_command_job(chat_id, '/clear', clear_db)
+
+def parse_mask(args, bits):
+    """Названия из bits -> маска; 'all' - все; None, если есть неизвестное название"""
+    if args == ['all']:
+        return ALL_MASK
+    if not args or any(arg not in bits for arg in args):
+        return None
+    mask = 0
+    for arg in args:
+        mask |= bits[arg]
+    return mask
+
+def describe_preferences(chat_id):
+    """Текущие темы, языки и режим доставки подписчика"""
+    topics, langs = get_subscriber_preferences(chat_id)
+    topic_names = [title for name, title in TOPIC_TITLES.items() if topics & TOPIC_BITS[name]]
+    lang_names = [lang for lang, bit in LANG_BITS.items() if langs & bit]
+    if get_delivery_mode(chat_id) == DELIVERY_DIGEST:
+        delivery = f"дайджест раз в {DIGEST_INTERVAL / 3600:g} ч"
+    else:
+        delivery = 'каждая новость сразу'
+    return (f"📋 Темы: {', '.join(topic_names) or 'нет'}\n"
+            f"🌐 Языки источников: {', '.join(lang_names) or 'нет'}\n"
+            f"📬 Доставка: {delivery}")
+
+def update_preferences(chat_id, text):
+    """/topics space war, /langs en ru, 'all' - все; без аргументов - текущие настройки"""
+    command, *args = text.lower().split()
+    if command.startswith('/topics'):
+        command, bits, setter = '/topics', TOPIC_BITS, set_subscriber_topics
+    else:
+        command, bits, setter = '/langs', LANG_BITS, set_subscriber_langs
+    if args:
+        mask = parse_mask(args, bits)
+        if mask is None:
+            return f"⚠️ Доступно: {', '.join(bits)} или all\nПример: {command} {' '.join(list(bits)[:2])}"
+        setter(chat_id, mask)
+    return describe_preferences(chat_id) + "\n\nИзменить: /topics " + ' '.join(TOPIC_BITS) + \
+        ", /langs " + ' '.join(LANG_BITS) + " (или all), /digest или /instant"
+
+def update_delivery_mode(chat_id, text):
+    """/digest - накопленные новости дайджестом раз в DIGEST_INTERVAL, /instant - каждая новость отдельным сообщением"""
+    set_delivery_mode(chat_id, DELIVERY_DIGEST if text.startswith('/digest') else DELIVERY_INSTANT)
+    return describe_preferences(chat_id)
 
 def handle_updates():
-    """Обрабатываем входящие сообщения"""
+    """Забираем входящие сообщения long-poll запросом и отдаем их обработчикам; False при ошибке"""
     global last_update_id
     
     try:
         updates = get_updates(last_update_id)
+        if updates is None:
+            return False
         
         for update in updates:
             last_update_id = update['update_id'] + 1
-            
-            if 'message' in update:
-                message = update['message']
-                chat_id = message['chat']['id']
-                text = message.get('text', '')
-                user = message.get('from', {})
-                
-                # АВТОМАТИЧЕСКАЯ ПОДПИСКА ПРИ ЛЮБОМ СООБЩЕНИИ
-                add_subscriber(chat_id, user.get('username'), user.get('first_name'))
-                
-                if text == '/feed' or text == '/test':
-                    send_telegram_message(chat_id, "🛸 Загружаю свежую ленту новостей...")
-                    
-                    def search_and_send():
-                        try:
-                            news_items = search_strange_news()
-                            
-                            if news_items:
-                                send_telegram_message(chat_id, f"📊 *Найдено новостей:* {len(news_items)}")
-                                time.sleep(1)
-                                
-                                sent_count = 0
-                                for article in news_items:
-                                    # Финальная проверка перед отправкой
-                                    if not is_news_published(article['content_hash']):
-                                        message = create_news_message(article)
-                                        if send_telegram_message(chat_id, message):
-                                            mark_news_as_published(article['url'], article['title'], article['source'], article['lang'], article['content_hash'])
-                                            sent_count += 1
-                                        time.sleep(1)
-                                
-                                if sent_count > 0:
-                                    send_telegram_message(chat_id, f"✅ Опубликовано {sent_count} новых новостей!")
-                                else:
-                                    send_telegram_message(chat_id, "📭 Все новости уже были в ленте")
-                            else:
-                                send_telegram_message(chat_id, "🔍 Новых загадочных новостей не найдено")
-                                
-                        except Exception as e:
-                            send_telegram_message(chat_id, "⚠️ Ошибка при загрузке ленты")
-                            logger.error(f"❌ Ошибка в поиске: {e}")
-                    
-                    threading.Thread(target=search_and_send, daemon=True).start()
-                
-                elif text == '/stats':
-                    # Быстрая проверка источников
-                    send_telegram_message(chat_id, "📡 Проверяю работоспособность источников...")
-                    
-                    def check_sources():
-                        try:
-                            test_news = search_strange_news()
-                            send_telegram_message(chat_id, f"📊 Статистика: найдено {len(test_news)} новостей из {len(NEWS_SOURCES)} источников")
-                        except Exception as e:
-                            send_telegram_message(chat_id, f"⚠️ Ошибка проверки: {e}")
-                    
-                    threading.Thread(target=check_sources, daemon=True).start()
-
-                elif text == '/clear':
-                    # Очистка старых новостей
-                    def clear_db():
-                        try:
-                            deleted_count = clear_old_news()
-                            send_telegram_message(chat_id, f"🧹 Очищено {deleted_count} старых новостей")
-                        except Exception as e:
-                            send_telegram_message(chat_id, f"⚠️ Ошибка очистки: {e}")
-                    
-                    threading.Thread(target=clear_db, daemon=True).start()
+            update_dispatcher.submit(update, block=True)
+        return True
                         
     except Exception as e:
         logger.error(f"❌ Ошибка в обработке updates: {e}")
+        return False
+
+def set_webhook():
+    """Регистрируем webhook с секретным токеном; False, если Telegram его не принял"""
+    try:
+        response = requests.post(f"{TELEGRAM_URL}/setWebhook", json={
+            'url': WEBHOOK_URL,
+            'secret_token': WEBHOOK_SECRET,
+            'allowed_updates': ['message'],
+            'max_connections': UPDATE_WORKERS * 2,
+        }, timeout=15)
+    except Exception as e:
+        logger.error(f"❌ setWebhook {WEBHOOK_URL}: {e}")
+        return False
+    if response.status_code != 200:
+        logger.error(f"❌ setWebhook {WEBHOOK_URL}: {response.status_code} {response.text[:200]}")
+        return False
+    logger.info(f"🔗 setWebhook {WEBHOOK_URL}: {response.status_code} {response.text[:200]}")
+    return True
+
+def delete_webhook():
+    """Снимаем webhook - иначе getUpdates вернет конфликт"""
+    try:
+        requests.post(f"{TELEGRAM_URL}/deleteWebhook", timeout=15)
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось снять webhook: {e}")
+
+# Входящие updates обрабатывает фиксированный пул потоков из ограниченной очереди
+update_dispatcher = UpdateDispatcher(process_update, workers=UPDATE_WORKERS, max_queue=UPDATE_QUEUE_SIZE)
+
+registry.gauge('nauka_subscribers_active', 'Активных подписчиков', function=count_subscribers)
+registry.gauge('nauka_update_queue_depth', 'Updates в очереди', function=update_dispatcher.depth)
+registry.gauge('nauka_job_queue_depth', 'Команд в очереди', function=lambda: job_executor.stats()['queue_depth'])
 
 # ========== ПРОБУЖДЕНИЕ СЕРВЕРА ==========
 def wake_up_server():
@@ -612,77 +1175,178 @@ def wake_up_server():
         return False
 
 # ========== АВТОМАТИЧЕСКАЯ ЛЕНТА С ПРОБУЖДЕНИЕМ ==========
+# Как часто пингуем сервер, чтобы хостинг его не усыплял
+WAKE_UP_INTERVAL = 600
+
+# Расписание опросов: у каждого источника свой интервал
+poll_scheduler = PollScheduler(NEWS_SOURCES)
+
+def record_broadcast(report):
+    """Сохраняем итоги рассылки; заблокировавшие бота и удаленные чаты выключаем"""
+    record_deliveries(report.reached, report.failed_chats, report.unreachable)
+    for reason in report.unreachable.values():
+        SUBSCRIBERS_DEACTIVATED.inc(reason=reason)
+    return len(report.unreachable)
+
+# Рассылку ведет очередь в базе: цикл только ставит сообщения, отправляет outbox_worker
+# Завершенные строки очереди и разосланные статьи дайджеста живут дольше окна
+# свежести новостей: published_news чистится через сутки, а статья до
+# MAX_NEWS_AGE_DAYS может снова найтись после рестарта - очередь ее не задвоит
+OUTBOX_RETENTION = (MAX_NEWS_AGE_DAYS + 1) * 24 * 3600
+outbox = OutboxWorker(broadcaster, on_report=record_broadcast, retention=OUTBOX_RETENTION)
+# Как часто разборщик проверяет очередь без уведомлений (повторы по расписанию)
+OUTBOX_IDLE_WAIT = 5
+
+registry.gauge('nauka_outbox_pending', 'Сообщений в очереди отправки', function=lambda: outbox.stats().get('pending', 0))
+registry.gauge('nauka_outbox_send_rate', 'Скорость отправки последней пачки очереди, сообщ/с',
+               function=lambda: outbox.send_rate)
+
+def broadcast_article(article, message):
+    """Ставим статью в очередь активным подписчикам; True, если у нее есть получатели"""
+    with STAGE_SECONDS.time(stage='broadcast'):
+        # Только подписчики, чьи темы и языки совпадают со статьей
+        queued = enqueue_broadcast(article['content_hash'], message, article_topics(article), article_langs(article))
+    if queued:
+        outbox.notify()
+        logger.info(f"📬 '{article['title'][:50]}...' в очереди для {queued} чатов")
+    return queued > 0
+
+def digest_article(article):
+    """Поля статьи, нужные дайджесту - они ждут рассылки дайджеста в базе"""
+    fields = ('content_hash', 'title', 'lang', 'source', 'url', 'keywords')
+    return dict({field: article.get(field) for field in fields}, topics=article_topics(article))
+
+def digest_due(now=None):
+    """Прошло ли DIGEST_INTERVAL с последней рассылки дайджестов (время хранится в базе)"""
+    sent_at = get_bot_state(DIGEST_SENT_AT)
+    return sent_at is None or (now or time.time()) - sent_at >= DIGEST_INTERVAL
+
+def send_digests(groups, now=None):
+    """Дайджест накопленных статей подписчикам режима digest.
+
+    groups - пары масок (topics, langs) подписчиков дайджеста: дайджест
+    верстается один раз на пару и ставится в очередь ее чатам, части - по
+    порядку. Время рассылки сохраняется, даже если статей не было, - следующий
+    дайджест будет через DIGEST_INTERVAL. Возвращаем число поставленных в
+    очередь сообщений.
+    """
+    articles = get_digest_articles()
+    if not articles:
+        enqueue_digests([], [], sent_at=now or time.time())
+        return 0
+    started = time.monotonic()
+    with STAGE_SECONDS.time(stage='digest'):
+        digests = []
+        for topics, langs in groups:
+            selected = [article for article in articles if wants_article((topics, langs), article)]
+            if not selected:
+                continue
+            # Ключ зависит только от состава дайджеста - повтор после рестарта не задвоит его
+            content = f"{topics}:" + ','.join(article['content_hash'] for article in selected)
+            digest_id = hashlib.md5(content.encode()).hexdigest()[:16]
+            parts = [(f"digest:{digest_id}:{index}", text)
+                     for index, text in enumerate(build_digest(selected, topics))]
+            digests.append((topics, langs, parts))
+        queued = enqueue_digests(digests, [article['content_hash'] for article in articles],
+                                 sent_at=now or time.time())
+    if queued:
+        outbox.notify()
+    logger.info(f"📰 Дайджест: {len(articles)} новостей, {len(digests)} вариантов, "
+                f"в очереди {queued} сообщений, {time.monotonic() - started:.1f} с")
+    return queued
+
+def outbox_worker():
+    """Рабочий поток очереди отправки; после рестарта продолжает с неотправленного"""
+    while True:
+        leader.wait()
+        try:
+            if not outbox.drain_batch():
+                outbox.wait(OUTBOX_IDLE_WAIT)
+        except Exception as e:
+            logger.error(f"❌ Ошибка в очереди отправки: {e}")
+            time.sleep(10)
+
 def auto_news_feed():
-    """Автоматическое обновление ленты с предварительным пробуждением сервера"""
+    """Автоматическое обновление ленты по адаптивному расписанию источников"""
     # Ждем 5 минут после запуска бота перед первым обновлением
     time.sleep(300)
     
     cycle_count = 0
+    last_wake_up = 0
     
     while True:
+        # Фоновые циклы работают только в ведущем процессе
+        leader.wait()
         try:
+            # 🔄 ШАГ 1: Не даем серверу уснуть
+            if time.monotonic() - last_wake_up >= WAKE_UP_INTERVAL:
+                if not wake_up_server():
+                    logger.warning("⚠️ Не удалось разбудить сервер, продолжаем...")
+                last_wake_up = time.monotonic()
+            
+            # 🔄 ШАГ 2: Ждем, пока не подойдет срок опроса какого-нибудь источника
+            news_sources = get_news_sources()
+            poll_scheduler.sync(news_sources)
+            due_sources = poll_scheduler.pop_due()
+            if not due_sources:
+                time.sleep(min(poll_scheduler.seconds_until_next(), WAKE_UP_INTERVAL) + 1)
+                continue
+            
             cycle_count += 1
-            logger.info(f"🕒 Цикл авто-обновления #{cycle_count}")
+            logger.info(f"🕒 Цикл авто-обновления #{cycle_count}: опрашиваем {len(due_sources)} источников")
             
-            # 🔄 ШАГ 1: Будим сервер за 3 минуты до обновления
-            logger.info("⏰ Будим сервер перед обновлением...")
-            if wake_up_server():
-                logger.info("😴 Ждем 3 минуты для полного пробуждения сервера...")
-                time.sleep(180)  # Ждем 3 минуты для полного пробуждения
-            else:
-                logger.warning("⚠️ Не удалось разбудить сервер, продолжаем...")
+            cycle_started = time.perf_counter()
+            sources = [(name, news_sources[name]) for name in due_sources]
+            polled = set()
+            
+            def record_poll(name, poll):
+                polled.add(name)
+                if poll.ok:
+                    poll_scheduler.record_success(name, poll.new_entries, poll.ttl_seconds)
+                else:
+                    poll_scheduler.record_failure(name)
             
-            # 🔄 ШАГ 2: Проверяем подписчиков
-            subscribers = get_subscribers()
-            if not subscribers:
-                logger.info("📭 Нет подписчиков, пропускаем обновление")
-                time.sleep(1500)  # 25 минут до следующей попытки
+            # 🔄 ШАГ 3: Проверяем подписчиков
+            if not count_subscribers():
+                for name, poll in iter_source_polls(sources):
+                    record_poll(name, poll)
+                logger.info("📭 Нет подписчиков, пропускаем рассылку")
                 continue
-                
-            # 🔄 ШАГ 3: Запускаем поиск новостей
-            logger.info("🔍 Запускаем поиск новостей...")
             
-            if search_lock.acquire(blocking=False):
-                try:
-                    news_items = search_strange_news()
-                    
-                    if news_items:
-                        new_count = 0
-                        
-                        for article in news_items:
-                            if not is_news_published(article['content_hash']):
-                                message = create_news_message(article)
-                                
-                                success_count = 0
-                                for chat_id in subscribers:
-                                    if send_telegram_message(chat_id, message):
-                                        success_count += 1
-                                    time.sleep(0.3)
-                                
-                                if success_count > 0:
-                                    mark_news_as_published(article['url'], article['title'], article['source'], article['lang'], article['content_hash'])
-                                    new_count += 1
-                                    logger.info(f"✅ Новость опубликована: {article['title'][:50]}...")
-                                time.sleep(2)
-                        
-                        if new_count > 0:
-                            logger.info(f"✅ В ленту добавлено {new_count} новостей")
-                            # Уведомляем только первого подписчика
-                            for chat_id in subscribers[:1]:
-                                send_telegram_message(chat_id, f"🆕 *ОБНОВЛЕНИЕ ЛЕНТЫ*\nДобавлено {new_count} новых новостей!")
-                        else:
-                            logger.info("📭 Новых новостей для ленты нет")
-                    else:
-                        logger.info("🔍 Новостей для ленты не найдено")
-                        
-                finally:
-                    search_lock.release()
+            # 🔄 ШАГ 4: Рассылаем новое по мере ответа источников
+            digest_groups = get_digest_groups()
+            
+            def deliver(article, message):
+                # Мгновенным подписчикам - сразу в очередь, подписчикам дайджеста - в накопитель
+                queued = broadcast_article(article, message)
+                if any(wants_article(group, article) for group in digest_groups):
+                    add_digest_article(article['content_hash'], digest_article(article))
+                    return True
+                return queued
+            
+            report = run_news_pipeline(
+                sources,
+                deliver=deliver,
+                kind='auto', on_poll=record_poll,
+            )
+            for name in due_sources:
+                if name not in polled:
+                    poll_scheduler.record_failure(name)
+            
+            new_count = len(report.results)
+            if new_count > 0:
+                logger.info(f"✅ В ленту добавлено {new_count} новостей")
+                # Уведомляем только первого подписчика
+                for chat_id in next(iter_subscriber_pages(page_size=1), []):
+                    send_telegram_message(chat_id, f"🆕 *ОБНОВЛЕНИЕ ЛЕНТЫ*\nДобавлено {new_count} новых новостей!")
             else:
-                logger.info("⏳ Пропускаем цикл - другой поиск уже выполняется")
+                logger.info("📭 Новых новостей для ленты нет")
             
-            # 🔄 ШАГ 4: Ждем 27 минут до следующего пробуждения
-            logger.info("💤 Ожидаем 27 минут до следующего обновления...")
-            time.sleep(1620)  # 27 минут
+            # 🔄 ШАГ 5: Раз в DIGEST_INTERVAL - накопленные новости подписчикам дайджеста
+            if digest_due():
+                send_digests(digest_groups)
+            
+            CYCLE_SECONDS.observe(time.perf_counter() - cycle_started, kind='auto')
             
         except Exception as e:
             logger.error(f"❌ Ошибка в авто-обновлении ленты: {e}")
@@ -700,14 +1364,104 @@ def health():
     return {
         "status": "ok", 
         "bot": "running",
+        "translation_cache": translation_cache.stats(),
+        "message_cache": message_cache.stats(),
+        "outbox": outbox.stats(),
+        "search": search_flight.stats(),
+        "feed_crawl": feed_polls.stats(),
+        "jobs": job_executor.stats(),
+        "leader": dict(leader.as_dict(), lease=get_lease(LEADER_LEASE_NAME)),
+        "updates": {
+            "mode": TELEGRAM_MODE,
+            "webhook_registered": webhook_registered.is_set(),
+            "queue_depth": update_dispatcher.depth(),
+            "accepted": update_dispatcher.accepted,
+            "rejected": update_dispatcher.rejected,
+        },
         "timestamp": datetime.now().isoformat()
     }
 
+@app.route('/metrics')
+def metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/webhook', methods=['POST'])
+def telegram_webhook():
+    """Прием updates от Telegram: проверяем секрет, ставим в очередь и сразу отвечаем"""
+    secret = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not WEBHOOK_SECRET or not hmac.compare_digest(secret, WEBHOOK_SECRET):
+        return {"error": "forbidden"}, 403
+    
+    update = request.get_json(silent=True)
+    if not update or 'update_id' not in update:
+        return {"error": "bad request"}, 400
+    
+    # Очередь переполнена - Telegram повторит доставку позже
+    if not update_dispatcher.submit(update):
+        logger.warning("⚠️ Очередь updates переполнена")
+        return {"error": "busy"}, 503
+    return {"ok": True}
+
+def is_admin_request():
+    """Изменять реестр источников и обходить кэш поиска можно только с ADMIN_TOKEN"""
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+@app.route('/sources')
+def sources():
+    """Реестр источников с автоматами отключения и задержками"""
+    health = source_health.snapshot()
+    return {name: dict(info, health=health.get(name))
+            for name, info in get_sources(include_disabled=True).items()}
+
+@app.route('/sources', methods=['POST'])
+def save_source():
+    """Добавляем или меняем источник: {"name", "url", "lang", "enabled", ...опции}"""
+    if not is_admin_request():
+        return {"error": "forbidden"}, 403
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return {"error": "нужен JSON-объект"}, 400
+    name = data.pop('name', None)
+    if not isinstance(name, str) or not name.strip():
+        return {"error": "нужно name"}, 400
+    try:
+        info = normalize_source(data)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    
+    upsert_source(name, info)
+    invalidate_sources()
+    logger.info(f"📚 Источник {name} сохранен в реестре")
+    return {"ok": True, "name": name}
+
+@app.route('/sources/<name>', methods=['DELETE'])
+def remove_source(name):
+    """Удаляем источник из реестра"""
+    if not is_admin_request():
+        return {"error": "forbidden"}, 403
+    if not delete_source(name):
+        return {"error": "not found"}, 404
+    
+    invalidate_sources()
+    logger.info(f"📚 Источник {name} удален из реестра")
+    return {"ok": True}
+
+@app.route('/schedule')
+def schedule():
+    """Расписание опроса источников"""
+    return poll_scheduler.snapshot()
+
 @app.route('/test')
 def test():
-    """Тестовый эндпоинт для проверки поиска новостей"""
+    """Тестовый эндпоинт для проверки поиска новостей; ?refresh=1 (только с ADMIN_TOKEN) - мимо кэша"""
+    refresh = request.args.get('refresh') == '1'
+    if refresh and not is_admin_request():
+        return {"error": "forbidden"}, 403
     try:
-        news = search_strange_news()
+        news = search_strange_news(force_refresh=refresh)
         return {
             "news_count": len(news),
             "news": news[:3]  # Первые 3 новости для примера
@@ -716,12 +1470,36 @@ def test():
         return {"error": str(e)}, 500
 
 # ========== ИНИЦИАЛИЗАЦИЯ И ЗАПУСК ==========
+# Webhook регистрирует webhook_worker после каждого избрания, повторяя неудачный setWebhook
+webhook_needed = threading.Event()
+webhook_registered = threading.Event()
+
+def on_elected():
+    """Процесс стал ведущим: забираем прием updates у Telegram"""
+    if TELEGRAM_MODE == 'webhook':
+        # Telegram сам присылает updates на /webhook любого процесса
+        webhook_registered.clear()
+        webhook_needed.set()
+    else:
+        # Локально: long-poll getUpdates только в ведущем процессе
+        delete_webhook()
+
+# Под gunicorn с несколькими воркерами авто-лента и getUpdates работают в одном из них
+leader = LeaderElector(LEADER_LEASE_NAME, on_elected=on_elected)
+registry.gauge('nauka_leader', '1 - процесс ведущий', function=lambda: int(leader.is_leader))
+
 def initialize_bot():
     """Инициализация и запуск бота"""
     logger.info("🚀 Запуск UFO News Feed бота...")
     
-    # Инициализируем базу
+    if TELEGRAM_MODE == 'webhook' and not WEBHOOK_SECRET:
+        # Telegram не примет setWebhook с пустым secret_token, а /webhook отклонит все updates
+        logger.critical("❌ TELEGRAM_MODE=webhook без WEBHOOK_SECRET: бот не получит ни одного сообщения")
+        raise RuntimeError("TELEGRAM_MODE=webhook требует WEBHOOK_SECRET")
+    
+    # Инициализируем базу и реестр источников
     init_db()
+    init_sources()
     
     # Очищаем старые новости при запуске
     clear_old_news()
@@ -729,28 +1507,63 @@ def initialize_bot():
     global last_update_id
     last_update_id = 0
     
-    # Запускаем авто-обновление ленты в отдельном потоке
-    threading.Thread(target=auto_news_feed, daemon=True).start()
+    # Запускаем обработчики входящих сообщений и команд (в каждом процессе)
+    job_executor.start()
+    update_dispatcher.start()
     
-    # Запускаем обработку Telegram updates в отдельном потоке
-    threading.Thread(target=updates_worker, daemon=True).start()
+    # Авто-лента, очередь отправки и getUpdates ждут, пока процесс не станет ведущим
+    threading.Thread(target=auto_news_feed, daemon=True).start()
+    threading.Thread(target=outbox_worker, daemon=True).start()
+    if TELEGRAM_MODE == 'webhook':
+        threading.Thread(target=webhook_worker, daemon=True).start()
+    else:
+        threading.Thread(target=updates_worker, daemon=True).start()
+    leader.start()
+    atexit.register(leader.stop)
     
-    logger.info(f"✅ Лента новостей запущена! {len(NEWS_SOURCES)} источников активны")
-    logger.info("⏰ Авто-обновление каждые 30 минут с пробуждением сервера")
+    logger.info(f"✅ Лента новостей запущена! {len(get_news_sources())} источников активны ({CRAWL_ENGINE})")
+    logger.info("⏰ Источники опрашиваются по адаптивному расписанию (от 3 минут до 6 часов)")
     logger.info("🤖 Бот готов к работе - отправьте любое сообщение для подписки")
 
+# Пауза после неудачного getUpdates растет вдвое до максимума и сбрасывается после успешного
+UPDATES_BACKOFF_START = 2
+UPDATES_BACKOFF_MAX = 60
+
 def updates_worker():
     """Рабочий поток для обработки Telegram updates"""
+    backoff = UPDATES_BACKOFF_START
     while True:
+        leader.wait()
         try:
-            handle_updates()
-            time.sleep(2)
+            ok = handle_updates()
         except Exception as e:
             logger.error(f"❌ Ошибка в обработке updates: {e}")
-            time.sleep(10)
+            ok = False
+        if ok:
+            # Успешный long-poll сам ждет до 10 секунд - паузы не нужно
+            backoff = UPDATES_BACKOFF_START
+            continue
+        time.sleep(backoff)
+        backoff = min(backoff * 2, UPDATES_BACKOFF_MAX)
+
+def webhook_worker():
+    """Регистрация webhook в ведущем процессе: повторяем setWebhook с растущей паузой"""
+    backoff = UPDATES_BACKOFF_START
+    while True:
+        webhook_needed.wait()
+        leader.wait()
+        if set_webhook():
+            webhook_needed.clear()
+            webhook_registered.set()
+            backoff = UPDATES_BACKOFF_START
+            continue
+        logger.warning(f"⚠️ Webhook не зарегистрирован, повтор через {backoff} с")
+        time.sleep(backoff)
+        backoff = min(backoff * 2, UPDATES_BACKOFF_MAX)
 
 # Запускаем бота при импорте
-initialize_bot()
+if BOT_AUTOSTART:
+    initialize_bot()
 
 # Запуск для Render
 if __name__ == '__main__':
@@ -0,0 +1,155 @@
+"""Асинхронная загрузка лент (aiohttp) для сотен и тысяч источников
+
+Цикл событий живет в отдельном потоке вместе с одной ClientSession, поэтому
+keep-alive соединения и кэш DNS переживают циклы опроса. Вызывающий код
+остается синхронным: fetch_many отдает результаты по мере готовности.
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+
+try:
+    import aiohttp
+except ImportError:  # движок необязателен: без aiohttp остается пул потоков
+    aiohttp = None
+
+from feed_fetcher import (
+    FEED_HEDGES, FETCH_TIMEOUT, USER_AGENT, FetchDeadlineExceeded, build_conditional_headers, finish_fetch,
+)
+
+logger = logging.getLogger(__name__)
+
+# ========== НАСТРОЙКИ ==========
+# Сколько источников загружается одновременно
+CRAWL_CONCURRENCY = int(os.environ.get('CRAWL_CONCURRENCY', 64))
+# Соединений к одному хосту: региональные ленты часто живут на одной платформе
+CRAWL_LIMIT_PER_HOST = int(os.environ.get('CRAWL_LIMIT_PER_HOST', 4))
+DNS_CACHE_TTL = 600
+
+
+def is_available():
+    return aiohttp is not None
+
+
+class AsyncFeedFetcher:
+    """Загрузчик с ограничением одновременных запросов, лимитом на хост и кэшем DNS"""
+
+    def __init__(self, concurrency=CRAWL_CONCURRENCY, limit_per_host=CRAWL_LIMIT_PER_HOST):
+        self.concurrency = concurrency
+        self.limit_per_host = limit_per_host
+        self._loop = None
+        self._session = None
+        self._semaphore = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='async-crawler', daemon=True).start()
+            asyncio.run_coroutine_threadsafe(self._open_session(), loop).result()
+            self._loop = loop
+
+    async def _open_session(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency, limit_per_host=self.limit_per_host, ttl_dns_cache=DNS_CACHE_TTL,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, headers={
+            'User-Agent': USER_AGENT,
+            'Accept': 'application/rss+xml, application/atom+xml, application/xml;q=0.9, */*;q=0.8',
+        })
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def _download(self, url, headers, timeout, deadline):
+        connect, read = timeout
+        total = None
+        if deadline is not None:
+            total = deadline - time.monotonic()
+            if total <= 0:
+                raise FetchDeadlineExceeded(f"{url}: срок цикла истек до запроса")
+        client_timeout = aiohttp.ClientTimeout(total=total, sock_connect=connect, sock_read=read)
+        try:
+            async with self._session.get(url, headers=headers, timeout=client_timeout) as response:
+                content = await response.read() if response.status == 200 else b''
+                return finish_fetch(url, response.status, response.headers, content)
+        except asyncio.TimeoutError:
+            raise FetchDeadlineExceeded(f"{url}: таймаут загрузки")
+
+    async def _hedged_download(self, url, headers, timeout, deadline, hedge_after):
+        """Второй запрос, если первый не ответил за hedge_after секунд; берем первый успешный"""
+        primary = asyncio.ensure_future(self._download(url, headers, timeout, deadline))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        logger.info(f"🔀 {url}: нет ответа за {hedge_after:.1f} с, дублируем запрос")
+        hedge = asyncio.ensure_future(self._download(url, headers, timeout, deadline))
+        names = {primary: 'primary', hedge: 'hedge'}
+        pending = set(names)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    FEED_HEDGES.inc(winner=names[task])
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    async def _fetch_one(self, key, url, timeout, hedge_after, deadline, put):
+        async with self._semaphore:
+            started = time.perf_counter()
+            headers = build_conditional_headers(url)
+            try:
+                if hedge_after is not None:
+                    result = await self._hedged_download(url, headers, timeout, deadline, hedge_after)
+                else:
+                    result = await self._download(url, headers, timeout, deadline)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result = e
+            put((key, result, time.perf_counter() - started))
+
+    async def _run(self, jobs, deadline, put):
+        tasks = {
+            asyncio.ensure_future(self._fetch_one(key, url, tuple(timeout or FETCH_TIMEOUT), hedge_after,
+                                                  deadline, put)): key
+            for key, url, timeout, hedge_after in jobs
+        }
+        if not tasks:
+            return
+        timeout = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+            put((tasks[task], FetchDeadlineExceeded("срок цикла истек"), None))
+
+    def close(self):
+        """Закрываем сессию и останавливаем цикл событий"""
+        with self._start_lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+    def fetch_many(self, jobs, deadline=None):
+        """jobs - [(ключ, url, (connect, read), hedge_after)].
+
+        Отдаем (ключ, FeedResponse или исключение, секунды загрузки) по мере готовности;
+        после deadline (time.monotonic()) оставшиеся приходят с FetchDeadlineExceeded.
+        """
+        jobs = list(jobs)
+        self._ensure_started()
+        results = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._run(jobs, deadline, results.put), self._loop)
+        for _ in range(len(jobs)):
+            yield results.get()
+        future.result()
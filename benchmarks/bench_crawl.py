@@ -0,0 +1,96 @@
+"""Бенчмарк обхода тысяч источников: пул потоков против асинхронного движка
+
+Реестр источников заполняется N сгенерированными лентами (fakes.build_fixtures),
+которые отдает один fakes.FeedServer с задержкой ответа. Для каждого движка
+(CRAWL_ENGINE = threads / async) замеряются холодный обход (200, разбор) и
+повторный (304) в источниках в секунду.
+
+Все ленты стенда живут на одном хосте 127.0.0.1, поэтому лимит соединений на
+хост (CRAWL_LIMIT_PER_HOST) здесь поднят до общего лимита - иначе замер
+показал бы лимит на хост, а не движок.
+
+Запуск: python benchmarks/bench_crawl.py [--sources 1000] [--feed-latency 0.2]
+        [--concurrency 64]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FeedServer, build_fixtures  # noqa: E402
+
+LANGS = ('en', 'ru', 'de', 'fr', 'pt')
+
+
+def crawl(App, feeds, names):
+    feeds.reset_counters()
+    sources = App.get_news_sources()
+    start = time.perf_counter()
+    polls = App.crawl_sources(sources.items(), deadline=time.monotonic() + App.CYCLE_DEADLINE)
+    seconds = time.perf_counter() - start
+    ok = sum(1 for name in names if polls[name].ok)
+    return seconds, ok, feeds.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sources', type=int, default=1000)
+    parser.add_argument('--entries', type=int, default=30, help='записей в каждой ленте')
+    parser.add_argument('--feed-latency', type=float, default=0.2)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--deadline', type=float, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            'BOT_AUTOSTART': '0',
+            'DB_PATH': os.path.join(tmp, 'bench.db'),
+            'CRAWL_CONCURRENCY': str(args.concurrency),
+            'CRAWL_LIMIT_PER_HOST': str(args.concurrency),
+            'CYCLE_DEADLINE': str(args.deadline),
+            'FEED_HEDGING': '0',
+        })
+        import App  # noqa: E402
+        import feed_fetcher  # noqa: E402
+        import storage  # noqa: E402
+        logging.disable(logging.WARNING)
+
+        sources = {f"Source {index:04d}": {'url': '', 'lang': LANGS[index % len(LANGS)]}
+                   for index in range(args.sources)}
+        feeds = FeedServer(build_fixtures(sources, args.entries), latency=args.feed_latency).start()
+
+        App.init_db()
+        for name, info in sources.items():
+            App.upsert_source(name, dict(info, url=feeds.urls[name]))
+        App.invalidate_sources()
+
+        print(f"{args.sources} источников, задержка ленты {args.feed_latency * 1000:.0f} мс, "
+              f"одновременно {args.concurrency} (потоков: {App.CRAWL_THREADS})")
+        print(f"{'движок':<9}{'обход':<8}{'сек':>8}{'ист/с':>9}{'успешно':>9}{'304':>7}")
+        # Без aiohttp App сам переходит на пул потоков
+        engines = ('threads', 'async') if App.async_fetcher else ('threads',)
+        for engine in engines:
+            App.CRAWL_ENGINE = engine
+            # Оба движка начинают с пустых кэша валидаторов и высших отметок
+            with feed_fetcher._cache_lock:
+                feed_fetcher._cache.clear()
+            with storage.write_transaction() as conn:
+                conn.execute('DELETE FROM source_state')
+            for label in ('cold', '304'):
+                seconds, ok, stats = crawl(App, feeds, sources)
+                print(f"{engine:<9}{label:<8}{seconds:>8.2f}{len(sources) / seconds:>9.0f}"
+                      f"{ok:>9}{stats['not_modified']:>7}")
+
+        if App.async_fetcher:
+            App.async_fetcher.close()
+        feeds.stop()
+        storage.close_connection()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Бенчмарк проверки дубликатов на большой истории published_news
+
+Заполняет таблицу (по умолчанию 1 млн строк) и сравнивает:
+- поштучный is_news_published без индекса (как было) и с индексом;
+- один запрос filter_unpublished на весь цикл;
+- clear_old_news с индексом по published_at и без него.
+
+Запуск: python benchmarks/bench_dedup.py [--rows 1000000] [--candidates 200]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+
+INDEXES = ('idx_published_news_content_hash', 'idx_published_news_published_at')
+
+
+def content_hash(i):
+    return hashlib.md5(f"article-{i}".encode()).hexdigest()
+
+
+def seed(rows, old_share=0.05):
+    """Заполняем историю: old_share строк старше суток"""
+    old_every = max(1, round(1 / old_share)) if old_share else 0
+    conn = storage.get_connection()
+    batch = []
+    with storage.write_transaction():
+        for i in range(rows):
+            age = '-2 days' if old_every and i % old_every == 0 else '-1 hours'
+            batch.append((f"https://example.com/{i}", f"Title {i}", 'Bench', 'en', content_hash(i), age))
+            if len(batch) == 50000:
+                conn.executemany(
+                    "INSERT INTO published_news (url, title, source, lang, content_hash, published_at) "
+                    "VALUES (?, ?, ?, ?, ?, datetime('now', ?))", batch)
+                batch = []
+        if batch:
+            conn.executemany(
+                "INSERT INTO published_news (url, title, source, lang, content_hash, published_at) "
+                "VALUES (?, ?, ?, ?, ?, datetime('now', ?))", batch)
+
+
+def drop_indexes():
+    with storage.write_transaction() as conn:
+        for index in INDEXES:
+            conn.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def per_item(candidates):
+    return [h for h in candidates if not storage.is_news_published(h)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--candidates', type=int, default=200, help='статей-кандидатов за цикл')
+    args = parser.parse_args()
+
+    # Половина кандидатов уже в истории, половина новые
+    candidates = [content_hash(i) for i in range(0, args.candidates // 2)]
+    candidates += [content_hash(args.rows + i) for i in range(args.candidates - len(candidates))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.set_db_path(os.path.join(tmp, 'bench.db'))
+        storage.init_db()
+        _, seed_time = timed(seed, args.rows)
+        print(f"📦 Заполнено {args.rows} строк за {seed_time:.1f} с")
+
+        _, indexed_loop = timed(per_item, candidates)
+        unseen, bulk = timed(storage.filter_unpublished, candidates)
+        assert len(unseen) == args.candidates - args.candidates // 2
+
+        # Удаление по диапазону: с индексом по published_at
+        _, clear_indexed = timed(storage.clear_old_news)
+        _, idle_indexed = timed(storage.clear_old_news)
+
+        drop_indexes()
+        _, scan_loop = timed(per_item, candidates)
+        storage.close_connection()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Та же история без индекса по published_at
+        storage.set_db_path(os.path.join(tmp, 'bench.db'))
+        storage.init_db()
+        with storage.write_transaction() as conn:
+            conn.execute(f'DROP INDEX {INDEXES[1]}')
+        seed(args.rows)
+        _, clear_scan = timed(storage.clear_old_news)
+        _, idle_scan = timed(storage.clear_old_news)
+        storage.close_connection()
+
+    n = len(candidates)
+    print(f"{'способ':<40}{'время цикла, мс':>16}{'проверок/с':>14}")
+    for name, elapsed in (
+        ('поштучно, без индекса (было)', scan_loop),
+        ('поштучно, с индексом', indexed_loop),
+        ('filter_unpublished, один запрос', bulk),
+    ):
+        print(f"{name:<40}{elapsed * 1000:>16.1f}{n / elapsed:>14.0f}")
+    print()
+    print(f"{'clear_old_news, мс':<40}{'удаление':>16}{'повторно':>14}")
+    print(f"{'без индекса по published_at':<40}{clear_scan * 1000:>16.1f}{idle_scan * 1000:>14.1f}")
+    print(f"{'с индексом по published_at':<40}{clear_indexed * 1000:>16.1f}{idle_indexed * 1000:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Бенчмарк дайджеста: сколько сообщений уходит за сутки в режимах instant и digest
+
+База заполняется N подписчиками со случайными темами (как в bench_fanout).
+Циклы авто-ленты идут каждые --cycle-minutes минут (часы моделируются, без
+ожидания) и приносят по --articles статей разных тем и языков, среди них - с
+символами разметки в заголовках и очень длинные. Подписчики дайджеста получают
+накопленное раз в DIGEST_INTERVAL (App.digest_due). Отправка идет в процессе
+(без HTTP), переводы - через fakes.TranslateServer. Для каждого режима
+считаются отправки, сообщений на чат и самое длинное сообщение (лимит
+Telegram - 4096 символов).
+
+Запуск: python benchmarks/bench_digest.py [--subscribers 10000] [--cycles 96]
+        [--cycle-minutes 15] [--articles 2]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import TranslateServer  # noqa: E402
+
+KEYWORDS = {'space': 'ufo', 'medicine': 'vaccine', 'war': 'ukraine'}
+LANGS = ('en', 'en', 'en', 'de', 'fr')
+
+
+def make_articles(App, start, count, rng):
+    articles = []
+    for index in range(start, start + count):
+        topic = rng.choice(list(KEYWORDS))
+        title = f"Article {index}: *strange* [{topic}] signal_{index} `observed`"
+        if index % 10 == 9:
+            title += ' and more' * 40
+        article = {
+            'content_hash': f"bench{index}", 'title': title, 'description': '', 'lang': rng.choice(LANGS),
+            'source': f"Source_{index % 7}", 'url': f"https://example.com/news/{index}_(live)",
+            'published': '12:00', 'keywords': [KEYWORDS[topic]],
+        }
+        article['topics'] = App.TOPIC_BITS[topic]
+        articles.append(article)
+    return articles
+
+
+def run_cycle(App, articles, digest_groups, now):
+    """Как auto_news_feed: статьи мгновенным подписчикам, дайджест по расписанию, затем разбор очереди"""
+    App.prefetch_translations(articles)
+    for article in articles:
+        App.broadcast_article(article, App.render_message(article))
+        if any(App.wants_article(group, article) for group in digest_groups):
+            App.add_digest_article(article['content_hash'], App.digest_article(article))
+    if App.digest_due(now):
+        App.send_digests(digest_groups, now)
+    App.outbox.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=10000)
+    parser.add_argument('--cycles', type=int, default=96, help='циклов авто-ленты')
+    parser.add_argument('--cycle-minutes', type=float, default=15)
+    parser.add_argument('--articles', type=int, default=2, help='новых статей за цикл')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    translator = TranslateServer().start()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            'BOT_AUTOSTART': '0',
+            'DB_PATH': os.path.join(tmp, 'bench.db'),
+            'TRANSLATE_URL': f"{translator.url}/translate_a/single",
+        })
+        import App  # noqa: E402
+        import storage  # noqa: E402
+        from broadcast import Broadcaster, SendResult  # noqa: E402
+        from digest import DIGEST_MAX_CHARS, text_length  # noqa: E402
+        logging.disable(logging.WARNING)
+
+        App.init_db()
+        rng = random.Random(args.seed)
+        chat_ids = rng.sample(range(10 ** 6, 10 ** 10), args.subscribers)
+        topic_bits = list(App.TOPIC_BITS.values())
+        cycles = [make_articles(App, cycle * args.articles, args.articles, rng) for cycle in range(args.cycles)]
+
+        sent = []
+
+        def send(chat_id, text):
+            sent.append(text)
+            return SendResult(True, 200, None, None)
+
+        App.broadcaster = App.outbox.broadcaster = Broadcaster(send, global_rate=1e9, per_chat_rate=1e9)
+
+        print(f"{args.subscribers} подписчиков, {args.cycles} циклов по {args.articles} статьи "
+              f"каждые {args.cycle_minutes:g} мин, дайджест раз в {App.DIGEST_INTERVAL / 3600:g} ч")
+        print(f"{'режим':<9}{'отправок':>10}{'на чат':>8}{'макс. длина':>13}{'сек':>7}")
+        for mode in storage.DELIVERY_MODES:
+            with storage.write_transaction() as conn:
+                conn.execute('DELETE FROM subscribers')
+                conn.executemany(storage.SQL_ADD_SUBSCRIBER, [(chat_id, None, None) for chat_id in chat_ids])
+                # Половина подписчиков выбрала одну тему, остальные - все
+                conn.executemany(storage.SQL_SET_TOPICS, [(rng.choice(topic_bits), chat_id)
+                                                          for chat_id in chat_ids[:len(chat_ids) // 2]])
+                conn.executemany(storage.SQL_SET_DELIVERY_MODE, [(mode, chat_id) for chat_id in chat_ids])
+                for table in ('outbox', 'outbox_messages', 'digest_articles', 'bot_state'):
+                    conn.execute(f'DELETE FROM {table}')
+            digest_groups = storage.get_digest_groups()
+            clock = time.time()
+            # Отсчет интервала дайджеста - с начала прогона
+            App.send_digests(digest_groups, clock)
+            sent.clear()
+            start = time.perf_counter()
+            for articles in cycles:
+                clock += args.cycle_minutes * 60
+                run_cycle(App, articles, digest_groups, clock)
+            seconds = time.perf_counter() - start
+            longest = max((text_length(text) for text in sent), default=0)
+            assert longest <= DIGEST_MAX_CHARS, longest
+            print(f"{mode:<9}{len(sent):>10}{len(sent) / len(chat_ids):>8.1f}{longest:>13}{seconds:>7.2f}")
+
+        storage.close_connection()
+    translator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""Сквозной офлайн-бенчмарк: поиск, перевод и рассылка против локальных заменителей
+
+Поднимает fakes.FeedServer с лентами для всех NEWS_SOURCES, fakes.TranslateServer
+и fakes.TelegramServer, импортирует App без автозапуска потоков (BOT_AUTOSTART=0)
+и по очереди замеряет:
+- холодный и повторный (304) обход всех источников через search_strange_news;
+- перевод найденных статей пачками по языкам (пустой кэш и кэш с переводами);
+- рассылку нескольких статей N подписчикам через broadcaster;
+- время до первого сообщения: пакетный путь (поиск целиком, затем перевод
+  и рассылка) против потокового run_news_pipeline, при одной медленной ленте.
+
+Результат - JSON в stdout или в файл (--output), чтобы сравнивать прогоны.
+
+Запуск: python benchmarks/bench_e2e.py [--subscribers 100] [--articles 3]
+        [--feed-latency 0.1] [--translate-latency 0.15] [--telegram-latency 0.05]
+        [--telegram-rate 25] [--telegram-429-every 0] [--slow-source-latency 3]
+        [--output result.json]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FeedServer, TelegramServer, TranslateServer, build_fixtures  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=30, help='записей в каждой ленте')
+    parser.add_argument('--subscribers', type=int, default=100)
+    parser.add_argument('--articles', type=int, default=3, help='статей в рассылке')
+    parser.add_argument('--feed-latency', type=float, default=0.1)
+    parser.add_argument('--feed-429-every', type=int, default=0)
+    parser.add_argument('--translate-latency', type=float, default=0.15)
+    parser.add_argument('--translate-429-every', type=int, default=0)
+    parser.add_argument('--telegram-latency', type=float, default=0.05)
+    parser.add_argument('--telegram-429-every', type=int, default=0)
+    parser.add_argument('--telegram-max-rate', type=int, default=0,
+                        help='сообщений в секунду, сверх которых стенд отвечает 429 (0 - без лимита)')
+    parser.add_argument('--telegram-rate', type=float, default=25,
+                        help='глобальный лимит рассылки бота (TELEGRAM_GLOBAL_RATE)')
+    parser.add_argument('--telegram-chat-rate', type=float, default=10,
+                        help='лимит бота на один чат (TELEGRAM_PER_CHAT_RATE); при реальном 1 сообщ/с '
+                             'сравнение циклов упирается в него и идет минутами')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--slow-source', default='NASA News', help='источник с отдельной задержкой')
+    parser.add_argument('--slow-source-latency', type=float, default=3.0)
+    parser.add_argument('--pipeline-subscribers', type=int, default=2,
+                        help='подписчиков при сравнении пакетного и потокового цикла')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='куда записать JSON (по умолчанию stdout)')
+    parser.add_argument('--verbose', action='store_true', help='не глушить логи бота')
+    return parser.parse_args()
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def per_second(count, seconds):
+    return round(count / seconds, 2) if seconds > 0 else None
+
+
+def configure_environment(args, tmp, translator, telegram):
+    """Переменные окружения читаются модулями бота при импорте - задаем их до import App"""
+    os.environ.update({
+        'BOT_AUTOSTART': '0',
+        'BOT_TOKEN': 'bench:token',
+        'DB_PATH': os.path.join(tmp, 'bench.db'),
+        'TRANSLATE_URL': f"{translator.url}/translate_a/single",
+        'TELEGRAM_API_URL': telegram.url,
+        'TELEGRAM_GLOBAL_RATE': str(args.telegram_rate),
+        'TELEGRAM_PER_CHAT_RATE': str(args.telegram_chat_rate),
+    })
+
+
+def bench_crawl(App, feeds, label):
+    feeds.reset_counters()
+    news, seconds = timed(App.search_strange_news, True)
+    return news, {
+        'label': label,
+        'seconds': round(seconds, 3),
+        'sources': len(App.NEWS_SOURCES),
+        'sources_per_sec': per_second(len(App.NEWS_SOURCES), seconds),
+        'articles': len(news),
+        'articles_per_sec': per_second(len(news), seconds),
+        'server': feeds.stats(),
+    }
+
+
+def bench_translation(App, translator, articles, label):
+    texts_by_lang = {}
+    for article in articles:
+        texts_by_lang.setdefault(article['lang'], []).extend(App.get_texts_to_translate(article))
+    strings = sum(len(texts) for texts in texts_by_lang.values())
+
+    translator.reset_counters()
+    start = time.perf_counter()
+    for lang, texts in texts_by_lang.items():
+        App.translate_batch(texts, lang)
+    seconds = time.perf_counter() - start
+    return {
+        'label': label,
+        'seconds': round(seconds, 3),
+        'languages': len(texts_by_lang),
+        'strings': strings,
+        'strings_per_sec': per_second(strings, seconds),
+        'server': translator.stats(),
+    }
+
+
+def bench_broadcast(App, telegram, articles, subscribers):
+    messages, render_seconds = timed(lambda: [(a['content_hash'], App.create_news_message(a)) for a in articles])
+    chat_ids = list(range(1, subscribers + 1))
+
+    telegram.reset_counters()
+    report = App.broadcaster.broadcast(
+        (key, chat_id, text) for key, text in messages for chat_id in chat_ids)
+    return {
+        'subscribers': subscribers,
+        'articles': len(messages),
+        'render_seconds': round(render_seconds, 3),
+        'messages': len(messages) * subscribers,
+        'seconds': round(report.elapsed, 3),
+        'sent': report.sent,
+        'failed': report.failed,
+        'rate_limited': report.rate_limited,
+        'msgs_per_sec': round(report.messages_per_second, 2),
+        'global_rate_limit': App.broadcaster.global_bucket.rate,
+        'server': telegram.stats(),
+    }
+
+
+def reset_state(App, storage, feed_fetcher, translation):
+    """Пустые история, высшие отметки и кэши - оба цикла начинают с одинакового состояния"""
+    with storage.write_transaction() as conn:
+        for table in ('published_news', 'source_state', 'translations', 'outbox', 'outbox_messages'):
+            conn.execute(f'DELETE FROM {table}')
+    with feed_fetcher._cache_lock:
+        feed_fetcher._cache.clear()
+    translation.translation_cache = translation.TranslationCache()
+    App.message_cache.clear()
+    App.search_flight.invalidate()
+
+
+def cycle_result(label, telegram, seconds, delivered):
+    stats = telegram.stats()
+    return {
+        'label': label,
+        'seconds': round(seconds, 3),
+        'first_message_after': stats['first_message_after'],
+        'articles_delivered': delivered,
+        'messages': stats['messages'],
+        'server': stats,
+    }
+
+
+def bench_batch_cycle(App, telegram, chat_ids):
+    """Как цикл работал раньше: весь поиск, затем перевод всех статей, затем рассылка"""
+    telegram.reset_counters()
+    start = time.perf_counter()
+    news = App.search_strange_news(True)
+    new_articles = App.filter_new_articles(news)
+    App.prefetch_translations(new_articles)
+    messages = [(article['content_hash'], App.create_news_message(article)) for article in new_articles]
+    report = App.broadcaster.broadcast((key, chat_id, text) for key, text in messages for chat_id in chat_ids)
+    delivered = [article for article in new_articles if report.delivered[article['content_hash']] > 0]
+    App.mark_articles_as_published(delivered)
+    return cycle_result('batch', telegram, time.perf_counter() - start, len(delivered))
+
+
+def bench_stream_cycle(App, telegram):
+    """Цикл авто-ленты: подписчики из базы, статьи в очередь по мере ответа источников,
+    очередь разбирает отдельный поток, как outbox_worker"""
+    telegram.reset_counters()
+    stopped = threading.Event()
+
+    def drain():
+        while not stopped.is_set():
+            if not App.outbox.drain_batch():
+                App.outbox.wait(0.05)
+
+    worker = threading.Thread(target=drain, daemon=True)
+    worker.start()
+    start = time.perf_counter()
+    report = App.run_news_pipeline(App.NEWS_SOURCES.items(), deliver=App.broadcast_article, kind='bench')
+    stopped.set()
+    App.outbox.notify()
+    worker.join()
+    App.outbox.flush()
+    result = cycle_result('stream', telegram, time.perf_counter() - start, len(report.results))
+    result['stages'] = report.stages
+    return result
+
+
+def main():
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Адреса переводчика и Telegram нужны до импорта App, а ленты строятся
+        # по списку источников бота - их адреса подставляем уже после импорта
+        translator = TranslateServer(latency=args.translate_latency, rate_limit_every=args.translate_429_every,
+                                     retry_after=args.retry_after).start()
+        telegram = TelegramServer(latency=args.telegram_latency, rate_limit_every=args.telegram_429_every,
+                                  max_rate=args.telegram_max_rate, retry_after=args.retry_after).start()
+        configure_environment(args, tmp, translator, telegram)
+
+        import App  # noqa: E402
+        import storage  # noqa: E402
+        import feed_fetcher  # noqa: E402
+        import translation  # noqa: E402
+        if not args.verbose:
+            logging.disable(logging.INFO)
+
+        fixtures = build_fixtures(App.NEWS_SOURCES, args.entries, args.seed)
+        feeds = FeedServer(fixtures, slow={args.slow_source: args.slow_source_latency},
+                           latency=args.feed_latency, rate_limit_every=args.feed_429_every,
+                           retry_after=args.retry_after).start()
+        for name, info in App.NEWS_SOURCES.items():
+            info['url'] = feeds.urls[name]
+
+        App.init_db()
+        App.init_sources()
+
+        news, cold_crawl = bench_crawl(App, feeds, 'cold')
+        _, warm_crawl = bench_crawl(App, feeds, 'not_modified')
+
+        cold_translation = bench_translation(App, translator, news, 'cold_cache')
+        warm_translation = bench_translation(App, translator, news, 'warm_cache')
+
+        broadcast = bench_broadcast(App, telegram, news[:args.articles], args.subscribers)
+
+        chat_ids = list(range(1, args.pipeline_subscribers + 1))
+        for chat_id in chat_ids:
+            App.add_subscriber(chat_id, None, f"bench {chat_id}")
+        reset_state(App, storage, feed_fetcher, translation)
+        batch_cycle = bench_batch_cycle(App, telegram, chat_ids)
+        reset_state(App, storage, feed_fetcher, translation)
+        stream_cycle = bench_stream_cycle(App, telegram)
+
+        for server in (feeds, translator, telegram):
+            server.stop()
+        if App.async_fetcher:
+            App.async_fetcher.close()
+        storage.close_connection()
+
+    result = {
+        'benchmark': 'e2e',
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'verbose')},
+        'crawl': [cold_crawl, warm_crawl],
+        'translation': [cold_translation, warm_translation],
+        'broadcast': broadcast,
+        'cycle': [batch_cycle, stream_cycle],
+    }
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"💾 Результат записан в {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Бенчмарк рассылки большой базе подписчиков: весь список сразу против страниц
+
+База заполняется N подписчиками, часть которых заблокировала бота. Отправка
+идет в процессе (без HTTP): заблокированные чаты получают 403, остальные 200,
+лимиты скорости сняты - замеряется сама рассылка. Для каждого способа два
+цикла подряд:
+- старый: все chat_id одним списком, все сообщения разом в broadcaster,
+  заблокированные чаты остаются в базе;
+- новый: App.broadcast_article ставит статью в очередь отправки одним
+  запросом, App.outbox разбирает ее пачками; статусы доставки в базе,
+  заблокированные чаты выключаются после первого 403;
+- темы: то же, но каждый подписчик выбрал одну случайную тему из трех, и
+  статья (тема space) уходит только выбравшим ее.
+
+Пиковая память (tracemalloc) замеряется отдельным прогоном. В конце -
+проверка очереди на сбоях: отправка в один чат бросает исключение, в другой
+получает 400 (ошибка разметки); flush() должен завершиться, первая строка -
+уйти на повтор с задержкой, вторая - сняться без повторов.
+
+Запуск: python benchmarks/bench_fanout.py [--subscribers 100000] [--blocked 0.05]
+"""
+import argparse
+import itertools
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ARTICLE = {'content_hash': 'bench', 'title': 'Bench article', 'lang': 'en', 'keywords': ['ufo']}
+MESSAGE = '🛸 *Bench article*'
+
+
+def make_send(blocked):
+    from broadcast import SendResult
+
+    def send(chat_id, text):
+        if chat_id in blocked:
+            return SendResult(False, 403, None, 'Forbidden: bot was blocked by the user')
+        return SendResult(True, 200, None, None)
+    return send
+
+
+def legacy_fanout(App, storage):
+    """Как было: список всех chat_id и одна рассылка на всех"""
+    chat_ids = [row[0] for row in storage.get_connection().execute('SELECT chat_id FROM subscribers')]
+    report = App.broadcaster.broadcast((ARTICLE['content_hash'], chat_id, MESSAGE) for chat_id in chat_ids)
+    return report.sent + report.failed
+
+
+# Каждый цикл - новая статья: повтор той же очередь отправки не задвоит
+_cycles = itertools.count()
+
+
+def paged_fanout(App, storage):
+    App.broadcast_article(dict(ARTICLE, content_hash=f"bench{next(_cycles)}"), MESSAGE)
+    App.outbox.flush()
+
+
+def timed(func, App, storage, counter):
+    counter['attempts'] = 0
+    start = time.perf_counter()
+    func(App, storage)
+    return time.perf_counter() - start, counter['attempts']
+
+
+def peak_mb(func, App, storage):
+    tracemalloc.start()
+    try:
+        func(App, storage)
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def check_send_errors(App, storage):
+    """Исключение в отправке и постоянная ошибка 400 не зацикливают разбор очереди"""
+    from broadcast import Broadcaster, SendResult
+
+    raising, rejected, ok = 1, 2, 3
+
+    def send(chat_id, text):
+        if chat_id == raising:
+            raise RuntimeError('connection reset')
+        if chat_id == rejected:
+            return SendResult(False, 400, None, "Bad Request: can't parse entities")
+        return SendResult(True, 200, None, None)
+
+    with storage.write_transaction() as conn:
+        for table in ('subscribers', 'outbox', 'outbox_messages'):
+            conn.execute(f'DELETE FROM {table}')
+        conn.executemany(storage.SQL_ADD_SUBSCRIBER, [(chat_id, None, None) for chat_id in (raising, rejected, ok)])
+    App.broadcaster = App.outbox.broadcaster = Broadcaster(send, global_rate=1e9, per_chat_rate=1e9)
+    App.broadcast_article(dict(ARTICLE, content_hash='bench-errors'), MESSAGE)
+
+    assert App.outbox.flush() == 3
+    rows = {chat_id: (status, attempts, next_attempt_at) for chat_id, status, attempts, next_attempt_at in
+            storage.get_connection().execute('SELECT chat_id, status, attempts, next_attempt_at FROM outbox')}
+    assert rows[ok][:2] == (storage.OUTBOX_SENT, 1), rows
+    assert rows[rejected][:2] == (storage.OUTBOX_FAILED, 1), rows
+    assert rows[raising][:2] == (storage.OUTBOX_PENDING, 1) and rows[raising][2] > time.time(), rows
+    print('очередь на сбоях: исключение - повтор с задержкой, 400 - снято, flush завершился')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=100000)
+    parser.add_argument('--blocked', type=float, default=0.05, help='доля заблокировавших бота')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({'BOT_AUTOSTART': '0', 'DB_PATH': os.path.join(tmp, 'bench.db')})
+        import App  # noqa: E402
+        import storage  # noqa: E402
+        from broadcast import Broadcaster  # noqa: E402
+        logging.disable(logging.WARNING)
+
+        App.init_db()
+        rng = random.Random(args.seed)
+        chat_ids = rng.sample(range(10 ** 6, 10 ** 10), args.subscribers)
+        blocked = set(rng.sample(chat_ids, int(len(chat_ids) * args.blocked)))
+
+        counter = {'attempts': 0}
+        send = make_send(blocked)
+
+        def counted_send(chat_id, text):
+            counter['attempts'] += 1
+            return send(chat_id, text)
+
+        App.broadcaster = App.outbox.broadcaster = Broadcaster(counted_send, global_rate=1e9, per_chat_rate=1e9)
+
+        topic_bits = list(App.TOPIC_BITS.values())
+        topic_choice = {chat_id: rng.choice(topic_bits) for chat_id in chat_ids}
+
+        def reset_subscribers(with_topics=False):
+            with storage.write_transaction() as conn:
+                conn.execute('DELETE FROM subscribers')
+                conn.executemany(storage.SQL_ADD_SUBSCRIBER, [(chat_id, None, None) for chat_id in chat_ids])
+                if with_topics:
+                    conn.executemany(storage.SQL_SET_TOPICS, [(topic_choice[chat_id], chat_id) for chat_id in chat_ids])
+
+        print(f"{args.subscribers} подписчиков, заблокировали бота {len(blocked)}, "
+              f"страница {storage.SUBSCRIBER_PAGE_SIZE}")
+        print(f"{'способ':<10}{'пик, МБ':>8}{'цикл':>6}{'сек':>8}{'отправок':>10}{'сообщ/с':>10}")
+        for name, func, with_topics in (('список', legacy_fanout, False), ('страницы', paged_fanout, False),
+                                        ('темы', paged_fanout, True)):
+            reset_subscribers(with_topics)
+            memory = peak_mb(func, App, storage)
+            reset_subscribers(with_topics)
+            for cycle in (1, 2):
+                seconds, attempts = timed(func, App, storage, counter)
+                print(f"{name:<10}{memory:>8.1f}{cycle:>6}{seconds:>8.2f}{attempts:>10}{attempts / seconds:>10.0f}")
+
+        print(f"активных после рассылки: {storage.count_subscribers()}")
+        check_send_errors(App, storage)
+        storage.close_connection()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Бенчмарк фильтра ключевых слов: построчный поиск подстрок против скомпилированного матчера
+
+Заголовки собираются из шаблонов типичных новостных заголовков (без сети),
+затем оба способа прогоняются по одним и тем же текстам. Ключевые списки
+дополнительно раздуваются, чтобы показать, как цена растет с их длиной.
+
+Ключевые слова и исключения - английские списки приложения (App.KEYWORDS,
+App.EXCLUDE_WORDS), матчер - с окончаниями английского языка, как в App.
+
+Запуск: python benchmarks/bench_keywords.py [--titles 5000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_matcher import ENDINGS, KeywordMatcher  # noqa: E402
+
+TEMPLATES = [
+    "{subject} {verb} {object} in {place}",
+    "{place} officials say {subject} {verb} {object}",
+    "Why {subject} {verb} {object}, according to a new report",
+    "{subject} {verb} {object} as markets react in {place}",
+    "Live: {subject} {verb} {object} - latest updates from {place}",
+]
+SUBJECTS = ['Scientists', 'Astronomers', 'Researchers', 'Software engineers', 'Farmers', 'The central bank',
+            'Police', 'Doctors', 'Footballers', 'Voters', 'Startups', 'Museum curators', 'Pilots']
+VERBS = ['discover', 'report', 'warn about', 'investigate', 'celebrate', 'reject', 'study', 'film']
+OBJECTS = ['a mysterious signal', 'rising prices', 'an ancient artifact', 'a new vaccine', 'strange lights',
+           'the software update', 'a record harvest', 'a comet flyby', 'weather warnings', 'a cancer therapy',
+           'the transfer window', 'award nominations', 'a rakete launch', 'warehouse fires']
+PLACES = ['Brazil', 'Germany', 'the Arctic', 'Kyiv', 'Texas', 'Mars orbit', 'Paris', 'Lagos', 'Tokyo']
+
+
+def make_titles(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        rng.choice(TEMPLATES).format(
+            subject=rng.choice(SUBJECTS), verb=rng.choice(VERBS),
+            object=rng.choice(OBJECTS), place=rng.choice(PLACES),
+        )
+        for _ in range(count)
+    ]
+
+
+def grow_keywords(base_keywords, factor, seed=7):
+    """Базовый список плюс синтетические слова, которых нет в заголовках"""
+    rng = random.Random(seed)
+    extra = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(5, 11)))
+             for _ in range(len(base_keywords) * (factor - 1))]
+    return base_keywords + extra
+
+
+# ========== ДВА СПОСОБА ==========
+def legacy_filter(titles, keywords, exclude_words):
+    matched = 0
+    for title in titles:
+        text = title.lower()
+        if any(word in text for word in exclude_words):
+            continue
+        if any(keyword.lower() in text for keyword in keywords):
+            matched += 1
+    return matched
+
+
+def matcher_filter(titles, matcher):
+    return sum(1 for title in titles if matcher.match(title))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--titles', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({'BOT_AUTOSTART': '0', 'DB_PATH': os.path.join(tmp, 'bench.db')})
+        from App import EXCLUDE_WORDS, KEYWORDS  # noqa: E402
+    base_keywords = KEYWORDS['en']
+
+    titles = make_titles(args.titles)
+    print(f"{'слов':>6}{'старый, мкс/заг':>18}{'матчер, мкс/заг':>18}{'совпало (старый/новый)':>26}")
+    for factor in (1, 4, 16):
+        keywords = grow_keywords(base_keywords, factor)
+        matcher = KeywordMatcher(keywords, EXCLUDE_WORDS, ENDINGS['en'])
+        legacy_count, legacy_time = timed(legacy_filter, titles, keywords, EXCLUDE_WORDS)
+        matcher_count, matcher_time = timed(matcher_filter, titles, matcher)
+        print(f"{len(keywords):>6}"
+              f"{legacy_time / len(titles) * 1e6:>18.1f}"
+              f"{matcher_time / len(titles) * 1e6:>18.1f}"
+              f"{f'{legacy_count}/{matcher_count}':>26}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Бенчмарк разбора лент: feedparser целиком против быстрого разбора первых N записей
+
+Ленты строятся генератором фикстур из fakes.py во всех трех форматах
+(RSS 2.0, RDF, Atom) и разных размеров - крупные ленты вроде BBC и CNN
+отдают сотни записей, а бот берет первые 10-30. Для каждого способа
+замеряется медианное время разбора вместе с очисткой HTML и пиковая
+память (tracemalloc).
+
+Запуск: python benchmarks/bench_parse.py [--max-items 10] [--repeat 20]
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import feedparser  # noqa: E402
+
+from fakes import build_fixtures  # noqa: E402
+from fast_feed import parse_feed  # noqa: E402
+
+# Источник -> формат фикстуры (см. fakes.FEED_FORMATS)
+FORMATS = {'rss': 'BBC News', 'rdf': 'DW News English', 'atom': 'Universe Today'}
+SIZES = (30, 100, 400)
+HTML_TAG_RE = re.compile('<.*?>')
+
+# Заголовки из других пространств имен (media:, itunes:) не должны подменять <title> записи
+MIXED_NAMESPACE_RSS = b'''<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/"
+     xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd">
+<channel><title>Mixed</title><link>https://example.com/</link><description>Mixed</description>
+<item>
+  <title>Real UFO title</title>
+  <link>https://example.com/ufo</link>
+  <description>Lights over the lake</description>
+  <pubDate>Mon, 06 May 2024 10:00:00 GMT</pubDate>
+  <media:content url="https://example.com/ufo.jpg"><media:title>Photo credit: Getty</media:title></media:content>
+  <media:title>Photo credit: Getty</media:title>
+  <itunes:title>Episode 12</itunes:title>
+</item>
+<item>
+  <itunes:title>Episode 13</itunes:title>
+  <title>Second UFO title</title>
+  <link>https://example.com/ufo2</link>
+  <description>Radar contact</description>
+</item>
+</channel></rss>'''
+
+
+# ========== ДВА СПОСОБА ==========
+def legacy_clean_html(text):
+    if not text: return ""
+    clean = re.compile('<.*?>')
+    return re.sub(clean, '', text)
+
+
+def clean_html(text):
+    if not text: return ""
+    return HTML_TAG_RE.sub('', text)
+
+
+def legacy_path(content, max_items):
+    feed = feedparser.parse(content)
+    return [(legacy_clean_html(entry.title), legacy_clean_html(entry.summary), entry.link)
+            for entry in feed.entries[:max_items]]
+
+
+def fast_path(content, max_items):
+    feed = parse_feed(content, max_items)
+    return [(clean_html(entry.get('title')), clean_html(entry.get('summary')), entry.get('link'))
+            for entry in feed.entries]
+
+
+def median_ms(func, content, max_items, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content, max_items)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def peak_kb(func, content, max_items):
+    tracemalloc.start()
+    try:
+        func(content, max_items)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-items', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    assert legacy_path(MIXED_NAMESPACE_RSS, args.max_items) == fast_path(MIXED_NAMESPACE_RSS, args.max_items)
+    print(f"{'формат':<7}{'записей':>8}{'КБ':>7}{'feedparser, мс':>16}{'быстрый, мс':>13}"
+          f"{'feedparser, КБ':>16}{'быстрый, КБ':>13}")
+    for feed_format, name in FORMATS.items():
+        for size in SIZES:
+            content = build_fixtures({name: {'lang': 'en'}}, entries_per_feed=size)[name]
+            assert legacy_path(content, args.max_items) == fast_path(content, args.max_items)
+            print(f"{feed_format:<7}{size:>8}{len(content) / 1024:>7.0f}"
+                  f"{median_ms(legacy_path, content, args.max_items, args.repeat):>16.2f}"
+                  f"{median_ms(fast_path, content, args.max_items, args.repeat):>13.2f}"
+                  f"{peak_kb(legacy_path, content, args.max_items):>16.0f}"
+                  f"{peak_kb(fast_path, content, args.max_items):>13.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Микро-бенчмарк слоя хранения: проверки дубликатов и вставки в секунду
+
+Сравнивает старый подход (новое соединение на каждый вызов под db_lock)
+с долгоживущими соединениями storage.py в режиме WAL.
+
+Запуск: python benchmarks/bench_storage.py [--rows 2000]
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+
+legacy_lock = threading.Lock()
+
+
+# ========== СТАРЫЙ ПОДХОД: СОЕДИНЕНИЕ НА КАЖДЫЙ ВЫЗОВ ==========
+def legacy_is_published(path, content_hash):
+    with legacy_lock:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM published_news WHERE content_hash = ?', (content_hash,))
+        result = cursor.fetchone()
+        conn.close()
+        return result is not None
+
+
+def legacy_mark_published(path, url, title, source, lang, content_hash):
+    with legacy_lock:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT OR IGNORE INTO published_news (url, title, source, lang, content_hash) VALUES (?, ?, ?, ?, ?)',
+            (url, title, source, lang, content_hash)
+        )
+        conn.commit()
+        conn.close()
+
+
+# ========== ЗАМЕРЫ ==========
+def make_rows(count, prefix):
+    rows = []
+    for i in range(count):
+        content_hash = hashlib.md5(f"{prefix}-{i}".encode()).hexdigest()
+        rows.append((f"https://example.com/{prefix}/{i}", f"Title {i}", 'Bench', 'en', content_hash))
+    return rows
+
+
+def rate(count, elapsed):
+    return count / elapsed if elapsed > 0 else float('inf')
+
+
+def run_legacy(path, rows):
+    start = time.perf_counter()
+    for row in rows:
+        legacy_mark_published(path, *row)
+    insert_rate = rate(len(rows), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for row in rows:
+        legacy_is_published(path, row[4])
+    lookup_rate = rate(len(rows), time.perf_counter() - start)
+    return insert_rate, lookup_rate
+
+
+def run_storage(path, rows):
+    storage.set_db_path(path)
+    storage.init_db()
+
+    start = time.perf_counter()
+    for row in rows:
+        storage.mark_news_as_published(*row)
+    insert_rate = rate(len(rows), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for row in rows:
+        storage.is_news_published(row[4])
+    lookup_rate = rate(len(rows), time.perf_counter() - start)
+    storage.close_connection()
+    return insert_rate, lookup_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000, help='сколько статей вставить и проверить')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        # Схема для старого подхода создается тем же init_db
+        storage.set_db_path(legacy_path)
+        storage.init_db()
+        storage.close_connection()
+        # Старый файл остается в режиме rollback journal, как было раньше
+        conn = sqlite3.connect(legacy_path)
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.close()
+
+        legacy = run_legacy(legacy_path, make_rows(args.rows, 'legacy'))
+        pooled = run_storage(os.path.join(tmp, 'pooled.db'), make_rows(args.rows, 'pooled'))
+
+    print(f"{'':<28}{'вставки/с':>14}{'проверки/с':>14}")
+    print(f"{'connect-per-call':<28}{legacy[0]:>14.0f}{legacy[1]:>14.0f}")
+    print(f"{'storage (WAL, pooled)':<28}{pooled[0]:>14.0f}{pooled[1]:>14.0f}")
+    print(f"{'ускорение':<28}{pooled[0] / legacy[0]:>13.1f}x{pooled[1] / legacy[1]:>13.1f}x")
+
+
+if __name__ == '__main__':
+    main()
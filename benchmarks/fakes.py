@@ -0,0 +1,432 @@
+"""Локальные заменители внешних сервисов для офлайн-бенчмарков
+
+FeedServer отдает ленты-фикстуры для всех источников (RSS 2.0, RDF и Atom)
+с ETag/Last-Modified, TranslateServer отвечает в формате gtx-переводчика,
+TelegramServer - в формате Bot API. У каждого сервера настраивается задержка
+ответа и выдача 429, а счетчики запросов читаются после прогона.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+# ========== ФИКСТУРЫ ЛЕНТ ==========
+# Шаблоны заголовков по языкам: часть объектов содержит ключевые слова бота, часть - нет
+HEADLINES = {
+    'en': {
+        'templates': ["{subject} {verb} {object}", "{subject} {verb} {object} near {place}",
+                      "Why {subject} {verb} {object}", "{place}: {subject} {verb} {object}"],
+        'subjects': ['Scientists', 'Astronomers', 'Officials', 'Doctors', 'Researchers', 'Farmers', 'Pilots'],
+        'verbs': ['discover', 'report', 'investigate', 'warn about', 'film', 'reject'],
+        'objects': ['a mysterious comet', 'strange lights over the sea', 'a new cancer vaccine',
+                    'an ancient artifact', 'a military build-up', 'rising food prices', 'a football transfer',
+                    'an asteroid flyby', 'a record harvest', 'the new tax rules', 'a virus outbreak'],
+        'places': ['Kyiv', 'Texas', 'the Arctic', 'Mars orbit', 'Lagos', 'Tokyo', 'Chile'],
+    },
+    'de': {
+        'templates': ["{subject} {verb} {object}", "{place}: {subject} {verb} {object}"],
+        'subjects': ['Forscher', 'Astronomen', 'Ärzte', 'Behörden', 'Landwirte'],
+        'verbs': ['entdecken', 'melden', 'untersuchen', 'warnen vor'],
+        'objects': ['einen seltsamen Komet', 'eine neue Krebs-Therapie', 'den Krieg im Osten',
+                    'steigende Mieten', 'einen Asteroid', 'die Bundesliga-Saison', 'ein Rätsel im Eis'],
+        'places': ['Berlin', 'Kiew', 'Hamburg', 'die Antarktis'],
+    },
+    'fr': {
+        'templates': ["{subject} {verb} {object}", "{place} : {subject} {verb} {object}"],
+        'subjects': ['Des chercheurs', 'Des astronomes', 'Des médecins', 'Les autorités'],
+        'verbs': ['découvrent', 'signalent', 'étudient', 'observent'],
+        'objects': ['une comète étrange', 'un nouveau vaccin', 'la guerre en Ukraine',
+                    'la hausse des prix', 'un astéroïde', 'le marché des transferts', 'un mystère sous-marin'],
+        'places': ['Paris', 'Lyon', 'Kiev', 'la Guyane'],
+    },
+    'pt': {
+        'templates': ["{subject} {verb} {object}", "{place}: {subject} {verb} {object}"],
+        'subjects': ['Cientistas', 'Astrônomos', 'Médicos', 'Autoridades'],
+        'verbs': ['descobrem', 'relatam', 'estudam', 'observam'],
+        'objects': ['um cometa estranho', 'uma nova terapia contra câncer', 'a guerra na Ucrânia',
+                    'a alta dos preços', 'um asteroide', 'o campeonato brasileiro', 'um mistério na Amazônia'],
+        'places': ['São Paulo', 'Manaus', 'Brasília', 'Recife'],
+    },
+    'ru': {
+        'templates': ["{subject} {verb} {object}", "{place}: {subject} {verb} {object}"],
+        'subjects': ['Ученые', 'Астрономы', 'Врачи', 'Власти', 'Фермеры'],
+        'verbs': ['обнаружили', 'сообщили про', 'изучают', 'заметили'],
+        'objects': ['загадочный объект', 'новую вакцину', 'военный конвой', 'рост цен на жилье',
+                    'комета над городом', 'итоги футбольного матча', 'необъяснимый сигнал'],
+        'places': ['Москва', 'Новосибирск', 'Казань', 'Якутия'],
+    },
+}
+
+# Одни и те же истории в нескольких англоязычных лентах - работа для поиска пересказов
+SHARED_STORIES = [
+    "Astronomers spot interstellar comet 3I/ATLAS brightening near the Sun",
+    "NASA confirms new study of mysterious radio signal from deep space",
+    "Scientists report ancient artifact found under Arctic ice",
+    "Ukraine says military drones attack depots near Donbas",
+]
+
+# Формат фикстуры по источнику; остальные - RSS 2.0
+FEED_FORMATS = {
+    'DW News English': 'rdf',
+    'Universe Today': 'atom',
+    'Phys.org': 'atom',
+}
+
+
+def make_headline(rng, lang):
+    parts = HEADLINES.get(lang, HEADLINES['en'])
+    return rng.choice(parts['templates']).format(
+        subject=rng.choice(parts['subjects']), verb=rng.choice(parts['verbs']),
+        object=rng.choice(parts['objects']), place=rng.choice(parts['places']),
+    )
+
+
+def make_entries(name, lang, count, rng, now, shared_ratio=0.15):
+    """Записи одной ленты: заголовок, описание, ссылка, GUID и время (последние двое суток)"""
+    slug = hashlib.md5(name.encode()).hexdigest()[:8]
+    entries = []
+    for index in range(count):
+        if lang == 'en' and rng.random() < shared_ratio:
+            title = rng.choice(SHARED_STORIES)
+        else:
+            title = make_headline(rng, lang)
+        description = f"<p>{title}. {make_headline(rng, lang)}, {make_headline(rng, lang).lower()}.</p>"
+        entries.append({
+            'title': title,
+            'description': description,
+            'link': f"https://example.org/{slug}/{index}",
+            'guid': f"{slug}-{index}",
+            'published': now - timedelta(minutes=index * rng.randint(5, 90)),
+        })
+    return entries
+
+
+def render_rss(name, entries, ttl=15):
+    items = ''.join(
+        f"<item><title>{escape(e['title'])}</title><link>{e['link']}</link>"
+        f"<guid isPermaLink=\"false\">{e['guid']}</guid>"
+        f"<description>{escape(e['description'])}</description>"
+        f"<pubDate>{format_datetime(e['published'])}</pubDate></item>"
+        for e in entries
+    )
+    return (f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+            f'<title>{escape(name)}</title><link>https://example.org/</link><ttl>{ttl}</ttl>'
+            f'<description>{escape(name)}</description>{items}</channel></rss>')
+
+
+def render_rdf(name, entries):
+    items = ''.join(
+        f"<item rdf:about=\"{e['link']}\"><title>{escape(e['title'])}</title><link>{e['link']}</link>"
+        f"<description>{escape(e['description'])}</description>"
+        f"<dc:date>{e['published'].isoformat()}</dc:date></item>"
+        for e in entries
+    )
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" '
+            'xmlns="http://purl.org/rss/1.0/" xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            f'<channel rdf:about="https://example.org/"><title>{escape(name)}</title>'
+            f'<link>https://example.org/</link><description>{escape(name)}</description></channel>'
+            f'{items}</rdf:RDF>')
+
+
+def render_atom(name, entries):
+    items = ''.join(
+        f"<entry><title>{escape(e['title'])}</title><link href=\"{e['link']}\"/>"
+        f"<id>urn:{e['guid']}</id><updated>{e['published'].isoformat()}</updated>"
+        f"<summary type=\"html\">{escape(e['description'])}</summary></entry>"
+        for e in entries
+    )
+    updated = entries[0]['published'].isoformat() if entries else datetime.now(timezone.utc).isoformat()
+    return ('<?xml version="1.0" encoding="UTF-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+            f'<title>{escape(name)}</title><id>urn:{escape(name)}</id><updated>{updated}</updated>'
+            f'{items}</feed>')
+
+
+def build_fixtures(sources, entries_per_feed=30, seed=42):
+    """Ленты для всех источников: {имя: bytes}"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    fixtures = {}
+    for name, info in sources.items():
+        entries = make_entries(name, info['lang'], entries_per_feed, rng, now)
+        feed_format = FEED_FORMATS.get(name, 'rss')
+        if feed_format == 'rdf':
+            body = render_rdf(name, entries)
+        elif feed_format == 'atom':
+            body = render_atom(name, entries)
+        else:
+            body = render_rss(name, entries)
+        fixtures[name] = body.encode('utf-8')
+    return fixtures
+
+# ========== СЕРВЕРЫ ==========
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def do_GET(self):
+        self.server.fake.handle(self, 'GET')
+
+    def do_POST(self):
+        self.server.fake.handle(self, 'POST')
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Асинхронный движок открывает десятки соединений разом
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Клиент бросил запрос по таймауту или сроку цикла - для стенда это норма
+        pass
+
+
+class FakeServer:
+    """HTTP-сервер в фоновом потоке на свободном порту 127.0.0.1"""
+
+    def __init__(self, latency=0.0, rate_limit_every=0, retry_after=1):
+        self.latency = latency
+        # Каждый N-й запрос получает 429 (0 - никогда)
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+        self._server = _QuietServer(('127.0.0.1', 0), _Handler)
+        self._server.fake = self
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+            self.rate_limited = 0
+
+    def _count_request(self):
+        """Учитываем запрос; True, если ему положен 429"""
+        with self._lock:
+            self.requests += 1
+            limited = self.rate_limit_every and self.requests % self.rate_limit_every == 0
+            if limited:
+                self.rate_limited += 1
+            return bool(limited)
+
+    def stats(self):
+        with self._lock:
+            return {'requests': self.requests, 'rate_limited': self.rate_limited}
+
+    def handle(self, handler, method):
+        raise NotImplementedError
+
+
+class FeedServer(FakeServer):
+    """Ленты-фикстуры по адресам /feeds/<n>.xml с поддержкой условных запросов"""
+
+    def __init__(self, fixtures, slow=None, **kwargs):
+        super().__init__(**kwargs)
+        self._feeds = {}
+        self.urls = {}
+        # Отдельная задержка для медленных источников: {путь: секунды}
+        self._slow = {}
+        self.not_modified = 0
+        self.bytes_sent = 0
+        for index, (name, body) in enumerate(fixtures.items()):
+            path = f"/feeds/{index}.xml"
+            etag = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+            self._feeds[path] = (body, etag, format_datetime(datetime.now(timezone.utc), usegmt=True))
+            self.urls[name] = self.url + path
+            if slow and name in slow:
+                self._slow[path] = slow[name]
+
+    def reset_counters(self):
+        super().reset_counters()
+        with self._lock:
+            self.not_modified = 0
+            self.bytes_sent = 0
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update(not_modified=self.not_modified, bytes_sent=self.bytes_sent)
+        return stats
+
+    def handle(self, handler, method):
+        path = urlparse(handler.path).path
+        latency = self._slow.get(path, self.latency)
+        if latency:
+            time.sleep(latency)
+        limited = self._count_request()
+        feed = self._feeds.get(path)
+        if feed is None:
+            handler._send(404)
+            return
+        if limited:
+            handler._send(429, headers={'Retry-After': str(self.retry_after)})
+            return
+
+        body, etag, last_modified = feed
+        if handler.headers.get('If-None-Match') == etag:
+            with self._lock:
+                self.not_modified += 1
+            handler._send(304, headers={'ETag': etag})
+            return
+
+        with self._lock:
+            self.bytes_sent += len(body)
+        handler._send(200, body, 'application/rss+xml; charset=utf-8',
+                      {'ETag': etag, 'Last-Modified': last_modified})
+
+
+class TranslateServer(FakeServer):
+    """Переводчик в формате gtx: каждая строка запроса возвращается отдельным сегментом"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.segments = 0
+
+    def reset_counters(self):
+        super().reset_counters()
+        with self._lock:
+            self.segments = 0
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats['segments'] = self.segments
+        return stats
+
+    def handle(self, handler, method):
+        if self.latency:
+            time.sleep(self.latency)
+        form = parse_qs(handler._read_body().decode('utf-8'))
+        query = parse_qs(urlparse(handler.path).query)
+        if self._count_request():
+            handler._send(429, b'{}')
+            return
+
+        lines = form.get('q', [''])[0].split('\n')
+        with self._lock:
+            self.segments += len(lines)
+        segments = [[f"[ru] {line}" + ('\n' if index < len(lines) - 1 else ''), line, None, None, 10]
+                    for index, line in enumerate(lines)]
+        body = json.dumps([segments, None, query.get('sl', ['auto'])[0]], ensure_ascii=False)
+        handler._send(200, body.encode('utf-8'))
+
+
+class TelegramServer(FakeServer):
+    """Bot API: sendMessage и служебные методы; 429 приходят с parameters.retry_after"""
+
+    def __init__(self, max_rate=0, blocked_chats=(), missing_chats=(), **kwargs):
+        super().__init__(**kwargs)
+        # Скользящее окно в 1 секунду: сверх max_rate сообщений - 429 (0 - без лимита)
+        self.max_rate = max_rate
+        # Чаты, заблокировавшие бота (403), и удаленные чаты (400 chat not found)
+        self.blocked_chats = set(blocked_chats)
+        self.missing_chats = set(missing_chats)
+        self.unreachable = 0
+        self._window = deque()
+        self.messages = 0
+        self._reset_at = time.monotonic()
+        self.first_message_after = None  # секунд от reset_counters до первого принятого сообщения
+
+    def reset_counters(self):
+        super().reset_counters()
+        with self._lock:
+            self.messages = 0
+            self.unreachable = 0
+            self._window.clear()
+            self._reset_at = time.monotonic()
+            self.first_message_after = None
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats['messages'] = self.messages
+            stats['unreachable'] = self.unreachable
+            stats['first_message_after'] = (round(self.first_message_after, 3)
+                                            if self.first_message_after is not None else None)
+        return stats
+
+    def _over_rate(self):
+        if not self.max_rate:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._window and now - self._window[0] >= 1.0:
+                self._window.popleft()
+            if len(self._window) >= self.max_rate:
+                self.rate_limited += 1
+                return True
+            self._window.append(now)
+            return False
+
+    def handle(self, handler, method):
+        api_method = urlparse(handler.path).path.rsplit('/', 1)[-1]
+        body = handler._read_body()
+
+        if api_method == 'getUpdates':
+            time.sleep(1)
+            handler._send(200, b'{"ok":true,"result":[]}')
+            return
+        if api_method != 'sendMessage':
+            handler._send(200, b'{"ok":true,"result":true}')
+            return
+
+        if self.latency:
+            time.sleep(self.latency)
+        chat_id = json.loads(body or b'{}').get('chat_id')
+        if chat_id in self.blocked_chats or chat_id in self.missing_chats:
+            with self._lock:
+                self.unreachable += 1
+            if chat_id in self.blocked_chats:
+                handler._send(403, b'{"ok":false,"error_code":403,"description":"Forbidden: bot was blocked by the user"}')
+            else:
+                handler._send(400, b'{"ok":false,"error_code":400,"description":"Bad Request: chat not found"}')
+            return
+
+        if self._count_request() or self._over_rate():
+            body = json.dumps({'ok': False, 'error_code': 429,
+                               'description': f"Too Many Requests: retry after {self.retry_after}",
+                               'parameters': {'retry_after': self.retry_after}})
+            handler._send(429, body.encode())
+            return
+
+        with self._lock:
+            self.messages += 1
+            if self.first_message_after is None:
+                self.first_message_after = time.monotonic() - self._reset_at
+        handler._send(200, b'{"ok":true,"result":{"message_id":1}}')
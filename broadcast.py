@@ -0,0 +1,194 @@
+"""Параллельная рассылка с ограничением скорости под лимиты Telegram"""
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from collections import Counter, namedtuple
+
+logger = logging.getLogger(__name__)
+
+# ========== НАСТРОЙКИ ==========
+# Telegram: около 30 сообщений в секунду на бота и 1 сообщение в секунду в один чат
+GLOBAL_RATE = float(os.environ.get('TELEGRAM_GLOBAL_RATE', 25))
+PER_CHAT_RATE = float(os.environ.get('TELEGRAM_PER_CHAT_RATE', 1))
+BROADCAST_WORKERS = int(os.environ.get('BROADCAST_WORKERS', 16))
+MAX_RETRIES = 3
+
+# Результат одной отправки: retry_after приходит из ответа 429, error - описание ошибки Bot API
+SendResult = namedtuple('SendResult', ['ok', 'status_code', 'retry_after', 'error'])
+
+
+def unreachable_reason(result):
+    """Почему писать в чат больше нельзя: 'blocked', 'chat_not_found' или None"""
+    if result.status_code == 403:
+        # Бот заблокирован, пользователь удален или бота исключили из группы
+        return 'blocked'
+    if result.status_code == 400 and 'chat not found' in (result.error or '').lower():
+        return 'chat_not_found'
+    return None
+
+
+def rejected_reason(result):
+    """Telegram отклонил само сообщение (400, например ошибка разметки) - повтор не поможет"""
+    if result.status_code == 400:
+        return result.error or 'bad request'
+    return None
+
+# ========== ОГРАНИЧЕНИЕ СКОРОСТИ ==========
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity за раз"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Берем токен; возвращаем, сколько ждать, если токена нет"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Ждем ровно столько, сколько нужно до следующего токена"""
+        while True:
+            wait = self._reserve()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def idle(self):
+        """Корзина полна и не на паузе - она не отличается от новой"""
+        with self._lock:
+            now = time.monotonic()
+            return now >= self._paused_until and \
+                self._tokens + (now - self._updated) * self.rate >= self.capacity
+
+    def pause(self, seconds):
+        """Останавливаем выдачу токенов (ответ 429 с retry_after)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+# ========== РАССЫЛКА ==========
+class BroadcastReport:
+    """Итоги рассылки"""
+
+    def __init__(self):
+        self.delivered = Counter()  # ключ сообщения -> сколько чатов получили
+        self.sent = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.status_codes = Counter()
+        self.elapsed = 0.0
+        self.reached = []        # chat_id, получившие сообщение
+        self.failed_chats = []   # chat_id с временной ошибкой
+        self.unreachable = {}    # chat_id -> причина, по которой писать туда больше нельзя
+        self.rejected = {}       # chat_id -> ошибка, из-за которой Telegram не принял сообщение
+        self._lock = threading.Lock()
+
+    def record(self, key, chat_id, result):
+        with self._lock:
+            self.status_codes[result.status_code] += 1
+            if result.ok:
+                self.sent += 1
+                self.delivered[key] += 1
+                self.reached.append(chat_id)
+                return
+            self.failed += 1
+            reason = unreachable_reason(result)
+            if reason:
+                self.unreachable[chat_id] = reason
+                return
+            error = rejected_reason(result)
+            if error:
+                self.rejected[chat_id] = error
+            else:
+                self.failed_chats.append(chat_id)
+
+    @property
+    def messages_per_second(self):
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"отправлено {self.sent}, ошибок {self.failed}, 429: {self.rate_limited}, "
+                f"{self.elapsed:.1f} с, {self.messages_per_second:.1f} сообщ/с")
+
+
+class Broadcaster:
+    """Рассылает сообщения пулом потоков под глобальным и поканальным лимитом"""
+
+    def __init__(self, send_func, global_rate=GLOBAL_RATE, per_chat_rate=PER_CHAT_RATE,
+                 workers=BROADCAST_WORKERS, max_retries=MAX_RETRIES):
+        self.send_func = send_func  # (chat_id, text) -> SendResult
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.workers = workers
+        self.max_retries = max_retries
+        # Корзины чатов живут между рассылками: статьи конвейера уходят по одной
+        self._chat_buckets = {}
+        self._chat_buckets_lock = threading.Lock()
+
+    def _chat_bucket(self, chat_id):
+        with self._chat_buckets_lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, capacity=1)
+            return bucket
+
+    def _deliver(self, key, chat_id, text, chat_bucket, report):
+        result = SendResult(False, None, None, 'not sent')
+        for _ in range(self.max_retries + 1):
+            chat_bucket.acquire()
+            self.global_bucket.acquire()
+            result = self.send_func(chat_id, text)
+            if result.status_code != 429:
+                break
+
+            retry_after = result.retry_after or 1
+            with report._lock:
+                report.rate_limited += 1
+            logger.warning(f"⏳ 429 для {chat_id}: ждем {retry_after} с")
+            self.global_bucket.pause(retry_after)
+            chat_bucket.pause(retry_after)
+
+        report.record(key, chat_id, result)
+        return result
+
+    def _prune_chat_buckets(self):
+        """Забываем корзины чатов, которые уже наполнились: память не растет с числом подписчиков"""
+        with self._chat_buckets_lock:
+            for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items() if bucket.idle()]:
+                del self._chat_buckets[chat_id]
+
+    def broadcast(self, messages):
+        """Отправляем [(key, chat_id, text), ...]; порядок внутри чата сохраняется по возможности"""
+        report = BroadcastReport()
+        start = time.monotonic()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = []
+            for key, chat_id, text in messages:
+                futures.append(executor.submit(self._deliver, key, chat_id, text, self._chat_bucket(chat_id), report))
+
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"❌ Ошибка в потоке рассылки: {e}")
+
+        report.elapsed = time.monotonic() - start
+        self._prune_chat_buckets()
+        return report
@@ -0,0 +1,81 @@
+"""Дайджест: новости цикла одним-несколькими сообщениями вместо сообщения на каждую
+
+Сообщения в Markdown (parse_mode=Markdown) Telegram ограничивает 4096 символами;
+длину считаем в UTF-16, как Telegram, с запасом под заголовок с номером части.
+"""
+import os
+
+# ========== НАСТРОЙКИ ==========
+DIGEST_MAX_CHARS = 4096
+# Запас под заголовок "📰 Дайджест: N новостей (часть i/n)"
+HEADER_RESERVE = 80
+MAX_TITLE_CHARS = int(os.environ.get('DIGEST_MAX_TITLE_CHARS', 200))
+# Как часто подписчики дайджеста получают накопленные новости (секунды)
+DIGEST_INTERVAL = float(os.environ.get('DIGEST_INTERVAL', 3 * 3600))
+
+# Символы разметки Markdown, которые вне сущностей экранируются обратной косой чертой
+MARKDOWN_SPECIAL = ('_', '*', '`', '[')
+
+
+def escape_markdown(text):
+    """Текст, который Telegram покажет как есть, а не как разметку"""
+    for char in MARKDOWN_SPECIAL:
+        text = text.replace(char, '\\' + char)
+    return text
+
+
+def markdown_url(url):
+    """Ссылка внутри (...): закрывающая скобка оборвала бы ее"""
+    return url.replace(')', '%29').replace(' ', '%20')
+
+
+def text_length(text):
+    """Длина, как ее считает Telegram (UTF-16)"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def digest_line(title, source, url):
+    """Строка статьи: заголовок, источник и ссылка"""
+    if len(title) > MAX_TITLE_CHARS:
+        title = title[:MAX_TITLE_CHARS].rstrip() + '...'
+    return f"• {escape_markdown(title)} ({escape_markdown(source)}) [→]({markdown_url(url)})"
+
+
+def pack_digest(groups, max_chars=DIGEST_MAX_CHARS):
+    """groups - [(заголовок группы, [строки статей])] -> тексты сообщений.
+
+    Строки идут по группам; группа, не поместившаяся в сообщение, продолжается
+    в следующем с повтором заголовка. Строка статьи не разрывается.
+    """
+    budget = max_chars - HEADER_RESERVE
+    parts = []
+    current = []
+    used = 0
+    total = 0
+
+    for group_title, lines in groups:
+        header = f"*{escape_markdown(group_title)}*"
+        header_in_part = False
+        for line in lines:
+            block = [line] if header_in_part else ['', header, line]
+            size = sum(text_length(item) + 1 for item in block)
+            if current and used + size > budget:
+                parts.append(current)
+                current, used = [], 0
+                block = ['', f"*{escape_markdown(group_title)}* (продолжение)", line]
+                size = sum(text_length(item) + 1 for item in block)
+            current.extend(block)
+            used += size
+            header_in_part = True
+            total += 1
+
+    if current:
+        parts.append(current)
+
+    messages = []
+    for index, lines in enumerate(parts, 1):
+        header = f"📰 *Дайджест: {total} новостей*"
+        if len(parts) > 1:
+            header += f" (часть {index}/{len(parts)})"
+        messages.append('\n'.join([header] + lines))
+    return messages
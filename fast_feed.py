@@ -0,0 +1,152 @@
+"""Быстрый разбор лент RSS 2.0 / RDF / Atom: только нужные поля и только первые N записей
+
+XMLPullParser получает байты кусками, и разбор останавливается, как только
+набралось max_items записей. Записи - словари с теми же ключами, что у
+feedparser (id, title, link, summary, published_parsed, updated_parsed).
+Ленты, которые не получается разобрать так (битый XML, неизвестный формат,
+нестандартные даты), разбирает feedparser.
+"""
+import logging
+from collections import namedtuple
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+import feedparser
+
+logger = logging.getLogger(__name__)
+
+# ========== НАСТРОЙКИ ==========
+CHUNK_SIZE = 16 * 1024
+
+ATOM_NS = '{http://www.w3.org/2005/Atom}'
+RSS1_NS = '{http://purl.org/rss/1.0/}'
+RDF_NS = '{http://www.w3.org/1999/02/22-rdf-syntax-ns#}'
+DC_NS = '{http://purl.org/dc/elements/1.1/}'
+
+# Корневой элемент -> элемент записи
+ITEM_TAGS = {
+    'rss': 'item',
+    RDF_NS + 'RDF': RSS1_NS + 'item',
+    ATOM_NS + 'feed': ATOM_NS + 'entry',
+}
+
+# Результат разбора: parser - 'fast' или 'feedparser'
+ParsedFeed = namedtuple('ParsedFeed', ['entries', 'ttl', 'parser'])
+
+
+class UnsupportedFeed(Exception):
+    """Ленту нужно отдать feedparser"""
+
+
+# ========== ПОЛЯ ==========
+def _text(element):
+    """Текст элемента; у xhtml-содержимого Atom - текст всех вложенных элементов"""
+    if len(element):
+        return ''.join(element.itertext()).strip()
+    return (element.text or '').strip()
+
+
+def _parse_date(value):
+    """RFC 822 (RSS) или ISO 8601 (Atom, dc:date) -> struct_time в UTC, как у feedparser"""
+    try:
+        if value[:4].isdigit():
+            parsed = datetime.fromisoformat(value)
+        else:
+            parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        raise UnsupportedFeed(f"дата не разбирается: {value[:40]}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.utctimetuple()
+
+
+def _entry(item):
+    """Словарь записи из элемента item / entry"""
+    entry = {}
+    content = None
+    for child in item:
+        tag = child.tag
+        name = tag.rsplit('}', 1)[-1]
+        namespace = tag[:-len(name)]
+
+        if name == 'title' and namespace in ('', RSS1_NS, ATOM_NS):
+            entry['title'] = _text(child)
+        elif name == 'link':
+            if namespace == ATOM_NS:
+                # Atom: ссылка на статью - rel="alternate" или без rel
+                if child.get('rel', 'alternate') == 'alternate' and 'link' not in entry:
+                    entry['link'] = child.get('href', '')
+            elif namespace in ('', RSS1_NS):
+                entry['link'] = _text(child)
+        elif name in ('guid', 'id') and namespace in ('', ATOM_NS):
+            entry['id'] = _text(child)
+        elif name in ('description', 'summary') and namespace in ('', RSS1_NS, ATOM_NS):
+            entry['summary'] = _text(child)
+        elif name == 'content' and namespace == ATOM_NS:
+            content = _text(child)
+        elif name in ('pubDate', 'published') and namespace in ('', ATOM_NS):
+            entry['published_parsed'] = _parse_date(_text(child))
+        elif name == 'date' and namespace == DC_NS:
+            entry.setdefault('published_parsed', _parse_date(_text(child)))
+        elif name == 'updated' and namespace == ATOM_NS:
+            entry['updated_parsed'] = _parse_date(_text(child))
+
+    # Как feedparser: без summary описанием служит content
+    if 'summary' not in entry and content:
+        entry['summary'] = content
+    # RDF: идентификатор записи - rdf:about
+    if 'id' not in entry and item.get(RDF_NS + 'about'):
+        entry['id'] = item.get(RDF_NS + 'about')
+    return entry
+
+
+# ========== РАЗБОР ==========
+def fast_parse(content, max_items):
+    """Первые max_items записей ленты; UnsupportedFeed, если формат не наш"""
+    parser = XMLPullParser(events=('start', 'end'))
+    item_tag = None
+    depth = 0
+    entries = []
+    ttl = None
+
+    try:
+        for offset in range(0, len(content), CHUNK_SIZE):
+            parser.feed(content[offset:offset + CHUNK_SIZE])
+            for event, element in parser.read_events():
+                if event == 'start':
+                    if item_tag is None:
+                        item_tag = ITEM_TAGS.get(element.tag)
+                        if item_tag is None:
+                            raise UnsupportedFeed(f"неизвестный корень {element.tag}")
+                    if element.tag == item_tag:
+                        depth += 1
+                    continue
+
+                if element.tag == item_tag:
+                    depth -= 1
+                    entries.append(_entry(element))
+                    # Разобранную запись из дерева больше не держим
+                    element.clear()
+                    if len(entries) >= max_items:
+                        return ParsedFeed(entries, ttl, 'fast')
+                elif element.tag == 'ttl' and depth == 0:
+                    ttl = _text(element)
+        parser.close()
+    except ParseError as e:
+        raise UnsupportedFeed(f"XML не разбирается: {e}")
+
+    if item_tag is None:
+        raise UnsupportedFeed("пустой документ")
+    return ParsedFeed(entries, ttl, 'fast')
+
+
+def parse_feed(content, max_items, response_headers=None):
+    """Быстрый разбор, а если не вышло - feedparser"""
+    try:
+        return fast_parse(content, max_items)
+    except UnsupportedFeed as e:
+        logger.debug(f"↩️ Быстрый разбор не подошел ({e}), используем feedparser")
+
+    feed = feedparser.parse(content, response_headers=response_headers)
+    return ParsedFeed(feed.entries[:max_items], feed.feed.get('ttl'), 'feedparser')
@@ -0,0 +1,176 @@
+"""Загрузка RSS с условными запросами (ETag / Last-Modified) через общую HTTP-сессию"""
+import concurrent.futures
+import hashlib
+import logging
+import threading
+import time
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# ========== НАСТРОЙКИ ==========
+USER_AGENT = 'Mozilla/5.0 (compatible; NaukaBot/1.0; +https://nauka-bot-1.onrender.com)'
+FETCH_TIMEOUT = (10, 30)  # (connect, read) в секундах
+POOL_SIZE = 16
+# Тело читаем кусками, чтобы проверять общий срок загрузки
+CHUNK_SIZE = 64 * 1024
+# Потоки для основного и дублирующего запроса к медленным лентам
+HEDGE_WORKERS = 16
+
+FEED_HEDGES = registry.counter('nauka_feed_hedged_requests_total', 'Дублирующие запросы: чей ответ пришел первым', ['winner'])
+
+# Результат загрузки: changed=False означает, что лента не изменилась и парсить ее не нужно
+FeedResponse = namedtuple('FeedResponse', ['changed', 'content', 'headers', 'status_code', 'size'])
+
+# ========== HTTP-СЕССИЯ ==========
+def _create_session():
+    """Общая keep-alive сессия с пулом соединений"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept': 'application/rss+xml, application/atom+xml, application/xml;q=0.9, */*;q=0.8',
+        'Accept-Encoding': 'gzip, deflate',
+    })
+    return session
+
+session = _create_session()
+_hedge_pool = concurrent.futures.ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix='feed-hedge')
+
+
+class FetchDeadlineExceeded(requests.Timeout):
+    """Лента не загрузилась к общему сроку"""
+
+# ========== КЭШ ВАЛИДАТОРОВ ==========
+# url -> {'etag', 'last_modified', 'body_hash', 'items'}
+# Валидаторы хранятся в памяти вместе с разобранными новостями: ответ 304
+# полезен только пока у процесса есть результат прошлого разбора
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def build_conditional_headers(url):
+    """Заголовки If-None-Match / If-Modified-Since для источника"""
+    with _cache_lock:
+        entry = _cache.get(url)
+        if not entry or entry.get('items') is None:
+            return {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+
+def get_cached_items(url):
+    """Новости, разобранные при последней успешной загрузке источника"""
+    with _cache_lock:
+        entry = _cache.get(url)
+        return list(entry['items']) if entry and entry.get('items') is not None else None
+
+
+def remember_items(url, items):
+    """Сохраняем результат разбора, чтобы вернуть его при неизмененной ленте"""
+    with _cache_lock:
+        _cache.setdefault(url, {})['items'] = list(items)
+
+
+def _is_same_body(url, body_hash):
+    with _cache_lock:
+        entry = _cache.get(url)
+        return bool(entry) and entry.get('items') is not None and entry.get('body_hash') == body_hash
+
+
+def _store_validators(url, headers, body_hash):
+    with _cache_lock:
+        entry = _cache.setdefault(url, {})
+        entry['etag'] = headers.get('ETag')
+        entry['last_modified'] = headers.get('Last-Modified')
+        entry['body_hash'] = body_hash
+        # Новые байты - прошлый разбор больше не актуален
+        entry['items'] = None
+
+
+# ========== ЗАГРУЗКА ==========
+def _download(url, headers, timeout, deadline):
+    """GET, в котором read-таймаут ограничивает каждое чтение, а deadline - всю загрузку"""
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise FetchDeadlineExceeded(f"{url}: срок цикла истек до запроса")
+        timeout = (min(timeout[0], remaining), min(timeout[1], remaining))
+
+    with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        chunks = []
+        if response.status_code == 200:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                chunks.append(chunk)
+                if deadline is not None and time.monotonic() > deadline:
+                    raise FetchDeadlineExceeded(f"{url}: загрузка не уложилась в срок")
+        return response, b''.join(chunks)
+
+
+def _hedged_download(url, headers, timeout, deadline, hedge_after):
+    """Второй такой же запрос, если первый не ответил за hedge_after секунд; берем первый успешный"""
+    primary = _hedge_pool.submit(_download, url, headers, timeout, deadline)
+    try:
+        return primary.result(timeout=hedge_after)
+    except concurrent.futures.TimeoutError:
+        pass
+
+    logger.info(f"🔀 {url}: нет ответа за {hedge_after:.1f} с, дублируем запрос")
+    hedge = _hedge_pool.submit(_download, url, headers, timeout, deadline)
+    names = {primary: 'primary', hedge: 'hedge'}
+    error = None
+    for future in concurrent.futures.as_completed(names):
+        try:
+            result = future.result()
+        except Exception as e:
+            error = e
+            continue
+        FEED_HEDGES.inc(winner=names[future])
+        return result
+    raise error
+
+
+def fetch_feed(url, timeout=FETCH_TIMEOUT, deadline=None, hedge_after=None):
+    """Загружаем ленту; при 304 или том же теле возвращаем changed=False.
+
+    deadline - time.monotonic(), к которому загрузка должна закончиться;
+    hedge_after - через сколько секунд продублировать запрос (None - не дублировать).
+    """
+    headers = build_conditional_headers(url)
+    if hedge_after is not None:
+        response, content = _hedged_download(url, headers, timeout, deadline, hedge_after)
+    else:
+        response, content = _download(url, headers, timeout, deadline)
+
+    if response.status_code != 304:
+        response.raise_for_status()
+    return finish_fetch(url, response.status_code, response.headers, content)
+
+
+def finish_fetch(url, status_code, headers, content):
+    """Ответ источника -> FeedResponse: 304 и то же тело - changed=False (общее для всех движков)"""
+    if status_code == 304:
+        logger.debug(f"♻️ {url}: 304 Not Modified")
+        return FeedResponse(False, b'', headers, 304, 0)
+
+    if status_code >= 400:
+        raise requests.HTTPError(f"{status_code} для {url}")
+    body_hash = hashlib.sha1(content).hexdigest()
+
+    if _is_same_body(url, body_hash):
+        logger.debug(f"♻️ {url}: тело ленты не изменилось")
+        return FeedResponse(False, b'', headers, status_code, len(content))
+
+    _store_validators(url, headers, body_hash)
+    return FeedResponse(True, content, headers, status_code, len(content))
@@ -0,0 +1,86 @@
+"""Фиксированный пул для тяжелых команд с ограниченной очередью и склейкой повторов"""
+import logging
+import threading
+import time
+from collections import deque
+
+from metrics import percentile
+from worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+# Ответы submit
+ACCEPTED = 'accepted'
+DUPLICATE = 'duplicate'
+BUSY = 'busy'
+
+
+class JobExecutor(WorkerPool):
+    """workers потоков, очередь до max_queue задач, одна задача на ключ одновременно"""
+
+    def __init__(self, workers=4, max_queue=50, latency_window=200):
+        super().__init__(workers, max_queue, name='job-worker')
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._running = 0
+        self._latencies = deque(maxlen=latency_window)  # (ожидание, выполнение) в секундах
+        self.completed = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def submit(self, key, func):
+        """Ставим задачу; повтор ключа, пока задача в работе, склеивается"""
+        with self._lock:
+            if key in self._in_flight:
+                self.coalesced += 1
+                return DUPLICATE
+            if not self.put((key, func, time.monotonic())):
+                self.rejected += 1
+                return BUSY
+            self._in_flight.add(key)
+        return ACCEPTED
+
+    def handle(self, job):
+        key, func, queued_at = job
+        started_at = time.monotonic()
+        with self._lock:
+            self._running += 1
+        try:
+            func()
+            succeeded = True
+        except Exception as e:
+            succeeded = False
+            logger.error(f"❌ Ошибка задачи {key}: {e}")
+        finally:
+            finished_at = time.monotonic()
+            with self._lock:
+                self._running -= 1
+                self._in_flight.discard(key)
+                self._latencies.append((started_at - queued_at, finished_at - started_at))
+                if succeeded:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def stats(self):
+        """Глубина очереди, занятость и задержки задач"""
+        with self._lock:
+            waits = [wait for wait, _ in self._latencies]
+            runs = [run for _, run in self._latencies]
+            return {
+                'queue_depth': self.depth(),
+                'running': self._running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'coalesced': self.coalesced,
+                'rejected': self.rejected,
+                'wait_p50': _rounded(percentile(waits, 0.5)),
+                'wait_p95': _rounded(percentile(waits, 0.95)),
+                'run_p50': _rounded(percentile(runs, 0.5)),
+                'run_p95': _rounded(percentile(runs, 0.95)),
+            }
+
+
+def _rounded(value):
+    return round(value, 3) if value is not None else None
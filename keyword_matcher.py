@@ -0,0 +1,136 @@
+"""Скомпилированный поиск ключевых слов с границами слов"""
+import re
+
+# ========== НАСТРОЙКИ ==========
+# Окончания, которые допускаются после ключевого слова: множественное число и
+# падежи. Без них граница слова отсекала бы 'comets' и 'космоса'
+ENDINGS = {
+    'en': ('s', 'es', "'s", 'er', 'ers', 'ed', 'ing'),
+    'de': ('e', 'n', 's', 'en', 'er', 'es', 'ern'),
+    'fr': ('e', 's', 'x', 'es'),
+    'es': ('s', 'es'),
+    'pt': ('s', 'es'),
+    'ru': (
+        'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю',
+        'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ую', 'юю', 'ым', 'им', 'ых', 'их',
+        'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ия', 'ии', 'ию',
+        'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ами', 'ями',
+    ),
+}
+# Языки, где ключевые слова даны в начальной форме ('военный') и окончание
+# перед поиском отрезается, чтобы находились другие формы ('военные')
+STEMMED_LANGS = ('ru',)
+# Короче основа не обрезается: 'рак' и 'нло' остаются как есть
+MIN_STEM = 4
+
+# ========== ПОСТРОЕНИЕ РЕГУЛЯРНОГО ВЫРАЖЕНИЯ ==========
+def _build_trie(words):
+    """Префиксное дерево из слов"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+    return trie
+
+
+def _trie_pattern(node):
+    """Регулярное выражение по префиксному дереву.
+
+    Общие префиксы выносятся за скобки, поэтому движок re проходит текст
+    как по автомату, а не проверяет каждое слово по отдельности.
+    """
+    alternatives = []
+    single_chars = []
+    for char in sorted(key for key in node if key):
+        tail = _trie_pattern(node[char])
+        if tail:
+            alternatives.append(re.escape(char) + tail)
+        else:
+            single_chars.append(re.escape(char))
+
+    if single_chars:
+        alternatives.append(single_chars[0] if len(single_chars) == 1 else f"[{''.join(single_chars)}]")
+
+    if not alternatives:
+        return ''
+
+    pattern = alternatives[0] if len(alternatives) == 1 else f"(?:{'|'.join(alternatives)})"
+    if '' in node:
+        pattern = f"(?:{pattern})?"
+    return pattern
+
+
+def stem(word, endings=()):
+    """Слово без самого длинного окончания из endings ('военный' -> 'военн')"""
+    for ending in sorted(endings, key=len, reverse=True):
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def compile_keywords(words, whole_word=True, endings=()):
+    """Одно регулярное выражение для списка слов; group(1) - само слово без окончания.
+
+    Начало слова проверяется всегда ('war' не находится в 'software'). При
+    whole_word после слова допускается одно из endings и затем граница слова,
+    whole_word=False проверяет только начало - так исключение 'president'
+    срабатывает и на 'presidential'.
+    """
+    trie = _build_trie(word.lower() for word in words if word)
+    end = ''
+    if whole_word:
+        suffix = '|'.join(re.escape(ending) for ending in sorted(endings, key=len, reverse=True))
+        end = rf'(?:{suffix})?(?!\w)' if suffix else r'(?!\w)'
+    return re.compile(rf'(?<!\w)({_trie_pattern(trie)}){end}')
+
+
+def normalize_text(text):
+    """Нижний регистр и одиночные пробелы - один раз на текст"""
+    return ' '.join(text.lower().split())
+
+# ========== МАТЧЕР ==========
+class KeywordMatcher:
+    """Ключевые слова и исключения одного языка.
+
+    endings - окончания, допустимые после ключевого слова; stem_keywords -
+    сначала отрезать окончание у самих ключевых слов.
+    """
+
+    def __init__(self, keywords, exclude_words=(), endings=(), stem_keywords=False):
+        self.keywords = list(keywords)
+        # Основа в нижнем регистре -> ключевое слово в исходном написании;
+        # формы одного слова ('украина', 'украины') сходятся к первому в списке
+        self._originals = {}
+        for keyword in self.keywords:
+            word = normalize_text(keyword)
+            self._originals.setdefault(stem(word, endings) if stem_keywords else word, keyword)
+        self._pattern = compile_keywords(self._originals, endings=endings) if self._originals else None
+        self._exclude = compile_keywords(exclude_words, whole_word=False) if exclude_words else None
+
+    def is_excluded(self, text):
+        """Есть ли в нормализованном тексте слово из списка исключений"""
+        return self._exclude is not None and self._exclude.search(text) is not None
+
+    def find(self, text):
+        """Найденные ключевые слова в нормализованном тексте (без повторов, по порядку)"""
+        if self._pattern is None:
+            return []
+        found = {}
+        for match in self._pattern.finditer(text):
+            found.setdefault(self._originals.get(match.group(1), match.group(1)), None)
+        return list(found)
+
+    def match(self, text):
+        """Ключевые слова в тексте; пустой список, если текст исключен"""
+        text = normalize_text(text)
+        if self.is_excluded(text):
+            return []
+        return self.find(text)
+
+
+def build_matchers(keywords_by_lang, exclude_words=()):
+    """Матчеры для всех языков, строятся один раз при запуске"""
+    return {lang: KeywordMatcher(words, exclude_words, ENDINGS.get(lang, ()), lang in STEMMED_LANGS)
+            for lang, words in keywords_by_lang.items()}
@@ -0,0 +1,89 @@
+"""Выбор ведущего процесса: фоновые циклы бота работают только в одном воркере gunicorn
+
+Ведущий держит строку-аренду в SQLite и продлевает ее каждые ttl/3 секунд.
+Если процесс упал или завис, аренда истекает, и ее забирает другой процесс.
+Остальные процессы только отвечают на HTTP-запросы (включая /webhook).
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from storage import acquire_lease, release_lease
+
+logger = logging.getLogger(__name__)
+
+# ========== НАСТРОЙКИ ==========
+LEASE_TTL = float(os.environ.get('LEADER_LEASE_TTL', 30))
+
+
+class LeaderElector:
+    """Аренда name: пока она наша, is_leader=True и wait() не блокирует"""
+
+    def __init__(self, name, ttl=LEASE_TTL, on_elected=None):
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        # Вызывается при каждом избрании (например, регистрация webhook)
+        self.on_elected = on_elected
+        self.elections = 0
+        self._elected = threading.Event()
+        self._stopped = threading.Event()
+        self._expires_at = 0.0
+
+    @property
+    def is_leader(self):
+        return self._elected.is_set()
+
+    def wait(self, timeout=None):
+        """Ждем, пока процесс станет ведущим; True, если стал"""
+        return self._elected.wait(timeout)
+
+    def start(self):
+        threading.Thread(target=self._run, name='leader-election', daemon=True).start()
+        return self
+
+    def stop(self):
+        """Отдаем аренду при остановке процесса - другой процесс подхватит ее сразу"""
+        self._stopped.set()
+        if self.is_leader:
+            self._elected.clear()
+            try:
+                release_lease(self.name, self.owner)
+                logger.info(f"👋 {self.owner}: аренда {self.name} отдана")
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось отдать аренду {self.name}: {e}")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._heartbeat()
+            self._stopped.wait(self.ttl / 3)
+
+    def _heartbeat(self):
+        try:
+            acquired = acquire_lease(self.name, self.owner, self.ttl)
+        except Exception as e:
+            logger.error(f"❌ Аренда {self.name}: ошибка продления: {e}")
+            # База недоступна: остаемся ведущим, пока не истекла уже взятая аренда
+            acquired = self.is_leader and time.time() < self._expires_at
+        else:
+            if acquired:
+                self._expires_at = time.time() + self.ttl
+
+        if acquired and not self.is_leader:
+            self.elections += 1
+            logger.info(f"👑 {self.owner}: ведущий процесс, запускаем фоновые циклы")
+            if self.on_elected:
+                try:
+                    self.on_elected()
+                except Exception as e:
+                    logger.error(f"❌ Ошибка при избрании ведущим: {e}")
+            self._elected.set()
+        elif not acquired and self.is_leader:
+            logger.warning(f"⚠️ {self.owner}: аренда {self.name} потеряна, фоновые циклы останавливаются")
+            self._elected.clear()
+
+    def as_dict(self):
+        return {'owner': self.owner, 'is_leader': self.is_leader, 'elections': self.elections}
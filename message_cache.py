@@ -0,0 +1,60 @@
+"""Готовые сообщения статей: перевод и верстка - один раз на статью для всех чатов"""
+import os
+import threading
+from collections import OrderedDict
+
+from metrics import registry
+
+# ========== НАСТРОЙКИ ==========
+MESSAGE_CACHE_SIZE = int(os.environ.get('MESSAGE_CACHE_SIZE', 1000))
+
+MESSAGE_CACHE_LOOKUPS = registry.counter('nauka_message_cache_lookups_total', 'Обращения к кэшу готовых сообщений', ['result'])
+
+
+class MessageCache:
+    """LRU: content_hash статьи -> текст сообщения в Markdown"""
+
+    def __init__(self, max_size=MESSAGE_CACHE_SIZE):
+        self.max_size = max_size
+        self._messages = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._messages
+
+    def get(self, key):
+        with self._lock:
+            message = self._messages.get(key)
+            if message is None:
+                self.misses += 1
+            else:
+                self._messages.move_to_end(key)
+                self.hits += 1
+        MESSAGE_CACHE_LOOKUPS.inc(result='miss' if message is None else 'hit')
+        return message
+
+    def put(self, key, message):
+        with self._lock:
+            self._messages[key] = message
+            self._messages.move_to_end(key)
+            while len(self._messages) > self.max_size:
+                self._messages.popitem(last=False)
+
+    def get_or_render(self, key, render):
+        """Сообщение из кэша, а если его нет - render() и в кэш"""
+        message = self.get(key)
+        if message is None:
+            message = render()
+            self.put(key, message)
+        return message
+
+    def clear(self):
+        with self._lock:
+            self._messages.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._messages), 'hits': self.hits, 'misses': self.misses}
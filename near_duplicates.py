@@ -0,0 +1,185 @@
+"""Поиск почти одинаковых новостей из разных источников (MinHash + LSH)"""
+import hashlib
+import random
+import re
+import struct
+import threading
+
+# ========== НАСТРОЙКИ ==========
+NUM_PERM = 32
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Минимальная оценка сходства Жаккара, при которой статьи - одна история
+SIMILARITY_THRESHOLD = 0.5
+# Слово обрезаем до корня такой длины: 'sighting' и 'sightings' совпадут
+STEM_LENGTH = 6
+MIN_TOKENS = 3
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1980)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+_SIGNATURE_FORMAT = f'<{NUM_PERM}Q'
+
+_WORD_RE = re.compile(r'\w+')
+
+STOP_WORDS = {
+    'the', 'and', 'for', 'with', 'from', 'that', 'this', 'are', 'was', 'were', 'has', 'have', 'will',
+    'after', 'over', 'into', 'about', 'says', 'said', 'new', 'its', 'their', 'his', 'her', 'than',
+    'der', 'die', 'das', 'und', 'mit', 'von', 'den', 'dem', 'ein', 'eine', 'nach', 'auf', 'für',
+    'les', 'des', 'une', 'pour', 'dans', 'sur', 'par', 'est', 'aux', 'avec',
+    'los', 'las', 'del', 'para', 'con', 'por', 'que', 'una', 'uma', 'dos', 'das', 'com', 'não',
+    'как', 'что', 'это', 'для', 'при', 'после', 'его', 'она', 'они', 'был', 'была', 'будет',
+}
+
+# ========== ПОДПИСИ ==========
+def tokenize(title, description):
+    """Множество нормализованных слов заголовка и начала описания"""
+    text = f"{title} {(description or '')[:300]}".lower()
+    return {
+        word[:STEM_LENGTH]
+        for word in _WORD_RE.findall(text)
+        if len(word) >= 3 and word not in STOP_WORDS
+    }
+
+
+def _token_hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), 'little') % _MERSENNE_PRIME
+
+
+def minhash(tokens):
+    """MinHash-подпись множества слов; None для слишком коротких текстов"""
+    if len(tokens) < MIN_TOKENS:
+        return None
+    hashes = [_token_hash(token) for token in tokens]
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def article_signature(article):
+    """Подпись статьи по заголовку и описанию"""
+    return minhash(tokenize(article['title'], article.get('description')))
+
+
+def similarity(left, right):
+    """Оценка сходства Жаккара по двум подписям"""
+    return sum(1 for a, b in zip(left, right) if a == b) / NUM_PERM
+
+
+def encode_signature(signature):
+    """Подпись в BLOB для SQLite"""
+    return struct.pack(_SIGNATURE_FORMAT, *signature) if signature else None
+
+
+def decode_signature(blob):
+    return struct.unpack(_SIGNATURE_FORMAT, blob) if blob else None
+
+# ========== LSH-ИНДЕКС ==========
+class NearDuplicateIndex:
+    """LSH по полосам подписи: сравниваем только статьи с совпавшей полосой"""
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self._buckets = {}
+        self._signatures = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    @staticmethod
+    def _bands(signature):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS:(band + 1) * ROWS]
+
+    def add(self, key, signature):
+        if signature is None:
+            return
+        self._signatures[key] = signature
+        for band in self._bands(signature):
+            self._buckets.setdefault(band, []).append(key)
+
+    def find(self, signature):
+        """Самый похожий ключ выше порога или None"""
+        if signature is None:
+            return None
+        best_key, best_score = None, self.threshold
+        checked = set()
+        for band in self._bands(signature):
+            for key in self._buckets.get(band, ()):
+                if key in checked:
+                    continue
+                checked.add(key)
+                score = similarity(signature, self._signatures[key])
+                if score >= best_score:
+                    best_key, best_score = key, score
+        return best_key
+
+
+def representative_score(article):
+    """Чем выше, тем лучше статья представляет историю"""
+    return (len(article.get('keywords', ())), len(article.get('description') or ''), article.get('entry_time'))
+
+
+def pick_representatives(articles, history=()):
+    """Оставляем по одной статье на историю.
+
+    history - пары (content_hash, подпись) уже опубликованных новостей:
+    статьи, похожие на них, отбрасываются целиком.
+    Возвращаем (представители, число отброшенных).
+    """
+    index = NearDuplicateIndex()
+    for key, signature in history:
+        index.add(('history', key), signature)
+
+    representatives = {}
+    dropped = 0
+    for article in sorted(articles, key=representative_score, reverse=True):
+        signature = article_signature(article)
+        match = index.find(signature)
+        if match is None:
+            # Копия: статьи могут лежать в кэше разобранных лент
+            representatives[article['content_hash']] = dict(article)
+            index.add(('cycle', article['content_hash']), signature)
+            continue
+
+        dropped += 1
+        origin, key = match
+        if origin == 'cycle':
+            related = representatives[key].setdefault('related_sources', [])
+            if article['source'] not in related and article['source'] != representatives[key]['source']:
+                related.append(article['source'])
+
+    kept = [representatives[article['content_hash']] for article in articles
+            if article['content_hash'] in representatives]
+    return kept, dropped
+
+
+class StreamingDeduplicator:
+    """Отбор статей по мере поступления: проходит первая статья истории, пересказы отбрасываются.
+
+    В отличие от pick_representatives лучшую статью выбрать нельзя - к приходу
+    пересказа первая статья уже может быть разослана.
+    """
+
+    def __init__(self, history=()):
+        self._index = NearDuplicateIndex()
+        for key, signature in history:
+            self._index.add(('history', key), signature)
+        self._urls = set()
+        self._hashes = set()
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def accept(self, article):
+        """True, если статья - новая история"""
+        signature = article_signature(article)
+        with self._lock:
+            if article['url'] in self._urls or article['content_hash'] in self._hashes \
+                    or self._index.find(signature) is not None:
+                self.dropped += 1
+                return False
+            self._urls.add(article['url'])
+            self._hashes.add(article['content_hash'])
+            self._index.add(('stream', article['content_hash']), signature)
+            return True
@@ -0,0 +1,138 @@
+"""Очередь отправки в SQLite: рассылка переживает рестарт процесса
+
+Цикл ленты только ставит сообщения в очередь (storage.enqueue_broadcast /
+enqueue_digests), а этот разборщик отправляет их пачками через Broadcaster
+под его лимитами скорости. Отправленные строки отмечаются в базе, временные
+ошибки откладываются с экспоненциальной задержкой. После рестарта разбор
+продолжается с первой неотправленной строки; повторно может уйти только
+пачка, которая отправлялась в момент падения.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+from metrics import registry
+from storage import (
+    get_due_outbox, complete_outbox, outbox_stats, prune_outbox,
+    OUTBOX_FAILED, OUTBOX_UNREACHABLE,
+)
+
+logger = logging.getLogger(__name__)
+
+# ========== НАСТРОЙКИ ==========
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 200))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 5))
+# Задержка повтора: RETRY_BASE * 2^(попытка-1), не больше RETRY_MAX
+OUTBOX_RETRY_BASE = float(os.environ.get('OUTBOX_RETRY_BASE', 30))
+OUTBOX_RETRY_MAX = float(os.environ.get('OUTBOX_RETRY_MAX', 3600))
+# Сколько храним завершенные строки, если retention не задан; App задает его
+# от окна свежести новостей (MAX_NEWS_AGE_DAYS)
+OUTBOX_RETENTION = float(os.environ.get('OUTBOX_RETENTION', 4 * 24 * 3600))
+OUTBOX_PRUNE_INTERVAL = 3600
+
+OUTBOX_MESSAGES = registry.counter('nauka_outbox_messages_total', 'Строки очереди отправки по итогу', ['result'])
+
+
+class OutboxWorker:
+    """Разбирает очередь отправки пачками; в пачке не больше одного сообщения на чат"""
+
+    def __init__(self, broadcaster, on_report=None, batch_size=OUTBOX_BATCH_SIZE, max_attempts=OUTBOX_MAX_ATTEMPTS,
+                 retry_base=OUTBOX_RETRY_BASE, retry_max=OUTBOX_RETRY_MAX, retention=OUTBOX_RETENTION):
+        self.broadcaster = broadcaster
+        # on_report(BroadcastReport) - итоги доставки для таблицы подписчиков
+        self.on_report = on_report
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        # Завершенные строки - защита от повторной постановки: храним их, пока
+        # статья может снова попасть в выдачу
+        self.retention = retention
+        self._wake = threading.Event()
+        self._last_prune = 0.0
+        # Скорость последней пачки, сообщений в секунду
+        self.send_rate = 0.0
+
+    def notify(self):
+        """В очереди появились сообщения - не ждем до конца паузы"""
+        self._wake.set()
+
+    def wait(self, timeout):
+        self._wake.wait(timeout)
+        self._wake.clear()
+
+    def retry_delay(self, attempts):
+        """Экспоненциальная задержка с разбросом, чтобы повторы не шли одной волной"""
+        delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+        return delay * random.uniform(0.8, 1.2)
+
+    def drain_batch(self):
+        """Отправляем одну пачку; возвращаем число обработанных строк (0 - отправлять нечего)"""
+        rows = get_due_outbox(self.batch_size)
+        if not rows:
+            self._prune()
+            return 0
+
+        # Следующее сообщение того же чата уйдет следующей пачкой - порядок сохраняется
+        batch = {}
+        given_up = []
+        for outbox_id, message_key, chat_id, attempts, text, active in rows:
+            if active == 0:
+                given_up.append((outbox_id, OUTBOX_UNREACHABLE, 'chat deactivated'))
+            elif chat_id not in batch:
+                batch[chat_id] = (outbox_id, message_key, attempts, text)
+
+        report = self.broadcaster.broadcast((message_key, chat_id, text)
+                                            for chat_id, (_, message_key, _, text) in batch.items())
+
+        sent = []
+        retry = []
+        now = time.time()
+        reached = set(report.reached)
+        for chat_id, (outbox_id, _, attempts, _) in batch.items():
+            if chat_id in reached:
+                sent.append(outbox_id)
+            elif chat_id in report.unreachable:
+                given_up.append((outbox_id, OUTBOX_UNREACHABLE, report.unreachable[chat_id]))
+            elif chat_id in report.rejected:
+                given_up.append((outbox_id, OUTBOX_FAILED, report.rejected[chat_id]))
+            elif attempts + 1 >= self.max_attempts:
+                given_up.append((outbox_id, OUTBOX_FAILED, 'max attempts'))
+            else:
+                # Временная ошибка или отправка, не дошедшая до отчета (исключение в
+                # потоке рассылки): строка не должна вернуться в эту же очередь сразу
+                retry.append((outbox_id, now + self.retry_delay(attempts + 1), 'send failed'))
+
+        complete_outbox(sent, retry, given_up)
+        if self.on_report:
+            self.on_report(report)
+
+        OUTBOX_MESSAGES.inc(len(sent), result='sent')
+        OUTBOX_MESSAGES.inc(len(retry), result='retry')
+        for _, status, _ in given_up:
+            OUTBOX_MESSAGES.inc(result=status)
+        self.send_rate = report.messages_per_second
+        logger.info(f"📮 Очередь: {report.summary()}, повтор {len(retry)}, снято {len(given_up)}")
+        return len(rows)
+
+    def flush(self):
+        """Разбираем все, чему уже пора уйти; возвращаем число обработанных строк"""
+        processed = 0
+        while True:
+            count = self.drain_batch()
+            if not count:
+                return processed
+            processed += count
+
+    def _prune(self):
+        if time.monotonic() - self._last_prune < OUTBOX_PRUNE_INTERVAL:
+            return
+        self._last_prune = time.monotonic()
+        deleted = prune_outbox(time.time() - self.retention)
+        if deleted:
+            logger.info(f"🧹 Из очереди отправки удалено {deleted} завершенных строк")
+
+    def stats(self):
+        return dict(outbox_stats(), send_rate=round(self.send_rate, 1))
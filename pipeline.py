@@ -0,0 +1,190 @@
+"""Потоковый конвейер: этапы в своих потоках, между ними ограниченные очереди"""
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Конец потока данных
+_DONE = object()
+
+PipelineReport = namedtuple('PipelineReport', ['results', 'elapsed', 'first_result_after', 'stages'])
+
+
+class StageStats:
+    """Счетчики одного этапа"""
+
+    def __init__(self):
+        self.received = 0
+        self.emitted = 0
+        self.errors = 0
+        self.busy = 0.0  # секунд в обработке (с ожиданием места в следующей очереди), по всем потокам
+        self._lock = threading.Lock()
+
+    def record(self, emitted, busy, failed=False):
+        with self._lock:
+            self.received += 1
+            self.emitted += emitted
+            self.busy += busy
+            if failed:
+                self.errors += 1
+
+    def as_dict(self):
+        return {
+            'received': self.received,
+            'emitted': self.emitted,
+            'errors': self.errors,
+            'busy': round(self.busy, 3),
+        }
+
+
+class Pipeline:
+    """Источник -> этапы -> результаты; полная очередь притормаживает предыдущий этап"""
+
+    def __init__(self, queue_size=20):
+        self.queue_size = queue_size
+        self._produce = None
+        self._stages = []  # (имя, функция запуска этапа)
+        self.stats = {}
+
+    def source(self, name, produce):
+        """produce() - итератор входных элементов (читается в отдельном потоке)"""
+        self._produce = (name, produce)
+        self.stats[name] = StageStats()
+        return self
+
+    def stage(self, name, func, workers=1):
+        """func(элемент) -> итерируемое выходных элементов (пусто - элемент отброшен)"""
+        self.stats[name] = StageStats()
+        self._stages.append((name, lambda inbox, outbox: self._run_stage(name, func, workers, inbox, outbox)))
+        return self
+
+    def reorder(self, name, key, window, max_items=20):
+        """Окно свежести: элементы, пришедшие за window секунд, уходят по убыванию key"""
+        if window <= 0:
+            return self
+        self.stats[name] = StageStats()
+        self._stages.append((name, lambda inbox, outbox: self._run_reorder(
+            name, key, window, max_items, inbox, outbox)))
+        return self
+
+    def _run_source(self, _inbox, outbox):
+        name, produce = self._produce
+        stats = self.stats[name]
+
+        def run():
+            started = time.perf_counter()
+            try:
+                for item in produce():
+                    stats.record(1, time.perf_counter() - started)
+                    outbox.put(item)
+                    started = time.perf_counter()
+            except Exception as e:
+                stats.record(0, 0.0, failed=True)
+                logger.error(f"❌ Этап {name}: {e}")
+            finally:
+                outbox.put(_DONE)
+
+        return [threading.Thread(target=run, name=f"pipeline-{name}", daemon=True)]
+
+    def _run_stage(self, name, func, workers, inbox, outbox):
+        stats = self.stats[name]
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def run():
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    # Конец потока видят и остальные потоки этапа
+                    inbox.put(_DONE)
+                    break
+                started = time.perf_counter()
+                emitted = 0
+                failed = False
+                try:
+                    for output in func(item) or ():
+                        outbox.put(output)
+                        emitted += 1
+                except Exception as e:
+                    failed = True
+                    logger.error(f"❌ Этап {name}: {e}")
+                stats.record(emitted, time.perf_counter() - started, failed)
+
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                outbox.put(_DONE)
+
+        return [threading.Thread(target=run, name=f"pipeline-{name}-{index}", daemon=True)
+                for index in range(workers)]
+
+    def _run_reorder(self, name, key, window, max_items, inbox, outbox):
+        stats = self.stats[name]
+
+        def flush(buffer):
+            for item in sorted(buffer, key=key, reverse=True):
+                outbox.put(item)
+            stats.emitted += len(buffer)
+            buffer.clear()
+
+        def run():
+            buffer = []
+            flush_at = None
+            while True:
+                timeout = None if flush_at is None else max(0.0, flush_at - time.monotonic())
+                try:
+                    item = inbox.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is _DONE:
+                    flush(buffer)
+                    outbox.put(_DONE)
+                    return
+                if item is not None:
+                    stats.received += 1
+                    buffer.append(item)
+                    if flush_at is None:
+                        flush_at = time.monotonic() + window
+                if buffer and (len(buffer) >= max_items or time.monotonic() >= flush_at):
+                    flush(buffer)
+                    flush_at = None
+
+        return [threading.Thread(target=run, name=f"pipeline-{name}", daemon=True)]
+
+    def run(self):
+        """Запускаем все этапы и собираем результаты последнего"""
+        if self._produce is None:
+            raise ValueError("У конвейера нет источника")
+
+        start = time.perf_counter()
+        runners = [self._run_source] + [runner for _, runner in self._stages]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in runners]
+        threads = []
+        inbox = None
+        for runner, outbox in zip(runners, queues):
+            threads += runner(inbox, outbox)
+            inbox = outbox
+        for thread in threads:
+            thread.start()
+
+        results = []
+        first_result_after = None
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            if first_result_after is None:
+                first_result_after = time.perf_counter() - start
+            results.append(item)
+
+        for thread in threads:
+            thread.join()
+        return PipelineReport(
+            results, time.perf_counter() - start, first_result_after,
+            {name: stats.as_dict() for name, stats in self.stats.items()},
+        )
@@ -0,0 +1,125 @@
+"""Адаптивное расписание опроса источников"""
+import heapq
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# ========== НАСТРОЙКИ ==========
+MIN_POLL_INTERVAL = 180           # 3 минуты для самых частых лент
+MAX_POLL_INTERVAL = 6 * 3600      # редкие ленты - не чаще раза в 6 часов
+DEFAULT_POLL_INTERVAL = 1620      # первый опрос - как раньше, раз в 27 минут
+# Интервал подбираем так, чтобы за опрос приходило примерно столько новых записей
+TARGET_NEW_ENTRIES_PER_POLL = 3
+# Вес нового замера в скользящей оценке частоты публикаций
+RATE_SMOOTHING = 0.5
+BACKOFF_BASE = 300
+MAX_BACKOFF = 6 * 3600
+
+
+class SourceSchedule:
+    """Состояние расписания одного источника"""
+
+    def __init__(self, name, interval):
+        self.name = name
+        self.interval = interval
+        self.next_poll = 0.0
+        self.last_poll = None
+        self.rate = None  # новых записей в секунду
+        self.failures = 0
+
+    def as_dict(self):
+        return {
+            'interval': round(self.interval),
+            'next_poll_in': max(0, round(self.next_poll - time.monotonic())),
+            'entries_per_hour': round(self.rate * 3600, 2) if self.rate is not None else None,
+            'failures': self.failures,
+        }
+
+
+class PollScheduler:
+    """Очередь с приоритетом: у каждого источника свое время следующего опроса"""
+
+    def __init__(self, source_names, initial_interval=DEFAULT_POLL_INTERVAL):
+        self._lock = threading.Lock()
+        self._sources = {name: SourceSchedule(name, initial_interval) for name in source_names}
+        now = time.monotonic()
+        # Первый опрос всех источников сразу, со случайным сдвигом до минуты
+        self._heap = [(now + random.uniform(0, 60), name) for name in self._sources]
+        heapq.heapify(self._heap)
+        for next_poll, name in self._heap:
+            self._sources[name].next_poll = next_poll
+
+    def seconds_until_next(self):
+        """Сколько ждать до ближайшего опроса"""
+        with self._lock:
+            if not self._heap:
+                return MAX_POLL_INTERVAL
+            return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def sync(self, source_names):
+        """Подстраиваемся под реестр: новые источники опрашиваем сразу, удаленные забываем"""
+        with self._lock:
+            names = set(source_names)
+            for name in set(self._sources) - names:
+                del self._sources[name]
+            for name in names - set(self._sources):
+                source = self._sources[name] = SourceSchedule(name, DEFAULT_POLL_INTERVAL)
+                self._schedule(source, random.uniform(0, 60))
+
+    def pop_due(self):
+        """Источники, которые пора опросить"""
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                next_poll, name = heapq.heappop(self._heap)
+                # Запись удаленного или заново добавленного источника устарела
+                source = self._sources.get(name)
+                if source is not None and source.next_poll == next_poll:
+                    due.append(name)
+        return due
+
+    def _schedule(self, source, delay):
+        source.next_poll = time.monotonic() + delay
+        heapq.heappush(self._heap, (source.next_poll, source.name))
+
+    def record_success(self, name, new_entries, ttl_seconds=None):
+        """Опрос удался: подстраиваем интервал под частоту публикаций и TTL ленты"""
+        now = time.monotonic()
+        with self._lock:
+            source = self._sources[name]
+            source.failures = 0
+
+            if source.last_poll is not None:
+                sample = new_entries / max(1.0, now - source.last_poll)
+                source.rate = sample if source.rate is None else (
+                    RATE_SMOOTHING * sample + (1 - RATE_SMOOTHING) * source.rate)
+
+                if source.rate > 0:
+                    source.interval = TARGET_NEW_ENTRIES_PER_POLL / source.rate
+                else:
+                    source.interval *= 1.5
+            source.last_poll = now
+
+            # <ttl> ленты - минимальный интервал, который просит издатель
+            interval = max(source.interval, ttl_seconds or 0)
+            source.interval = min(MAX_POLL_INTERVAL, max(MIN_POLL_INTERVAL, interval))
+            self._schedule(source, source.interval)
+
+    def record_failure(self, name):
+        """Опрос не удался: экспоненциальная задержка с разбросом"""
+        with self._lock:
+            source = self._sources[name]
+            source.failures += 1
+            delay = min(MAX_BACKOFF, BACKOFF_BASE * 2 ** (source.failures - 1))
+            delay *= random.uniform(0.8, 1.2)
+            logger.warning(f"⏳ {name}: ошибка #{source.failures}, следующий опрос через {delay / 60:.0f} мин")
+            self._schedule(source, delay)
+
+    def snapshot(self):
+        """Текущее расписание всех источников"""
+        with self._lock:
+            return {name: source.as_dict() for name, source in self._sources.items()}
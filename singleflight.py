@@ -0,0 +1,154 @@
+"""Общий вызов для одновременных запросов и короткий кэш результата"""
+import threading
+import time
+
+
+class _Flight:
+    """Вызов, который сейчас выполняется"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Одновременные вызовы ждут один общий запуск func, результат живет ttl секунд"""
+
+    def __init__(self, func, ttl):
+        self.func = func
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._flight = None
+        self._result = None
+        self._result_at = 0.0
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+
+    def __call__(self, force=False):
+        """Результат func; force=True пропускает кэш (но присоединяется к идущему запуску)"""
+        with self._lock:
+            self.calls += 1
+            if not force and self._result is not None and time.monotonic() - self._result_at < self.ttl:
+                self.cache_hits += 1
+                return self._result
+
+            flight = self._flight
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._flight = _Flight()
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self.func()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self._result = flight.result
+                    self._result_at = time.monotonic()
+                self._flight = None
+            flight.done.set()
+        return flight.result
+
+    def invalidate(self):
+        """Сбрасываем кэшированный результат"""
+        with self._lock:
+            self._result = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'cache_hits': self.cache_hits,
+            }
+
+
+class _Stream:
+    """Запуск генератора, который сейчас идет: выданные элементы и признак конца"""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.changed = threading.Condition()
+
+
+class SharedStream:
+    """Одновременные потребители читают один общий запуск генератора func.
+
+    Опоздавший сначала получает уже выданные элементы, затем новые по мере
+    появления. Генератор работает в своем потоке; после его конца следующий
+    вызов начинает новый запуск.
+    """
+
+    def __init__(self, func, name='shared-stream'):
+        self.func = func
+        self.name = name
+        self._lock = threading.Lock()
+        self._stream = None
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            stream = self._stream
+            if stream is None:
+                stream = self._stream = _Stream()
+                self.executions += 1
+                threading.Thread(target=self._run, args=(stream,), name=self.name, daemon=True).start()
+            else:
+                self.coalesced += 1
+        return self._iterate(stream)
+
+    def _run(self, stream):
+        try:
+            for item in self.func():
+                with stream.changed:
+                    stream.items.append(item)
+                    stream.changed.notify_all()
+        except Exception as e:
+            stream.error = e
+        finally:
+            # Новые вызовы уже не присоединяются к закончившемуся запуску
+            with self._lock:
+                if self._stream is stream:
+                    self._stream = None
+            with stream.changed:
+                stream.done = True
+                stream.changed.notify_all()
+
+    def _iterate(self, stream):
+        index = 0
+        while True:
+            with stream.changed:
+                while index >= len(stream.items) and not stream.done:
+                    stream.changed.wait()
+                if index >= len(stream.items):
+                    if stream.error is not None:
+                        raise stream.error
+                    return
+                item = stream.items[index]
+            index += 1
+            yield item
+
+    def stats(self):
+        with self._lock:
+            return {'calls': self.calls, 'executions': self.executions, 'coalesced': self.coalesced}
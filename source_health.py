@@ -0,0 +1,137 @@
+"""Здоровье источников: задержки ответов, дублирующие запросы и автомат отключения"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+# ========== НАСТРОЙКИ ==========
+# Столько ошибок подряд - и источник отключается на время остывания
+FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN = 15 * 60
+MAX_BREAKER_COOLDOWN = 6 * 3600
+LATENCY_WINDOW = 20
+# Дублирующий запрос (hedging) - только источникам с медленным хвостом задержек
+HEDGING_ENABLED = os.environ.get('FEED_HEDGING', '1') == '1'
+HEDGE_MIN_SAMPLES = 5
+HEDGE_SLOW_LATENCY = 3.0   # p90 задержки, начиная с которого источник считается медленным
+HEDGE_MIN_DELAY = 1.0
+
+# Состояния автомата
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class SourceHealth:
+    """Состояние одного источника"""
+
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self.failures = 0           # ошибок подряд
+        self.total_failures = 0
+        self.cooldown = BREAKER_COOLDOWN
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.last_error = None
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def hedge_delay(self):
+        """Через сколько секунд дублировать запрос или None"""
+        if not HEDGING_ENABLED or len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        if percentile(self.latencies, 0.9) < HEDGE_SLOW_LATENCY:
+            return None
+        # Запрос, который идет дольше обычного для источника, скорее всего застрял
+        return max(HEDGE_MIN_DELAY, percentile(self.latencies, 0.75))
+
+    def as_dict(self):
+        p50 = percentile(self.latencies, 0.5)
+        p90 = percentile(self.latencies, 0.9)
+        cooldown_left = None
+        if self.state == OPEN:
+            cooldown_left = max(0, round(self.opened_at + self.cooldown - time.monotonic()))
+        return {
+            'state': self.state,
+            'failures_in_row': self.failures,
+            'total_failures': self.total_failures,
+            'cooldown_left': cooldown_left,
+            'latency_p50': round(p50, 3) if p50 is not None else None,
+            'latency_p90': round(p90, 3) if p90 is not None else None,
+            'hedge_after': self.hedge_delay(),
+            'last_error': self.last_error,
+        }
+
+
+class SourceHealthRegistry:
+    """Автоматы всех источников: closed -> open (остывание) -> half_open (одна проба)"""
+
+    def __init__(self, source_names=()):
+        self._lock = threading.Lock()
+        self._sources = {name: SourceHealth(name) for name in source_names}
+
+    def _get(self, name):
+        source = self._sources.get(name)
+        if source is None:
+            source = self._sources[name] = SourceHealth(name)
+        return source
+
+    def allow(self, name):
+        """Можно ли сейчас опрашивать источник"""
+        with self._lock:
+            source = self._get(name)
+            if source.state == CLOSED:
+                return True
+            if source.state == OPEN and time.monotonic() - source.opened_at >= source.cooldown:
+                source.state = HALF_OPEN
+                source.trial_in_flight = False
+            if source.state == HALF_OPEN and not source.trial_in_flight:
+                source.trial_in_flight = True
+                logger.info(f"🔌 {name}: пробный опрос после остывания")
+                return True
+            return False
+
+    def record_success(self, name, latency):
+        with self._lock:
+            source = self._get(name)
+            source.latencies.append(latency)
+            if source.state != CLOSED:
+                logger.info(f"✅ {name}: источник снова отвечает, автомат закрыт")
+            source.state = CLOSED
+            source.failures = 0
+            source.cooldown = BREAKER_COOLDOWN
+            source.trial_in_flight = False
+
+    def record_failure(self, name, error):
+        with self._lock:
+            source = self._get(name)
+            source.failures += 1
+            source.total_failures += 1
+            source.last_error = str(error)[:200]
+            if source.state == HALF_OPEN:
+                # Проба не удалась - остываем дольше
+                source.cooldown = min(MAX_BREAKER_COOLDOWN, source.cooldown * 2)
+            elif source.failures < FAILURE_THRESHOLD:
+                return
+            source.state = OPEN
+            source.opened_at = time.monotonic()
+            source.trial_in_flight = False
+            logger.warning(f"⛔ {name}: {source.failures} ошибок подряд, "
+                           f"не опрашиваем {source.cooldown / 60:.0f} мин")
+
+    def hedge_delay(self, name):
+        with self._lock:
+            return self._get(name).hedge_delay()
+
+    def open_count(self):
+        with self._lock:
+            return sum(1 for source in self._sources.values() if source.state != CLOSED)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: source.as_dict() for name, source in self._sources.items()}
@@ -0,0 +1,642 @@
+"""Слой хранения: долгоживущие соединения SQLite в режиме WAL"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# ========== НАСТРОЙКИ ==========
+DB_PATH = os.environ.get('DB_PATH', 'strange_news.db')
+
+# Настройки соединения: WAL позволяет читателям не ждать писателя,
+# synchronous=NORMAL в WAL безопасен и не делает fsync на каждый коммит
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16000',  # ~16 МБ страничного кэша на соединение
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA busy_timeout=5000',
+)
+
+# Размер кэша подготовленных выражений на соединение
+STATEMENT_CACHE_SIZE = 256
+
+# Сколько параметров передаем в один IN (...) - ниже лимита SQLite на переменные
+BULK_CHUNK_SIZE = 500
+
+# Подписчики для рассылки читаются страницами по столько чатов
+SUBSCRIBER_PAGE_SIZE = int(os.environ.get('SUBSCRIBER_PAGE_SIZE', 1000))
+
+# Доставка: каждая статья отдельным сообщением или дайджест цикла
+DELIVERY_INSTANT = 'instant'
+DELIVERY_DIGEST = 'digest'
+DELIVERY_MODES = (DELIVERY_INSTANT, DELIVERY_DIGEST)
+
+# Очередь отправки: pending ждет отправки, остальные статусы - итог
+OUTBOX_PENDING = 'pending'
+OUTBOX_SENT = 'sent'
+OUTBOX_FAILED = 'failed'            # попытки кончились
+OUTBOX_UNREACHABLE = 'unreachable'  # чат заблокировал бота или удален
+
+# Окно истории подписей для поиска пересказов - как срок хранения в clear_old_news
+SIGNATURE_HISTORY_HOURS = int(os.environ.get('SIGNATURE_HISTORY_HOURS', 24))
+
+# Глобальная блокировка для записи в БД (читатели её не берут)
+db_lock = threading.Lock()
+
+_local = threading.local()
+
+DB_LOCK_WAIT = registry.histogram(
+    'nauka_db_lock_wait_seconds', 'Ожидание db_lock перед транзакцией на запись',
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+
+# ========== SQL ВЫРАЖЕНИЯ ==========
+# Константные строки - sqlite3 переиспользует подготовленные выражения по тексту запроса
+SQL_IS_PUBLISHED = 'SELECT 1 FROM published_news WHERE content_hash = ? LIMIT 1'
+SQL_PUBLISHED_HASHES = 'SELECT content_hash FROM published_news WHERE content_hash IN ({})'
+SQL_MARK_PUBLISHED = ('INSERT OR IGNORE INTO published_news (url, title, source, lang, content_hash, signature) '
+                      'VALUES (?, ?, ?, ?, ?, ?)')
+SQL_RECENT_SIGNATURES = ('SELECT content_hash, signature FROM published_news '
+                         "WHERE published_at >= datetime('now', ?) AND signature IS NOT NULL")
+
+# Написавший боту снова активен, даже если раньше его блокировал
+SQL_ADD_SUBSCRIBER = ('INSERT INTO subscribers (chat_id, username, first_name) VALUES (?, ?, ?) '
+                      'ON CONFLICT(chat_id) DO UPDATE SET username = excluded.username, '
+                      'first_name = excluded.first_name, active = 1, blocked = 0, failure_count = 0')
+SQL_COUNT_SUBSCRIBERS = 'SELECT COUNT(*) FROM subscribers WHERE active = 1'
+# Постраничное чтение по ключу с фильтром по режиму доставки и маскам тем и
+# языков: индекс (active, delivery_mode, chat_id, topics, langs) покрывает запрос,
+# таблицу читать не нужно
+SQL_SUBSCRIBERS_FIRST_PAGE = ('SELECT chat_id FROM subscribers WHERE active = 1 AND delivery_mode = ? '
+                              'AND topics & ? != 0 AND langs & ? != 0 ORDER BY chat_id LIMIT ?')
+SQL_SUBSCRIBERS_NEXT_PAGE = ('SELECT chat_id FROM subscribers WHERE active = 1 AND delivery_mode = ? AND chat_id > ? '
+                             'AND topics & ? != 0 AND langs & ? != 0 ORDER BY chat_id LIMIT ?')
+# Подписчики дайджеста с одинаковыми масками получают одинаковый дайджест
+SQL_DIGEST_GROUPS = "SELECT DISTINCT topics, langs FROM subscribers WHERE active = 1 AND delivery_mode = 'digest'"
+SQL_GET_PREFERENCES = 'SELECT topics, langs FROM subscribers WHERE chat_id = ?'
+SQL_SET_TOPICS = 'UPDATE subscribers SET topics = ? WHERE chat_id = ?'
+SQL_SET_LANGS = 'UPDATE subscribers SET langs = ? WHERE chat_id = ?'
+SQL_GET_DELIVERY_MODE = 'SELECT delivery_mode FROM subscribers WHERE chat_id = ?'
+SQL_SET_DELIVERY_MODE = 'UPDATE subscribers SET delivery_mode = ? WHERE chat_id = ?'
+SQL_DELIVERY_SUCCEEDED = 'UPDATE subscribers SET last_success = CURRENT_TIMESTAMP, failure_count = 0 WHERE chat_id = ?'
+SQL_DELIVERY_FAILED = 'UPDATE subscribers SET failure_count = failure_count + 1 WHERE chat_id = ?'
+SQL_DEACTIVATE_SUBSCRIBER = ('UPDATE subscribers SET active = 0, blocked = ?, failure_count = failure_count + 1 '
+                             'WHERE chat_id = ?')
+SQL_CLEAR_OLD_NEWS = "DELETE FROM published_news WHERE published_at < datetime('now', '-1 days')"
+SQL_GET_SOURCE_STATE = 'SELECT seen_ids, newest_entry_at, items FROM source_state WHERE source = ?'
+SQL_SET_SOURCE_STATE = ('INSERT OR REPLACE INTO source_state (source, seen_ids, newest_entry_at, items, updated_at) '
+                        'VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)')
+SQL_COUNT_SOURCES = 'SELECT COUNT(*) FROM sources'
+SQL_GET_SOURCES = 'SELECT name, url, lang, enabled, options FROM sources ORDER BY name'
+SQL_UPSERT_SOURCE = ('INSERT INTO sources (name, url, lang, enabled, options) VALUES (?, ?, ?, ?, ?) '
+                     'ON CONFLICT(name) DO UPDATE SET url = excluded.url, lang = excluded.lang, '
+                     'enabled = excluded.enabled, options = excluded.options, updated_at = CURRENT_TIMESTAMP')
+SQL_DELETE_SOURCE = 'DELETE FROM sources WHERE name = ?'
+SQL_ACQUIRE_LEASE = ('INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) '
+                     'ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at '
+                     'WHERE leases.owner = excluded.owner OR leases.expires_at < ?')
+SQL_RELEASE_LEASE = 'DELETE FROM leases WHERE name = ? AND owner = ?'
+SQL_GET_LEASE = 'SELECT owner, expires_at FROM leases WHERE name = ?'
+SQL_PUT_OUTBOX_MESSAGE = 'INSERT OR IGNORE INTO outbox_messages (message_key, text, created_at) VALUES (?, ?, ?)'
+# Очередь заполняется из подписчиков одним запросом; UNIQUE (message_key, chat_id)
+# не дает поставить сообщение в чат дважды, если цикл повторился после рестарта
+SQL_ENQUEUE_INSTANT = ('INSERT OR IGNORE INTO outbox (message_key, chat_id, next_attempt_at, updated_at) '
+                       "SELECT ?, chat_id, ?, ? FROM subscribers WHERE active = 1 AND delivery_mode = 'instant' "
+                       'AND topics & ? != 0 AND langs & ? != 0 ORDER BY chat_id')
+SQL_ENQUEUE_DIGEST = ('INSERT OR IGNORE INTO outbox (message_key, chat_id, next_attempt_at, updated_at) '
+                      "SELECT ?, chat_id, ?, ? FROM subscribers WHERE active = 1 AND delivery_mode = 'digest' "
+                      'AND topics = ? AND langs = ? ORDER BY chat_id')
+SQL_COUNT_OUTBOX_MESSAGE = 'SELECT COUNT(*) FROM outbox WHERE message_key = ?'
+SQL_DUE_OUTBOX = ('SELECT o.id, o.message_key, o.chat_id, o.attempts, m.text, s.active FROM outbox o '
+                  'JOIN outbox_messages m ON m.message_key = o.message_key '
+                  'LEFT JOIN subscribers s ON s.chat_id = o.chat_id '
+                  "WHERE o.status = 'pending' AND o.next_attempt_at <= ? ORDER BY o.next_attempt_at, o.id LIMIT ?")
+SQL_OUTBOX_SENT = "UPDATE outbox SET status = 'sent', attempts = attempts + 1, updated_at = ? WHERE id = ?"
+SQL_OUTBOX_RETRY = ('UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?, updated_at = ? '
+                    'WHERE id = ?')
+SQL_OUTBOX_GIVE_UP = 'UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ?, updated_at = ? WHERE id = ?'
+SQL_OUTBOX_STATS = 'SELECT status, COUNT(*) FROM outbox GROUP BY status'
+SQL_PRUNE_OUTBOX = "DELETE FROM outbox WHERE status != 'pending' AND updated_at < ?"
+SQL_PRUNE_OUTBOX_MESSAGES = ('DELETE FROM outbox_messages WHERE created_at < ? '
+                             'AND message_key NOT IN (SELECT message_key FROM outbox)')
+SQL_ADD_DIGEST_ARTICLE = 'INSERT OR IGNORE INTO digest_articles (content_hash, article, created_at) VALUES (?, ?, ?)'
+# Разосланные статьи остаются с sent_at: найденная повторно статья не попадет в дайджест второй раз
+SQL_GET_DIGEST_ARTICLES = 'SELECT article FROM digest_articles WHERE sent_at IS NULL ORDER BY created_at'
+SQL_DIGEST_ARTICLE_SENT = 'UPDATE digest_articles SET sent_at = ? WHERE content_hash = ?'
+SQL_PRUNE_DIGEST_ARTICLES = 'DELETE FROM digest_articles WHERE sent_at < ?'
+SQL_GET_BOT_STATE = 'SELECT value FROM bot_state WHERE name = ?'
+SQL_SET_BOT_STATE = 'INSERT OR REPLACE INTO bot_state (name, value) VALUES (?, ?)'
+
+# Время последней рассылки дайджестов (unix time)
+DIGEST_SENT_AT = 'digest_sent_at'
+SQL_GET_TRANSLATION = ('SELECT translated, created_at FROM translations '
+                       'WHERE src_lang = ? AND text_hash = ?')
+SQL_SAVE_TRANSLATION = ('INSERT OR REPLACE INTO translations (src_lang, text_hash, translated, created_at, last_used_at) '
+                        'VALUES (?, ?, ?, ?, ?)')
+SQL_TOUCH_TRANSLATION = 'UPDATE translations SET last_used_at = ? WHERE src_lang = ? AND text_hash = ?'
+SQL_EXPIRE_TRANSLATIONS = 'DELETE FROM translations WHERE created_at < ?'
+SQL_TRIM_TRANSLATIONS = ('DELETE FROM translations WHERE rowid IN ('
+                         'SELECT rowid FROM translations ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)')
+
+# ========== СОЕДИНЕНИЯ ==========
+def set_db_path(path):
+    """Меняем путь к базе (соединения потоков переоткроются при следующем обращении)"""
+    global DB_PATH
+    DB_PATH = path
+
+
+def _connect(path):
+    """Открываем соединение и применяем PRAGMA"""
+    conn = sqlite3.connect(
+        path,
+        timeout=30,
+        check_same_thread=False,
+        isolation_level=None,  # транзакциями управляем сами
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_connection():
+    """Возвращаем долгоживущее соединение текущего потока"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.path != DB_PATH:
+        if conn is not None:
+            conn.close()
+        conn = _connect(DB_PATH)
+        _local.conn = conn
+        _local.path = DB_PATH
+    return conn
+
+
+def close_connection():
+    """Закрываем соединение текущего потока"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+@contextmanager
+def write_transaction():
+    """Транзакция на запись: писатели сериализуются через db_lock"""
+    conn = get_connection()
+    wait_started = time.perf_counter()
+    with db_lock:
+        DB_LOCK_WAIT.observe(time.perf_counter() - wait_started)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            # В том числе неудачный COMMIT (SQLITE_BUSY): соединение потока живет
+            # долго, и незакрытая транзакция сорвала бы все следующие BEGIN
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+
+# ========== БАЗА ДАННЫХ ==========
+def _add_column_if_missing(conn, table, column, definition):
+    """Миграция для баз, созданных старыми версиями"""
+    columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def init_db():
+    """Инициализация базы данных SQLite"""
+    with write_transaction() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS published_news (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT UNIQUE NOT NULL,
+                title TEXT NOT NULL,
+                source TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                published_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        _add_column_if_missing(conn, 'published_news', 'signature', 'BLOB')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_published_news_content_hash ON published_news (content_hash)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_published_news_published_at ON published_news (published_at)')
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS subscribers (
+                chat_id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_name TEXT,
+                subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        _add_column_if_missing(conn, 'subscribers', 'active', 'INTEGER NOT NULL DEFAULT 1')
+        _add_column_if_missing(conn, 'subscribers', 'blocked', 'INTEGER NOT NULL DEFAULT 0')
+        _add_column_if_missing(conn, 'subscribers', 'last_success', 'TIMESTAMP')
+        _add_column_if_missing(conn, 'subscribers', 'failure_count', 'INTEGER NOT NULL DEFAULT 0')
+        # Маски тем и языков; -1 - все, включая темы, которые появятся позже
+        _add_column_if_missing(conn, 'subscribers', 'topics', 'INTEGER NOT NULL DEFAULT -1')
+        _add_column_if_missing(conn, 'subscribers', 'langs', 'INTEGER NOT NULL DEFAULT -1')
+        _add_column_if_missing(conn, 'subscribers', 'delivery_mode', "TEXT NOT NULL DEFAULT 'instant'")
+        conn.execute('DROP INDEX IF EXISTS idx_subscribers_active')
+        conn.execute('DROP INDEX IF EXISTS idx_subscribers_fanout')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_subscribers_delivery '
+                     'ON subscribers (active, delivery_mode, chat_id, topics, langs)')
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS source_state (
+                source TEXT PRIMARY KEY,
+                seen_ids TEXT NOT NULL,
+                newest_entry_at TEXT,
+                items TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sources (
+                name TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                enabled INTEGER NOT NULL DEFAULT 1,
+                options TEXT NOT NULL DEFAULT '{}',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS translations (
+                src_lang TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                translated TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                PRIMARY KEY (src_lang, text_hash)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used_at)')
+
+        # Очередь отправки: текст хранится один раз на сообщение, строка очереди - на чат
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox_messages (
+                message_key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY,
+                message_key TEXT NOT NULL,
+                chat_id INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                updated_at REAL NOT NULL,
+                UNIQUE (message_key, chat_id)
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (next_attempt_at) WHERE status = 'pending'")
+
+        # Статьи для дайджеста: ждущие переживают рестарт, разосланные (sent_at) не дают
+        # поставить найденную повторно статью в дайджест еще раз
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS digest_articles (
+                content_hash TEXT PRIMARY KEY,
+                article TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        _add_column_if_missing(conn, 'digest_articles', 'sent_at', 'REAL')
+
+        # Отметки фоновых циклов, которые должны пережить рестарт
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS bot_state (
+                name TEXT PRIMARY KEY,
+                value REAL NOT NULL
+            )
+        ''')
+
+    logger.info("✅ База данных инициализирована")
+
+
+def clear_old_news():
+    """Очищаем старые новости из базы (старше 1 дня)"""
+    with write_transaction() as conn:
+        deleted_count = conn.execute(SQL_CLEAR_OLD_NEWS).rowcount
+
+    logger.info(f"🧹 Очищено {deleted_count} старых новостей из базы")
+    return deleted_count
+
+
+def is_news_published(content_hash):
+    """Проверяем, публиковали ли мы уже эту новость по хэшу"""
+    row = get_connection().execute(SQL_IS_PUBLISHED, (content_hash,)).fetchone()
+    return row is not None
+
+
+def mark_news_as_published(url, title, source, lang, content_hash, signature=None):
+    """Добавляем новость в базу как опубликованную"""
+    with write_transaction() as conn:
+        conn.execute(SQL_MARK_PUBLISHED, (url, title, source, lang, content_hash, signature))
+
+
+def filter_unpublished(content_hashes):
+    """Оставляем только хэши, которых еще нет в базе (порядок сохраняется)"""
+    content_hashes = list(dict.fromkeys(content_hashes))
+    conn = get_connection()
+    published = set()
+    for start in range(0, len(content_hashes), BULK_CHUNK_SIZE):
+        chunk = content_hashes[start:start + BULK_CHUNK_SIZE]
+        sql = SQL_PUBLISHED_HASHES.format(','.join('?' * len(chunk)))
+        published.update(row[0] for row in conn.execute(sql, chunk))
+    return [content_hash for content_hash in content_hashes if content_hash not in published]
+
+
+def mark_many_as_published(articles, signatures=None):
+    """Отмечаем пачку статей опубликованными одной транзакцией"""
+    signatures = signatures or [None] * len(articles)
+    rows = [(a['url'], a['title'], a['source'], a['lang'], a['content_hash'], signature)
+            for a, signature in zip(articles, signatures)]
+    if not rows:
+        return
+    with write_transaction() as conn:
+        conn.executemany(SQL_MARK_PUBLISHED, rows)
+
+
+def get_recent_signatures():
+    """Подписи новостей, опубликованных за последние SIGNATURE_HISTORY_HOURS часов"""
+    return get_connection().execute(SQL_RECENT_SIGNATURES, (f"-{SIGNATURE_HISTORY_HOURS} hours",)).fetchall()
+
+
+def add_subscriber(chat_id, username, first_name):
+    """Добавляем подписчика в базу"""
+    with write_transaction() as conn:
+        conn.execute(SQL_ADD_SUBSCRIBER, (chat_id, username, first_name))
+
+    logger.info(f"✅ Добавлен подписчик: {first_name}")
+
+
+def count_subscribers():
+    """Сколько подписчиков активно"""
+    return get_connection().execute(SQL_COUNT_SUBSCRIBERS).fetchone()[0]
+
+
+def iter_subscriber_pages(page_size=SUBSCRIBER_PAGE_SIZE, topics=-1, langs=-1, delivery_mode=DELIVERY_INSTANT):
+    """Активные подписчики страницами по page_size chat_id - память не растет с базой.
+
+    topics и langs - маски статьи: подписчик попадает в выборку, если его
+    маски пересекаются с ними; delivery_mode - режим доставки подписчиков.
+    """
+    conn = get_connection()
+    page = [row[0] for row in conn.execute(SQL_SUBSCRIBERS_FIRST_PAGE, (delivery_mode, topics, langs, page_size))]
+    while page:
+        yield page
+        if len(page) < page_size:
+            return
+        page = [row[0] for row in conn.execute(SQL_SUBSCRIBERS_NEXT_PAGE,
+                                               (delivery_mode, page[-1], topics, langs, page_size))]
+
+
+def get_digest_groups():
+    """Различные пары масок (topics, langs) среди подписчиков дайджеста"""
+    return [tuple(row) for row in get_connection().execute(SQL_DIGEST_GROUPS)]
+
+
+def get_subscriber_preferences(chat_id):
+    """Маски (topics, langs) подписчика; (-1, -1) - все"""
+    row = get_connection().execute(SQL_GET_PREFERENCES, (chat_id,)).fetchone()
+    return tuple(row) if row else (-1, -1)
+
+
+def set_subscriber_topics(chat_id, topics):
+    with write_transaction() as conn:
+        conn.execute(SQL_SET_TOPICS, (topics, chat_id))
+
+
+def set_subscriber_langs(chat_id, langs):
+    with write_transaction() as conn:
+        conn.execute(SQL_SET_LANGS, (langs, chat_id))
+
+
+def get_delivery_mode(chat_id):
+    """'instant' или 'digest'"""
+    row = get_connection().execute(SQL_GET_DELIVERY_MODE, (chat_id,)).fetchone()
+    return row[0] if row else DELIVERY_INSTANT
+
+
+def set_delivery_mode(chat_id, mode):
+    if mode not in DELIVERY_MODES:
+        raise ValueError(f"Неизвестный режим доставки: {mode}")
+    with write_transaction() as conn:
+        conn.execute(SQL_SET_DELIVERY_MODE, (mode, chat_id))
+
+
+def record_deliveries(delivered, failed, unreachable):
+    """Итоги рассылки одной транзакцией.
+
+    delivered и failed - chat_id, unreachable - {chat_id: причина}; чаты, где бот
+    заблокирован ('blocked') или которых больше нет, выключаются из рассылки.
+    """
+    if not (delivered or failed or unreachable):
+        return
+    with write_transaction() as conn:
+        conn.executemany(SQL_DELIVERY_SUCCEEDED, [(chat_id,) for chat_id in delivered])
+        conn.executemany(SQL_DELIVERY_FAILED, [(chat_id,) for chat_id in failed])
+        conn.executemany(SQL_DEACTIVATE_SUBSCRIBER,
+                         [(int(reason == 'blocked'), chat_id) for chat_id, reason in unreachable.items()])
+
+# ========== СОСТОЯНИЕ ИСТОЧНИКОВ ==========
+def get_source_state(source):
+    """Высшая отметка источника или None"""
+    row = get_connection().execute(SQL_GET_SOURCE_STATE, (source,)).fetchone()
+    if row is None:
+        return None
+    return {'seen_ids': json.loads(row[0]), 'newest_entry_at': row[1], 'items': json.loads(row[2])}
+
+
+def set_source_state(source, seen_ids, newest_entry_at, items):
+    """Сохраняем высшую отметку источника"""
+    with write_transaction() as conn:
+        conn.execute(SQL_SET_SOURCE_STATE, (source, json.dumps(seen_ids), newest_entry_at,
+                                            json.dumps(items, ensure_ascii=False)))
+
+# ========== РЕЕСТР ИСТОЧНИКОВ ==========
+def _source_row(name, info):
+    options = {key: value for key, value in info.items() if key not in ('url', 'lang', 'enabled')}
+    return (name, info['url'], info['lang'], int(info.get('enabled', True)), json.dumps(options))
+
+
+def seed_sources(sources):
+    """Заполняем пустой реестр источниками по умолчанию; удаленные вручную не возвращаются"""
+    with write_transaction() as conn:
+        if conn.execute(SQL_COUNT_SOURCES).fetchone()[0]:
+            return 0
+        conn.executemany(SQL_UPSERT_SOURCE, [_source_row(name, info) for name, info in sources.items()])
+    logger.info(f"📚 Реестр источников заполнен: {len(sources)}")
+    return len(sources)
+
+
+def get_sources(include_disabled=False):
+    """Источники {имя: {'url', 'lang', 'enabled', ...опции}}"""
+    sources = {}
+    for name, url, lang, enabled, options in get_connection().execute(SQL_GET_SOURCES):
+        if enabled or include_disabled:
+            sources[name] = dict(json.loads(options), url=url, lang=lang, enabled=bool(enabled))
+    return sources
+
+
+def upsert_source(name, info):
+    """Добавляем источник или меняем его url, язык, включенность и опции"""
+    with write_transaction() as conn:
+        conn.execute(SQL_UPSERT_SOURCE, _source_row(name, info))
+
+
+def delete_source(name):
+    """Удаляем источник; False, если такого нет"""
+    with write_transaction() as conn:
+        return conn.execute(SQL_DELETE_SOURCE, (name,)).rowcount > 0
+
+# ========== АРЕНДА (ВЫБОР ВЕДУЩЕГО) ==========
+def acquire_lease(name, owner, ttl):
+    """Берем или продлеваем аренду на ttl секунд; False, если ее держит другой владелец"""
+    now = time.time()
+    with write_transaction() as conn:
+        return conn.execute(SQL_ACQUIRE_LEASE, (name, owner, now + ttl, now)).rowcount > 0
+
+
+def release_lease(name, owner):
+    """Отдаем аренду, чтобы другой процесс забрал ее без ожидания срока"""
+    with write_transaction() as conn:
+        conn.execute(SQL_RELEASE_LEASE, (name, owner))
+
+
+def get_lease(name):
+    """Текущая аренда: {'owner', 'expires_in'} или None"""
+    row = get_connection().execute(SQL_GET_LEASE, (name,)).fetchone()
+    if not row:
+        return None
+    return {'owner': row[0], 'expires_in': round(row[1] - time.time(), 1)}
+
+# ========== КЭШ ПЕРЕВОДОВ ==========
+def get_translation(src_lang, text_hash):
+    """Перевод из таблицы: (translated, created_at) или None"""
+    return get_connection().execute(SQL_GET_TRANSLATION, (src_lang, text_hash)).fetchone()
+
+
+def save_translation(src_lang, text_hash, translated, created_at):
+    """Сохраняем перевод"""
+    with write_transaction() as conn:
+        conn.execute(SQL_SAVE_TRANSLATION, (src_lang, text_hash, translated, created_at, created_at))
+
+
+def touch_translation(src_lang, text_hash, used_at):
+    """Отмечаем использование перевода для LRU"""
+    with write_transaction() as conn:
+        conn.execute(SQL_TOUCH_TRANSLATION, (used_at, src_lang, text_hash))
+
+
+def prune_translations(expire_before, max_rows):
+    """Удаляем просроченные переводы и самые давно использованные сверх лимита"""
+    with write_transaction() as conn:
+        expired = conn.execute(SQL_EXPIRE_TRANSLATIONS, (expire_before,)).rowcount
+        trimmed = conn.execute(SQL_TRIM_TRANSLATIONS, (max_rows,)).rowcount
+    return expired + trimmed
+
+# ========== ОЧЕРЕДЬ ОТПРАВКИ ==========
+def enqueue_broadcast(message_key, text, topics, langs):
+    """Ставим сообщение в очередь мгновенным подписчикам с подходящими масками.
+
+    Возвращаем, сколько чатов в очереди у сообщения, включая поставленные раньше.
+    """
+    now = time.time()
+    with write_transaction() as conn:
+        conn.execute(SQL_PUT_OUTBOX_MESSAGE, (message_key, text, now))
+        conn.execute(SQL_ENQUEUE_INSTANT, (message_key, now, now, topics, langs))
+        return conn.execute(SQL_COUNT_OUTBOX_MESSAGE, (message_key,)).fetchone()[0]
+
+
+def add_digest_article(content_hash, article):
+    """Статья ждет дайджеста; уже ждущая или разосланная не добавляется. article - словарь для json"""
+    with write_transaction() as conn:
+        conn.execute(SQL_ADD_DIGEST_ARTICLE, (content_hash, json.dumps(article, ensure_ascii=False), time.time()))
+
+
+def get_digest_articles():
+    """Статьи, ждущие дайджеста, в порядке поступления"""
+    return [json.loads(row[0]) for row in get_connection().execute(SQL_GET_DIGEST_ARTICLES)]
+
+
+def enqueue_digests(digests, content_hashes, sent_at):
+    """Ставим дайджесты в очередь, отмечаем их статьи разосланными и запоминаем
+    время рассылки (DIGEST_SENT_AT) одной транзакцией.
+
+    digests - [(topics, langs, [(message_key, text), ...])]: части дайджеста
+    получают подписчики дайджеста ровно с такими масками, по порядку частей.
+    """
+    now = time.time()
+    queued = 0
+    with write_transaction() as conn:
+        for topics, langs, parts in digests:
+            for message_key, text in parts:
+                conn.execute(SQL_PUT_OUTBOX_MESSAGE, (message_key, text, now))
+                queued += conn.execute(SQL_ENQUEUE_DIGEST, (message_key, now, now, topics, langs)).rowcount
+        conn.executemany(SQL_DIGEST_ARTICLE_SENT, [(now, content_hash) for content_hash in content_hashes])
+        conn.execute(SQL_SET_BOT_STATE, (DIGEST_SENT_AT, sent_at))
+    return queued
+
+
+def get_bot_state(name):
+    """Отметка из bot_state или None"""
+    row = get_connection().execute(SQL_GET_BOT_STATE, (name,)).fetchone()
+    return row[0] if row else None
+
+
+def get_due_outbox(limit, now=None):
+    """Строки очереди, которым пора уйти: (id, message_key, chat_id, attempts, text, active)"""
+    return get_connection().execute(SQL_DUE_OUTBOX, (now or time.time(), limit)).fetchall()
+
+
+def complete_outbox(sent, retry, given_up):
+    """Итоги пачки одной транзакцией.
+
+    sent - id отправленных, retry - [(id, next_attempt_at, ошибка)],
+    given_up - [(id, статус, ошибка)] для строк, которые больше не отправляем.
+    """
+    now = time.time()
+    with write_transaction() as conn:
+        conn.executemany(SQL_OUTBOX_SENT, [(now, outbox_id) for outbox_id in sent])
+        conn.executemany(SQL_OUTBOX_RETRY, [(next_at, error, now, outbox_id) for outbox_id, next_at, error in retry])
+        conn.executemany(SQL_OUTBOX_GIVE_UP, [(status, error, now, outbox_id) for outbox_id, status, error in given_up])
+
+
+def outbox_stats():
+    """Строк очереди по статусам"""
+    return dict(get_connection().execute(SQL_OUTBOX_STATS).fetchall())
+
+
+def prune_outbox(expire_before):
+    """Удаляем завершенные строки, тексты и разосланные статьи дайджеста старше expire_before (unix time)"""
+    with write_transaction() as conn:
+        rows = conn.execute(SQL_PRUNE_OUTBOX, (expire_before,)).rowcount
+        conn.execute(SQL_PRUNE_OUTBOX_MESSAGES, (expire_before,))
+        conn.execute(SQL_PRUNE_DIGEST_ARTICLES, (expire_before,))
+    return rows
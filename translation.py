@@ -0,0 +1,228 @@
+"""Перевод на русский с кэшем в памяти (LRU) и в SQLite (TTL)"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+import storage
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# ========== НАСТРОЙКИ ==========
+TRANSLATE_URL = os.environ.get('TRANSLATE_URL', 'https://translate.googleapis.com/translate_a/single')
+TRANSLATION_CACHE_SIZE = int(os.environ.get('TRANSLATION_CACHE_SIZE', 5000))
+TRANSLATION_CACHE_TTL = int(os.environ.get('TRANSLATION_CACHE_TTL', 7 * 24 * 3600))
+# Лимит символов на один запрос к переводчику
+MAX_BATCH_CHARS = 4000
+# Чистим таблицу не чаще, чем раз в столько новых записей
+PRUNE_EVERY = 200
+
+TRANSLATION_SECONDS = registry.histogram('nauka_translation_request_seconds', 'Длительность запроса к переводчику')
+TRANSLATION_SEGMENTS = registry.counter('nauka_translation_segments_total', 'Строк отправлено переводчику')
+TRANSLATION_FAILURES = registry.counter(
+    'nauka_translation_failures_total', 'Неудачные запросы к переводчику', ['reason'])
+TRANSLATION_CACHE_LOOKUPS = registry.counter(
+    'nauka_translation_cache_lookups_total', 'Обращения к кэшу переводов', ['result'])
+
+LANG_MAP = {
+    'zh': 'zh-CN', 'es': 'es', 'pt': 'pt', 'en': 'en',
+    'de': 'de', 'fr': 'fr', 'ru': 'ru'
+}
+
+# ========== КЭШ ==========
+class TranslationCache:
+    """Кэш переводов по (язык, хэш текста): LRU в памяти поверх таблицы translations"""
+
+    def __init__(self, max_size=TRANSLATION_CACHE_SIZE, ttl=TRANSLATION_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> (translated, created_at)
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(src_lang, text):
+        return src_lang, hashlib.sha1(text.encode()).hexdigest()
+
+    def get(self, src_lang, text):
+        """Перевод из кэша или None"""
+        key = self.make_key(src_lang, text)
+        now = time.time()
+
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached and now - cached[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                TRANSLATION_CACHE_LOOKUPS.inc(result='memory')
+                return cached[0]
+            if cached:
+                del self._memory[key]
+
+        try:
+            row = storage.get_translation(*key)
+            if row and now - row[1] < self.ttl:
+                storage.touch_translation(*key, now)
+                self._remember(key, row[0], row[1])
+                with self._lock:
+                    self.hits += 1
+                    self.db_hits += 1
+                TRANSLATION_CACHE_LOOKUPS.inc(result='db')
+                return row[0]
+        except Exception as e:
+            logger.warning(f"⚠️ Кэш переводов недоступен: {e}")
+
+        with self._lock:
+            self.misses += 1
+        TRANSLATION_CACHE_LOOKUPS.inc(result='miss')
+        return None
+
+    def put(self, src_lang, text, translated):
+        """Сохраняем перевод в памяти и в таблице"""
+        key = self.make_key(src_lang, text)
+        now = time.time()
+        self._remember(key, translated, now)
+
+        try:
+            storage.save_translation(*key, translated, now)
+            with self._lock:
+                self._writes_since_prune += 1
+                need_prune = self._writes_since_prune >= PRUNE_EVERY
+                if need_prune:
+                    self._writes_since_prune = 0
+            if need_prune:
+                removed = storage.prune_translations(now - self.ttl, self.max_size)
+                logger.debug(f"🧹 Кэш переводов: удалено {removed} записей")
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сохранить перевод в кэш: {e}")
+
+    def _remember(self, key, translated, created_at):
+        with self._lock:
+            self._memory[key] = (translated, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def stats(self):
+        """Счетчики попаданий и промахов"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'size': len(self._memory),
+            }
+
+translation_cache = TranslationCache()
+
+# ========== ПЕРЕВОД ==========
+def _pack_batches(texts, max_chars=MAX_BATCH_CHARS):
+    """Делим тексты на пачки, укладывающиеся в лимит запроса"""
+    batch, size = [], 0
+    for text in texts:
+        if batch and size + len(text) + 1 > max_chars:
+            yield batch
+            batch, size = [], 0
+        batch.append(text)
+        size += len(text) + 1
+    if batch:
+        yield batch
+
+
+def _request_batch(texts, src_lang):
+    """Один запрос к переводчику на несколько строк; None, если ответ не разбирается"""
+    # Каждая строка - отдельный абзац: переносы внутри текста заменяем пробелами
+    joined = '\n'.join(' '.join(text.split()) for text in texts)
+    params = {
+        'client': 'gtx',
+        'sl': LANG_MAP.get(src_lang, 'auto'),
+        'tl': 'ru',
+        'dt': 't',
+    }
+
+    TRANSLATION_SEGMENTS.inc(len(texts))
+    try:
+        with TRANSLATION_SECONDS.time():
+            response = requests.post(TRANSLATE_URL, params=params, data={'q': joined}, timeout=10)
+    except Exception:
+        TRANSLATION_FAILURES.inc(reason='network')
+        raise
+    if response.status_code != 200:
+        TRANSLATION_FAILURES.inc(reason=f'http_{response.status_code}')
+        return None
+
+    data = response.json()
+    if not data or not data[0]:
+        TRANSLATION_FAILURES.inc(reason='empty')
+        return None
+
+    translated = ''.join(segment[0] for segment in data[0] if segment and segment[0])
+    parts = translated.split('\n')
+    if len(parts) != len(texts):
+        TRANSLATION_FAILURES.inc(reason='split_mismatch')
+        return None
+    return [part.strip() for part in parts]
+
+
+def translate_text(text, src_lang):
+    """Переводим текст на русский"""
+    try:
+        if not text or len(text) < 3:
+            return text
+
+        cached = translation_cache.get(src_lang, text)
+        if cached is not None:
+            return cached
+
+        translated = _request_batch([text], src_lang)
+        if translated is None:
+            return text
+
+        translation_cache.put(src_lang, text, translated[0])
+        return translated[0]
+    except Exception:
+        return text
+
+
+def translate_batch(texts, src_lang):
+    """Переводим список строк минимальным числом запросов, порядок сохраняется"""
+    results = list(texts)
+
+    # Уникальные непереведенные тексты -> позиции в исходном списке
+    pending = {}
+    for index, text in enumerate(texts):
+        if not text or len(text) < 3:
+            continue
+        cached = translation_cache.get(src_lang, text)
+        if cached is not None:
+            results[index] = cached
+        else:
+            pending.setdefault(text, []).append(index)
+
+    for batch in _pack_batches(list(pending)):
+        translated = None
+        try:
+            translated = _request_batch(batch, src_lang)
+        except Exception as e:
+            logger.warning(f"⚠️ Пакетный перевод не удался: {e}")
+
+        if translated is None:
+            logger.info(f"🔁 Переводим {len(batch)} строк по одной")
+            translated = [translate_text(text, src_lang) for text in batch]
+        else:
+            for text, result in zip(batch, translated):
+                translation_cache.put(src_lang, text, result)
+
+        for text, result in zip(batch, translated):
+            for index in pending[text]:
+                results[index] = result
+
+    return results
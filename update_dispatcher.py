@@ -0,0 +1,30 @@
+"""Ограниченная очередь входящих Telegram updates и фиксированный пул обработчиков"""
+import logging
+
+from worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateDispatcher(WorkerPool):
+    """Принимает updates без ожидания и обрабатывает их workers потоками"""
+
+    def __init__(self, handler, workers=4, max_queue=500):
+        super().__init__(workers, max_queue, name='update-worker')
+        self.handler = handler
+        self.accepted = 0
+        self.rejected = 0
+
+    def submit(self, update, block=False):
+        """Ставим update в очередь; False, если очередь переполнена"""
+        if not self.put(update, block=block):
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        return True
+
+    def handle(self, update):
+        try:
+            self.handler(update)
+        except Exception as e:
+            logger.error(f"❌ Ошибка обработки update {update.get('update_id')}: {e}")
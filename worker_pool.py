@@ -0,0 +1,50 @@
+"""Фиксированный пул потоков с ограниченной очередью - общая основа для updates и команд"""
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """workers потоков разбирают очередь до max_queue элементов; handle(item) задает подкласс"""
+
+    def __init__(self, workers, max_queue, name='worker'):
+        self.workers = workers
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Запускаем потоки (повторный вызов ничего не делает)"""
+        with self._start_lock:
+            if self._started:
+                return
+            for index in range(self.workers):
+                threading.Thread(target=self._run, name=f"{self.name}-{index}", daemon=True).start()
+            self._started = True
+
+    def put(self, item, block=False):
+        """Ставим элемент в очередь; False, если очередь переполнена"""
+        try:
+            self._queue.put(item, block=block)
+        except queue.Full:
+            return False
+        return True
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def handle(self, item):
+        raise NotImplementedError
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                self.handle(item)
+            except Exception as e:
+                logger.error(f"❌ Ошибка в потоке {self.name}: {e}")
+            finally:
+                self._queue.task_done()